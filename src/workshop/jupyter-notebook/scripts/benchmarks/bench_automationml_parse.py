@@ -0,0 +1,44 @@
+import contextlib
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import click
+from s7tia import tia_automationml_helper
+from benchmarks.synthetic_tia_export import write_synthetic_automationml_export
+
+
+def measure(parse_function, automationml_file):
+    # parsers print every PLC, the benchmark only cares about parsing
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        devices = parse_function(str(automationml_file))
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        parse_function(str(automationml_file))
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return devices, elapsed, peak_bytes
+
+
+@click.command()
+@click.option("--devices", "device_count", default=300, show_default=True, help="Number of PLC stations in the synthetic project.")
+@click.option("--io-modules", default=8, show_default=True, help="IO modules (32 channels each) per PLC station.")
+def main(device_count, io_modules):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        automationml_file = write_synthetic_automationml_export(Path(temp_dir, "project_automationml.aml"), device_count, io_modules)
+        print(f"Synthetic AutomationML with {device_count} devices: {automationml_file.stat().st_size / 2**20:.1f} MB")
+        parsers = {
+            "untangle": tia_automationml_helper.automationml_export_to_entries_untangle,
+            "iterparse": tia_automationml_helper.automationml_export_to_entries,
+        }
+        results = {}
+        for parser_name, parse_function in parsers.items():
+            results[parser_name], elapsed, peak_bytes = measure(parse_function, automationml_file)
+            print(f"{parser_name:>10}: {len(results[parser_name])} devices in {elapsed:.2f}s, peak {peak_bytes / 2**20:.1f} MB")
+        print(f"identical output: {results['untangle'] == results['iterparse']}")
+
+
+if __name__ == '__main__':
+    main()
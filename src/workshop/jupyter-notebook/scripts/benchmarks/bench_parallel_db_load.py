@@ -0,0 +1,34 @@
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+import click
+from s7tia import automationml2sw
+from benchmarks.synthetic_tia_export import write_synthetic_project_export
+
+
+@click.command()
+@click.option("--devices", "device_count", default=200, show_default=True, help="Number of PLCs in the synthetic project.")
+@click.option("--members", default=2000, show_default=True, help="Members per DB export.")
+@click.option("--dbs-per-device", default=2, show_default=True, help="DB_SW exports per PLC.")
+def main(device_count, members, dbs_per_device):
+    worker_counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export_dir = write_synthetic_project_export(Path(temp_dir), device_count, members, dbs_per_device)
+        print(f"Synthetic project: {device_count} PLCs x {dbs_per_device} DBs x {members} members")
+        baseline = None
+        reference_devices = None
+        for workers in worker_counts:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                devices = automationml2sw.get_device_and_db_info(export_dir, workers=workers)
+                elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            reference_devices = reference_devices or devices
+            print(f"workers={workers:>3}: {elapsed:6.2f}s  speedup {baseline / elapsed:4.1f}x  "
+                  f"identical output: {devices == reference_devices}")
+
+
+if __name__ == '__main__':
+    main()
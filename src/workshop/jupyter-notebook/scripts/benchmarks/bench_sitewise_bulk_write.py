@@ -0,0 +1,108 @@
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import click
+import jsonpickle
+from sitewise import sitewise_helper
+
+try:
+    import resource
+except ImportError:  # Windows, peak RSS is then measured with tracemalloc
+    resource = None
+    import tracemalloc
+
+PROPERTIES_PER_MODEL = 1000
+VARIANTS = ("jsonpickle", "streaming", "streaming-compact")
+
+
+class LegacyObject:
+    # the model classes before __slots__: one __dict__ and, for properties, one 'type' dict per instance
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+def legacy_property_type():
+    return {"measurement": {"processingConfig": {"forwardingConfig": {"state": "DISABLED"}}}}
+
+
+def build_legacy_bulk(property_count: int):
+    bulk = LegacyObject(assetModels=[], assets=[])
+    for model_number in range(max(1, property_count // PROPERTIES_PER_MODEL)):
+        asset_model = LegacyObject(assetModelName=f"PLC_{model_number}_model", assetModelExternalId=f"CarFactory_PLC_{model_number}_model",
+                                   assetModelProperties=[], assetModelHierarchies=[])
+        asset = LegacyObject(assetName=f"PLC_{model_number}", assetExternalId=f"CarFactory_PLC_{model_number}",
+                             assetModelExternalId=asset_model.assetModelExternalId, assetProperties=[], assetHierarchies=[])
+        for property_number in range(PROPERTIES_PER_MODEL):
+            name = f"13_Tag_{property_number}"
+            asset_model.assetModelProperties.append(LegacyObject(name=name, externalId=name, dataType="INTEGER", type=legacy_property_type()))
+            asset.assetProperties.append(LegacyObject(externalId=name, alias=f"PLC_{model_number}DB13/Tag_{property_number}"))
+        bulk.assetModels.append(asset_model)
+        bulk.assets.append(asset)
+    return bulk
+
+
+def build_bulk(property_count: int):
+    bulk = sitewise_helper.SiteWiseBulk([], [])
+    for model_number in range(max(1, property_count // PROPERTIES_PER_MODEL)):
+        asset_model = sitewise_helper.AssetModel(f"PLC_{model_number}_model", f"CarFactory_PLC_{model_number}_model")
+        asset = sitewise_helper.Asset.from_asset_model(f"PLC_{model_number}", f"CarFactory_PLC_{model_number}", asset_model)
+        for property_number in range(PROPERTIES_PER_MODEL):
+            name = f"13_Tag_{property_number}"
+            asset_model_property = sitewise_helper.AssetModelProperty(name, name, "INTEGER")
+            asset_model.assetModelProperties.append(asset_model_property)
+            asset.assetProperties.append(sitewise_helper.AssetProperty.from_asset_model_property(
+                asset_model_property, f"PLC_{model_number}DB13/Tag_{property_number}"))
+        bulk.assetModels.append(asset_model)
+        bulk.assets.append(asset)
+    return bulk
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1]
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def run_variant(variant: str, property_count: int, output_file: Path):
+    if resource is None:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if variant == "jsonpickle":
+        bulk = build_legacy_bulk(property_count)
+        with open(output_file, "w") as json_file:
+            json_file.write(jsonpickle.encode(bulk, unpicklable=False, indent=2))
+    else:
+        bulk = build_bulk(property_count)
+        bulk.write_to_file(output_file, compact=variant == "streaming-compact")
+    return {"seconds": time.perf_counter() - started, "peak_rss": peak_rss_bytes(), "bytes": output_file.stat().st_size}
+
+
+@click.command()
+@click.option("--properties", default=100000, show_default=True, help="Asset model properties in the bulk document.")
+@click.option("--variant", type=click.Choice(VARIANTS), help="Internal: run a single variant in this process.")
+@click.option("--output", type=click.Path(path_type=Path), help="Internal: output file of --variant.")
+def main(properties, variant, output):
+    if variant:
+        print(json.dumps(run_variant(variant, properties, output)))
+        return
+    # every variant runs in a fresh interpreter so peak RSS is not shared between them
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"SiteWise bulk document with {properties} properties (build + write)")
+        outputs = {}
+        for variant_name in VARIANTS:
+            outputs[variant_name] = Path(temp_dir, f"{variant_name}.json")
+            result = json.loads(subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_sitewise_bulk_write", "--properties", str(properties),
+                 "--variant", variant_name, "--output", str(outputs[variant_name])],
+                check=True, capture_output=True, text=True).stdout)
+            print(f"{variant_name:>18}: {result['seconds']:6.2f}s, peak RSS {result['peak_rss'] / 2**20:7.1f} MB, "
+                  f"{result['bytes'] / 2**20:6.1f} MB written")
+        print(f"identical output: {outputs['jsonpickle'].read_text() == outputs['streaming'].read_text()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+import contextlib
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import click
+from s7tia import tia_block_helper
+from benchmarks.synthetic_tia_export import write_synthetic_db_export
+
+
+def measure(parse_function, db_export_file):
+    # parsers print a lot, the benchmark only cares about parsing
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        row_count = sum(1 for _ in parse_function(str(db_export_file)))
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        for _ in parse_function(str(db_export_file)):
+            pass
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return row_count, elapsed, peak_bytes
+
+
+@click.command()
+@click.option("--members", default=50000, show_default=True, help="Number of members in the synthetic DB.")
+def main(members):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_export_file = write_synthetic_db_export(Path(temp_dir, "DB_SW.xml"), members)
+        print(f"Synthetic DB with {members} members: {db_export_file.stat().st_size / 2**20:.1f} MB")
+        parsers = {
+            "untangle": tia_block_helper.tia_db_export_to_entries_untangle,
+            "iterparse": tia_block_helper.iter_tia_db_export_entries,
+        }
+        for parser_name, parse_function in parsers.items():
+            row_count, elapsed, peak_bytes = measure(parse_function, db_export_file)
+            print(f"{parser_name:>10}: {row_count} rows in {elapsed:.2f}s, peak {peak_bytes / 2**20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
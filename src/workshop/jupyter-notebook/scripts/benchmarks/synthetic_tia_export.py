@@ -0,0 +1,103 @@
+from pathlib import Path
+
+# Writes TIA Openness style exports (SimaticML DBs and a CAEX AutomationML project) of arbitrary size,
+# streamed line by line so the generator itself never holds the document in memory.
+
+SIMATIC_INTERFACE_NS = "http://www.siemens.com/automation/Openness/SW/Interface/v5"
+DATATYPE_CYCLE = [("Bool", 1), ("Int", 16), ("Real", 32), ("DInt", 32), ("String", 2048), ("UInt", 16)]
+
+
+def write_synthetic_db_export(file_path: Path, member_count: int, db_number: int = 13, db_name: str = "DB_SW"):
+    file_path.parents[0].mkdir(parents=True, exist_ok=True)
+    bit_offset = 0
+    with open(file_path, "w", encoding="utf-8") as xml_file:
+        xml_file.write('<?xml version="1.0" encoding="utf-8"?>\n<Document>\n  <Engineering version="V19" />\n')
+        xml_file.write('  <SW.Blocks.GlobalDB ID="0">\n    <AttributeList>\n      <Interface>'
+                       f'<Sections xmlns="{SIMATIC_INTERFACE_NS}">\n  <Section Name="Static">\n')
+        for member_number in range(member_count):
+            datatype, bit_size = DATATYPE_CYCLE[member_number % len(DATATYPE_CYCLE)]
+            if datatype != "Bool" and bit_offset % 16:
+                bit_offset += 16 - bit_offset % 16
+            xml_file.write(
+                f'    <Member Name="Tag_{member_number}" Datatype="{datatype}" Remanence="NonRetain" Accessibility="Public">\n'
+                '      <AttributeList>\n'
+                f'        <IntegerAttribute Name="Offset" Informative="true" SystemDefined="true">{bit_offset}</IntegerAttribute>\n'
+                '      </AttributeList>\n'
+                f'      <Comment>\n        <MultiLanguageText Lang="en-US">Synthetic tag {member_number}</MultiLanguageText>\n      </Comment>\n'
+                '      <StartValue>0</StartValue>\n'
+                '    </Member>\n')
+            bit_offset += bit_size
+        xml_file.write('  </Section>\n</Sections></Interface>\n'
+                       '      <MemoryLayout>Standard</MemoryLayout>\n'
+                       f'      <Name>{db_name}</Name>\n      <Number>{db_number}</Number>\n'
+                       '      <ProgrammingLanguage>DB</ProgrammingLanguage>\n'
+                       '    </AttributeList>\n  </SW.Blocks.GlobalDB>\n</Document>\n')
+    return file_path
+
+
+def _write_attribute(xml_file, indent: str, name: str, value: str):
+    xml_file.write(f'{indent}<Attribute Name="{name}" AttributeDataType="xs:string"><Value>{value}</Value></Attribute>\n')
+
+
+def plc_name_for(device_number: int) -> str:
+    return f"{device_number // 100 + 1:02d}_PLC_X{device_number % 100 + 1:02d}"
+
+
+def write_synthetic_automationml_export(file_path: Path, device_count: int, io_modules_per_device: int = 8):
+    file_path.parents[0].mkdir(parents=True, exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as xml_file:
+        xml_file.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                       '<CAEXFile FileName="project_automationml.aml" SchemaVersion="2.15">\n'
+                       '  <InstanceHierarchy Name="CarFactory">\n'
+                       '    <InternalElement ID="project" Name="CarFactory">\n')
+        for device_number in range(device_count):
+            plc_name = plc_name_for(device_number)
+            xml_file.write(f'      <InternalElement ID="station_{device_number}" Name="{plc_name}_station">\n')
+            _write_attribute(xml_file, "        ", "TypeIdentifier", "System:Device.S71500")
+            xml_file.write(f'        <InternalElement ID="rack_{device_number}" Name="Rack_0">\n')
+            xml_file.write(f'          <InternalElement ID="cpu_{device_number}" Name="{plc_name}">\n')
+            _write_attribute(xml_file, "            ", "TypeName", "CPU 1516-3 PN/DP")
+            _write_attribute(xml_file, "            ", "OrderNumber", "6ES7 516-3AN02-0AB0")
+            _write_attribute(xml_file, "            ", "FirmwareVersion", "V3.0")
+            _write_attribute(xml_file, "            ", "PositionNumber", "1")
+            _write_attribute(xml_file, "            ", "BuiltIn", "false")
+            xml_file.write(f'            <InternalElement ID="pn_{device_number}" Name="PROFINET interface_1">\n')
+            xml_file.write(f'              <InternalElement ID="e1_{device_number}" Name="E1">\n')
+            _write_attribute(xml_file, "                ", "NetworkAddress",
+                             f"10.{device_number // 65536 % 256}.{device_number // 256 % 256}.{device_number % 256}")
+            _write_attribute(xml_file, "                ", "SubnetMask", "255.255.0.0")
+            _write_attribute(xml_file, "                ", "IpProtocolSelection", "Project")
+            _write_attribute(xml_file, "                ", "Type", "Ethernet")
+            xml_file.write('              </InternalElement>\n')
+            for port_number in range(1, 3):
+                xml_file.write(f'              <InternalElement ID="port_{device_number}_{port_number}" Name="Port_{port_number}">\n')
+                _write_attribute(xml_file, "                ", "PositionNumber", str(port_number))
+                xml_file.write('              </InternalElement>\n')
+            xml_file.write('            </InternalElement>\n')
+            for module_number in range(io_modules_per_device):
+                xml_file.write(f'            <InternalElement ID="io_{device_number}_{module_number}" Name="DI 32x24VDC_{module_number}">\n')
+                _write_attribute(xml_file, "              ", "TypeName", "DI 32x24VDC HF")
+                for channel_number in range(32):
+                    xml_file.write(f'              <InternalElement ID="ch_{device_number}_{module_number}_{channel_number}" '
+                                   f'Name="Channel_{channel_number}">\n')
+                    _write_attribute(xml_file, "                ", "Address", f"I{module_number * 4 + channel_number // 8}.{channel_number % 8}")
+                    xml_file.write('              </InternalElement>\n')
+                xml_file.write('            </InternalElement>\n')
+            xml_file.write('          </InternalElement>\n        </InternalElement>\n      </InternalElement>\n')
+            # non-device assets (HMI connections, subnets) that the extractor has to skip
+            xml_file.write(f'      <InternalElement ID="subnet_{device_number}" Name="PN/IE_{device_number}">\n')
+            _write_attribute(xml_file, "        ", "TypeIdentifier", "System:Subnet.Ethernet")
+            xml_file.write('      </InternalElement>\n')
+        xml_file.write('    </InternalElement>\n  </InstanceHierarchy>\n'
+                       '  <SystemUnitClassLib Name="AutomationProjectConfigurationSystemUnitClassLib" />\n'
+                       '</CAEXFile>\n')
+    return file_path
+
+
+def write_synthetic_project_export(export_dir: Path, device_count: int, members_per_db: int, dbs_per_device: int = 1):
+    write_synthetic_automationml_export(export_dir.joinpath("project_automationml.aml"), device_count, io_modules_per_device=1)
+    for device_number in range(device_count):
+        plc_dir = export_dir.joinpath(plc_name_for(device_number))
+        for db_index in range(dbs_per_device):
+            write_synthetic_db_export(plc_dir.joinpath(f"{db_index:02d}DB_SW.xml"), members_per_db, db_number=13 + db_index)
+    return export_dir
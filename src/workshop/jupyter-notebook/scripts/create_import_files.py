@@ -0,0 +1,58 @@
+import click
+import time
+from pathlib import Path
+from s7tia import automationml2sw
+from s7tia.parse_cache import ParseCache
+from s7tia.tag_registry import TagRegistry
+from sfc import s7tia2sfc
+from sitewise import s7tia2sitewise
+from sitewise.bulk_validator import check_bulk
+
+
+def create_sitewise_import_file(devices, project_name, top_hierarchy_asset_name, output_file, dedupmodels, compact):
+    sw_bulk_import = s7tia2sitewise.add_or_create_to_sw_import(devices, project_name, top_hierarchy_asset_name)
+    if dedupmodels:
+        report = s7tia2sitewise.deduplicate_asset_models(sw_bulk_import, project_name)
+        print(f"collapsed {report['collapsed']} asset models, {report['models_before']} -> {report['models_after']}")
+    check_bulk(sw_bulk_import)
+    sw_bulk_import.write_to_file(output_file, compact)
+    return output_file
+
+
+@click.command()
+@click.option('--region', required=True, default='us-east-1', show_default=True, help='AWS Region Code, used for Regional Ingestion Targets')
+@click.option('--dedupmodels', is_flag=True, show_default=True, default=False, help='Share one asset model between PLCs with identical properties instead of one model per PLC.')
+@click.option('--compact', is_flag=True, show_default=True, default=False, help='Write the SiteWise JSON without indentation.')
+@click.option('--workers', required=False, type=int, help='Number of processes parsing the DB exports, defaults to the CPU count.')
+@click.option('--nocache', is_flag=True, show_default=True, default=False, help='Re-parse all TIA exports instead of reusing unchanged ones from the parse cache.')
+def main(region, dedupmodels, compact, workers, nocache):
+    """Parses the TIA export once into a tag registry and creates the SiteWise import and the SFC config from it.
+
+    The SFC SiteWise target writes to the same property aliases the SiteWise import defines. Greengrass packaging
+    and IoT certificate credentials stay with create_sfc_config_files.py."""
+    project_name = "CarFactory"
+    tia_export_dir = Path("C://Users//Administrator//Documents//TIA-Export")
+    top_hierarchy_asset_name = "Plant_LAS"
+    Path("../imports/sitewise").mkdir(parents=True, exist_ok=True)
+    sfc_output = Path("../imports/sfc", project_name)
+    sfc_output.mkdir(parents=True, exist_ok=True)
+    cache = None if nocache else ParseCache()
+
+    started = time.perf_counter()
+    registry = TagRegistry.from_devices(automationml2sw.iter_devices(tia_export_dir, workers=workers, cache=cache))
+    print(f"registered {len(registry)} tags of {len(registry.device_info)} PLCs in {time.perf_counter() - started:.1f}s")
+    duplicates = registry.duplicate_aliases()
+    if len(duplicates) > 0:
+        raise click.ClickException(f"{len(duplicates)} aliases are claimed by more than one tag, e.g. {duplicates[:5]}")
+
+    # the devices view materializes its rows on access, both generators read the same materialized devices
+    devices = dict(registry.devices)
+    create_sitewise_import_file(devices, project_name, top_hierarchy_asset_name,
+                                Path("../imports/sitewise", f"{project_name}.sitewise.json"), dedupmodels, compact)
+    s7tia2sfc.create_sfc_import_files(devices, sfc_output, region, 'ENV_SESSION_CREDENTIALS', False, None, None, {})
+    registry.write(Path("../imports", f"{project_name}.tag_registry.json"))
+    print(f"wrote SiteWise import, SFC config and tag registry in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
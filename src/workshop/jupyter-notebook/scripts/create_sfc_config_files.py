@@ -1,7 +1,12 @@
 import click
 from pathlib import Path
 from s7tia import automationml2sw
+from s7tia.parse_cache import ParseCache
 from sfc import s7tia2sfc
+from sfc.adapter_shards import DEFAULT_ADAPTER_ADDRESS, DEFAULT_ADAPTER_BASE_PORT, AdapterShards
+from sfc.gg_artifacts import DEFAULT_ARTIFACT_PREFIX, ArtifactStore
+from sfc.rate_policy import DEFAULT_RATE_POLICY_FILE, RatePolicy
+from sfc.s7_read_plan import DEFAULT_GAP_BYTES, DEFAULT_PDU_SIZE, DEFAULT_ROUND_TRIP_MS, ReadPlanner
 
 @click.command()
 @click.option('--region', required=True, default='us-east-1', show_default=True, help='AWS Region Code, used for Regional Ingestion Targets')
@@ -17,14 +22,32 @@ from sfc import s7tia2sfc
 @click.option('--privatekeyfilepath', required=False, help='Use when credentialprovider is AWS_IOT_CERT! < PATH TO PRIVATE KEY .key FILE >')
 @click.option('--rootcafilepath', required=False, help='Use when credentialprovider is AWS_IOT_CERT! < PATH TO ROOT CERTIFICATE .pem FILE >')
 @click.option('--greengrasspath', required=False, show_default=True, default='/greengrass/v2', help='Use when credentialprovider is AWS_IOT_CERT! e.g. /greengrass/v2')
+@click.option('--workers', required=False, type=int, help='Number of processes parsing the DB exports, defaults to the CPU count.')
+@click.option('--readplan', is_flag=True, show_default=True, default=False, help='Write s7_read_plan.json, the estimated S7 PDUs per scan with and without coalescing the channels into byte ranges.')
+@click.option('--pdusize', type=int, default=DEFAULT_PDU_SIZE, show_default=True, help='Use with --readplan! Negotiated S7 PDU size, 240 for S7-1200/300.')
+@click.option('--gapbytes', type=int, default=DEFAULT_GAP_BYTES, show_default=True, help='Use with --readplan! Unused bytes between two channels that are still read as one range.')
+@click.option('--roundtripms', type=float, default=DEFAULT_ROUND_TRIP_MS, show_default=True, help='Use with --readplan! Time of one S7 request/response.')
+@click.option('--coalesce', is_flag=True, show_default=True, default=False, help='Use with --readplan! Orders the channels of every source by read range.')
+@click.option('--ratepolicy', required=False, type=click.Path(exists=True, path_type=Path), help=f'JSON read intervals per tag name, datatype or DB (e.g. {DEFAULT_RATE_POLICY_FILE.name}), creates one schedule per interval instead of the single 500 ms schedule.')
+@click.option('--adaptershards', type=int, default=1, show_default=True, help='Number of S7 protocol adapter processes (SFC IPC adapters), controllers are balanced by tag count and read rate.')
+@click.option('--adapteraddress', default=DEFAULT_ADAPTER_ADDRESS, show_default=True, help='Use with --adaptershards! Host running the adapter processes.')
+@click.option('--adapterbaseport', type=int, default=DEFAULT_ADAPTER_BASE_PORT, show_default=True, help='Use with --adaptershards! Port of the first adapter process, the following shards count up.')
+@click.option('--artifactbucket', required=False, help='Use with --creategreengrassinstaller! S3 bucket for the component artifacts, the recipe references installer and config zip by URI & digest instead of inline base64.')
+@click.option('--artifactprefix', default=DEFAULT_ARTIFACT_PREFIX, show_default=True, help='Use with --artifactbucket! Key prefix of the content-addressed artifacts.')
+@click.option('--s3endpoint', required=False, help='Use with --artifactbucket! S3 endpoint URL, e.g. a local S3 stand-in like http://localhost:9000')
+@click.option('--force', is_flag=True, show_default=True, default=False, help='Write the SFC package even when its content hash matches the previous build.')
+@click.option('--nocache', is_flag=True, show_default=True, default=False, help='Re-parse all TIA exports instead of reusing unchanged ones from the parse cache.')
 
-def main(region, credentialprovider, creategreengrassinstaller, thingarn, greengrasscompversion, iotcredentialendpoint, rolealias, thingname, certfilepath, privatekeyfilepath, rootcafilepath, greengrasspath):
+def main(region, credentialprovider, creategreengrassinstaller, thingarn, greengrasscompversion, iotcredentialendpoint, rolealias, thingname, certfilepath, privatekeyfilepath, rootcafilepath, greengrasspath, workers, readplan, pdusize, gapbytes, roundtripms, coalesce, ratepolicy, adaptershards, adapteraddress, adapterbaseport, artifactbucket, artifactprefix, s3endpoint, force, nocache):
+    if coalesce and not readplan:
+        raise click.UsageError('--coalesce orders the channels by the read plan, use it together with --readplan')
     project_name = "CarFactory"
     tia_export_dir = Path("C://Users//Administrator//Documents//TIA-Export")
     Path("../imports/sfc").mkdir(parents=True, exist_ok=True)
     sfc_output = Path("../imports/sfc", project_name)
     sfc_output.mkdir(parents=True, exist_ok=True)
-    devices = automationml2sw.get_device_and_db_info(tia_export_dir)
+    cache = None if nocache else ParseCache()
+    devices = automationml2sw.iter_devices(tia_export_dir, workers=workers, cache=cache)
 
     iot_cert_params={}
     iot_cert_params.update({'endpoint':iotcredentialendpoint})
@@ -37,7 +60,12 @@ def main(region, credentialprovider, creategreengrassinstaller, thingarn, greeng
     iot_cert_params.update({'greengrasspath':greengrasspath})
     
 
-    s7tia2sfc.create_sfc_import_files(devices, sfc_output, region, credentialprovider, creategreengrassinstaller, thingarn, greengrasscompversion, iot_cert_params)
+    read_planner = ReadPlanner(pdusize, gapbytes, roundtripms) if readplan else None
+    rate_policy = RatePolicy.from_file(ratepolicy) if ratepolicy else None
+    adapter_shards = AdapterShards(adaptershards, adapteraddress, adapterbaseport) if adaptershards > 1 else None
+    artifact_store = ArtifactStore(artifactbucket, artifactprefix, region=region, endpoint_url=s3endpoint) if artifactbucket else None
+
+    s7tia2sfc.create_sfc_import_files(devices, sfc_output, region, credentialprovider, creategreengrassinstaller, thingarn, greengrasscompversion, iot_cert_params, read_planner, coalesce, rate_policy, adapter_shards, force, artifact_store)
 
 
 if __name__ == '__main__':
@@ -1,14 +1,41 @@
+import click
 from pathlib import Path
 from s7tia import automationml2sw
+from s7tia.parse_cache import ParseCache
 from sitewise import s7tia2sitewise
+from sitewise.bulk_validator import check_bulk
+from sitewise.sitewise_helper import DEFAULT_MAX_SHARD_BYTES, DEFAULT_MAX_SHARD_ENTITIES
 
-if __name__ == '__main__':
+
+@click.command()
+@click.option('--shard', is_flag=True, show_default=True, default=False, help='Split the import into dependency ordered shards plus a manifest of the waves that can be imported in parallel, instead of one file.')
+@click.option('--maxshardbytes', type=int, default=DEFAULT_MAX_SHARD_BYTES, show_default=True, help='Use with --shard! Maximum size of a shard file.')
+@click.option('--maxshardentities', type=int, default=DEFAULT_MAX_SHARD_ENTITIES, show_default=True, help='Use with --shard! Maximum number of asset models or assets per shard.')
+@click.option('--dedupmodels', is_flag=True, show_default=True, default=False, help='Share one asset model between PLCs with identical properties instead of one model per PLC.')
+@click.option('--compact', is_flag=True, show_default=True, default=False, help='Write the JSON without indentation.')
+def main(shard, maxshardbytes, maxshardentities, dedupmodels, compact):
     project_name = "CarFactory"
     tia_export_dir = Path("C://Users//Administrator//Documents//TIA-Export")
     Path("../imports/sitewise").mkdir(parents=True, exist_ok=True)
     sw_output_bulk_file = Path("../imports/sitewise", f"{project_name}.sitewise.json")
     top_hierarchy_asset_name = "Plant_LAS"
 
-    devices = automationml2sw.get_device_and_db_info(tia_export_dir)
+    devices = automationml2sw.get_device_and_db_info(tia_export_dir, cache=ParseCache())
     sw_bulk_import = s7tia2sitewise.add_or_create_to_sw_import(devices, project_name, top_hierarchy_asset_name)
-    sw_bulk_import.write_to_file(sw_output_bulk_file)
+    if dedupmodels:
+        report = s7tia2sitewise.deduplicate_asset_models(sw_bulk_import, project_name)
+        print(f"collapsed {report['collapsed']} asset models, {report['models_before']} -> {report['models_after']}")
+        for shared_model_id, model_ids in report["shared_models"].items():
+            print(f"  {shared_model_id}: {len(model_ids)} models")
+    check_bulk(sw_bulk_import)
+    if shard:
+        manifest = sw_bulk_import.write_shards(Path("../imports/sitewise", project_name), project_name,
+                                               maxshardbytes, maxshardentities, compact)
+        for wave in manifest["waves"]:
+            print(f"wave {wave['wave']}: {len(wave['shards'])} {wave['type']} shard(s)")
+    else:
+        sw_bulk_import.write_to_file(sw_output_bulk_file, compact)
+
+
+if __name__ == '__main__':
+    main()
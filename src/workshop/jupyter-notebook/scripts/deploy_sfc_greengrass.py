@@ -0,0 +1,49 @@
+import json
+import boto3
+import click
+from pathlib import Path
+from sfc import s7tia2sfc
+from sfc.gg_artifacts import DEFAULT_ARTIFACT_PREFIX, ArtifactStore
+from sfc.gg_rollout import (DEFAULT_DEPLOYMENTS_PER_SECOND, DEFAULT_PACKAGE_ROOT, DEFAULT_ROLLOUT_FILE,
+                            DEFAULT_ROLLOUT_WORKERS, Rollout, load_rollout_targets)
+
+
+@click.command()
+@click.option('--region', required=True, default='us-east-1', show_default=True, help='AWS Region Code of the Greengrass targets')
+@click.option('--targets', default=str(DEFAULT_ROLLOUT_FILE), show_default=True, type=click.Path(exists=True, path_type=Path), help='Greengrass targets (thing or thing group ARN) and the SFC package of each.')
+@click.option('--packageroot', default=str(DEFAULT_PACKAGE_ROOT), show_default=True, type=click.Path(path_type=Path), help='Directory of the per-target packages (<packageroot>/<target name>) when a target names none.')
+@click.option('--greengrasscompversion', required=False, default='1.0.1', show_default=True, help='Semver Version of the deployed Greengrass Component. With --artifactbucket the patch version of a target whose package changed is bumped automatically.')
+@click.option('--artifactbucket', required=False, help='S3 bucket for the component artifacts, the recipe references installer and config zip by URI & digest instead of inline base64.')
+@click.option('--artifactprefix', default=DEFAULT_ARTIFACT_PREFIX, show_default=True, help='Use with --artifactbucket! Key prefix of the content-addressed artifacts.')
+@click.option('--s3endpoint', required=False, help='Use with --artifactbucket! S3 endpoint URL, e.g. a local S3 stand-in like http://localhost:9000')
+@click.option('--workers', type=int, default=DEFAULT_ROLLOUT_WORKERS, show_default=True, help='Targets deployed at the same time.')
+@click.option('--rate', type=float, default=DEFAULT_DEPLOYMENTS_PER_SECOND, show_default=True, help='Maximum CreateDeployment calls per second.')
+@click.option('--timeout', type=float, default=600, show_default=True, help='Seconds to wait for the core devices to finish their deployment, 0 does not wait.')
+@click.option('--pollseconds', type=float, default=10, show_default=True, help='Use with --timeout! Seconds between two status checks.')
+@click.option('--force', is_flag=True, show_default=True, default=False, help='Deploy also to targets whose latest deployment has the same config hash.')
+def main(region, targets, packageroot, greengrasscompversion, artifactbucket, artifactprefix, s3endpoint, workers, rate, timeout, pollseconds, force):
+    """Deploys the SFC package of every target to Greengrass, skips targets whose config is unchanged."""
+    if s7tia2sfc.check_aws_creds() is False:
+        raise click.ClickException('No AWS session credentials available')
+    artifact_store = ArtifactStore(artifactbucket, artifactprefix, region=region, endpoint_url=s3endpoint) if artifactbucket else None
+    rollout = Rollout(load_rollout_targets(targets, packageroot), boto3.client('greengrassv2', region_name=region),
+                      s7tia2sfc.sfcVersionInUse, greengrasscompversion, region, artifact_store, workers, rate, force,
+                      progress=lambda line: click.echo('\r' + line.ljust(100), nl=False))
+    rollout.run()
+    done = rollout.track(timeout, pollseconds) if timeout > 0 else True
+    click.echo('')
+
+    report = rollout.report()
+    with open(targets.parent / "gg_rollout_report.json", "w") as json_file:
+        json_file.write(json.dumps(report, sort_keys=True, indent=4))
+    for target_name, target in report["targets"].items():
+        click.echo(f"{target_name:<24} {target['state']:<12} {target['deploymentId'] or '-':<38} {target['detail']}")
+    failed = report["summary"].get("FAILED", 0)
+    if failed > 0:
+        raise click.ClickException(f"{failed} target(s) failed")
+    if not done:
+        raise click.ClickException(f"deployments still running after {timeout:.0f}s, see gg_rollout_report.json")
+
+
+if __name__ == '__main__':
+    main()
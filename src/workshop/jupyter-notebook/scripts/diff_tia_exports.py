@@ -0,0 +1,54 @@
+import json
+import click
+from pathlib import Path
+from s7tia import export_diff
+from s7tia.parse_cache import ParseCache
+
+
+def write_changeset(changeset, changeset_dir: Path, sequence_number: int):
+    changeset_dir.mkdir(parents=True, exist_ok=True)
+    changeset_file = changeset_dir.joinpath(f"changeset_{sequence_number:04d}.json")
+    with open(changeset_file, "w") as json_file:
+        json_file.write(json.dumps(changeset, indent=2))
+    return changeset_file
+
+
+@click.command()
+@click.argument('old', type=click.Path(exists=True, path_type=Path))
+@click.argument('new', type=click.Path(exists=True, path_type=Path))
+@click.option('--changesetdir', default='../imports/changesets', show_default=True, type=click.Path(path_type=Path), help='Directory the json changesets are written to.')
+@click.option('--savesnapshot', type=click.Path(path_type=Path), help='Write the parsed NEW export as json snapshot, usable as OLD in later runs.')
+@click.option('--watch', is_flag=True, default=False, help='Keep watching the NEW export directory and emit a changeset for every re-export.')
+@click.option('--interval', default=2.0, show_default=True, help='Polling interval of --watch in seconds.')
+def main(old, new, changesetdir, savesnapshot, watch, interval):
+    """Compares two TIA exports (directories or json snapshots) on tag level."""
+    cache = ParseCache()
+    old_devices = export_diff.load_snapshot(old, cache)
+    new_devices = export_diff.load_snapshot(new, cache)
+    changeset = export_diff.diff_snapshots(old_devices, new_devices)
+    print(f"Changeset: {export_diff.summarize(changeset)}")
+    print(f"Changed PLCs: {export_diff.changed_plcs(changeset)}")
+    sequence_number = 0
+    if not export_diff.is_empty(changeset):
+        print(f"-> {write_changeset(changeset, changesetdir, sequence_number)}")
+    if savesnapshot:
+        export_diff.write_snapshot(new_devices, savesnapshot)
+
+    if watch:
+        def on_changeset(watched_changeset, devices):
+            nonlocal sequence_number
+            sequence_number += 1
+            print(f"Changeset: {export_diff.summarize(watched_changeset)}")
+            print(f"-> {write_changeset(watched_changeset, changesetdir, sequence_number)}")
+            if savesnapshot:
+                export_diff.write_snapshot(devices, savesnapshot)
+
+        print(f"Watching {new} for new exports, stop with Ctrl+C")
+        try:
+            export_diff.watch_export_dir(new, on_changeset, baseline=new_devices, cache=cache, interval=interval)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -6,4 +6,4 @@ if __name__ == '__main__':
 
     project = get_first_project_of_running_process()
     export_automationml(base_export_dir, project)
-    export_all_groups_and_blocks_from_all_plcs(base_export_dir, project)
+    export_selected_blocks_from_all_plcs(base_export_dir, project)
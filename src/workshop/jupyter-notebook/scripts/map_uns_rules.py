@@ -0,0 +1,50 @@
+import json
+import click
+from pathlib import Path
+from s7tia import automationml2sw
+from s7tia.parse_cache import ParseCache
+from sitewise.uns_rules import (ASSETS_SCHEMA_FILE, DEFAULT_RULES_FILE, HIERARCHY_SCHEMA_FILE, SFC_TARGET_FILE, UnsRules,
+                                map_devices, merge_llm_answer)
+
+
+def write_json(data, path: Path):
+    with open(path, "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file, ensure_ascii=False, indent=4)
+
+
+@click.command()
+@click.option('--region', required=True, default='us-east-1', show_default=True, help='AWS Region Code of the SFC SiteWise target.')
+@click.option('--rules', default=str(DEFAULT_RULES_FILE), show_default=True, type=click.Path(exists=True, path_type=Path), help='UNS rule file, PLC and DB entry patterns to ISA-95 assets and property names.')
+@click.option('--exportdir', default='C://Users//Administrator//Documents//TIA-Export', show_default=True, type=click.Path(exists=True, path_type=Path), help='TIA export directory.')
+@click.option('--outputdir', default='..', show_default=True, type=click.Path(file_okay=False, path_type=Path), help='Directory of the genai_*.json files the 03 notebook imports.')
+@click.option('--metafile', default='../tia_portal_meta.txt', show_default=True, type=click.Path(path_type=Path), help='PLC comments written by the 01 notebook, the lines of unmatched PLCs become the Bedrock context.')
+@click.option('--workers', required=False, type=int, help='Number of processes parsing the DB exports, defaults to the CPU count.')
+@click.option('--merge', 'llmdir', required=False, type=click.Path(exists=True, file_okay=False, path_type=Path), help='Directory with the genai_*.json files the 02 notebook wrote for genai_unmatched.json, merged into the rule result.')
+def main(region, rules, exportdir, outputdir, metafile, workers, llmdir):
+    """Maps the PLCs of the TIA export onto SiteWise assets and SFC DataPaths with a rule table, Bedrock is only needed for what stays unmatched."""
+    outputdir.mkdir(parents=True, exist_ok=True)
+    devices = automationml2sw.iter_devices(exportdir, workers=workers, cache=ParseCache())
+    mapping = map_devices(devices, UnsRules.from_file(rules), region)
+
+    if llmdir is not None:
+        # final documents: rules first, the LLM answer fills the gaps
+        for file_name, document in merge_llm_answer(mapping, llmdir).items():
+            write_json(document, outputdir.joinpath(file_name))
+        print(f"mapped {len(mapping.cells)} PLC(s) by rule, merged the LLM answer of {llmdir}")
+        return
+    write_json(mapping.assets_schema(), outputdir.joinpath(ASSETS_SCHEMA_FILE))
+    write_json(mapping.hierarchy_schema(), outputdir.joinpath(HIERARCHY_SCHEMA_FILE))
+    write_json(mapping.sfc_target(), outputdir.joinpath(SFC_TARGET_FILE))
+    print(f"mapped {len(mapping.cells)} PLC(s) by rule")
+    if mapping.is_complete():
+        print("all PLCs and properties resolved, no Bedrock call needed")
+        return
+    write_json(mapping.unmatched(), outputdir.joinpath("genai_unmatched.json"))
+    if metafile.is_file():
+        outputdir.joinpath("tia_portal_meta_unmatched.txt").write_text(mapping.llm_context(metafile.read_text()))
+    print(f"unmatched: {len(mapping.unmatched_plcs)} PLC(s), {len(mapping.missing_properties)} asset(s) with missing properties"
+          f" -> {outputdir.joinpath('genai_unmatched.json')}, merge the Bedrock answer with --merge")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import json
+import click
+from pathlib import Path
+from s7tia import automationml2sw
+from s7tia.parse_cache import ParseCache
+from sfc import s7tia2sfc
+from sfc.gateway_plan import DEFAULT_GATEWAY_INVENTORY_FILE, load_gateway_inventory, plan_gateways
+from sfc.rate_policy import RatePolicy
+from sfc.s7_read_plan import DEFAULT_SCHEDULE_INTERVAL_MS
+
+
+@click.command()
+@click.option('--region', required=True, default='us-east-1', show_default=True, help='AWS Region Code, used for Regional Ingestion Targets')
+@click.option('--gateways', default=str(DEFAULT_GATEWAY_INVENTORY_FILE), show_default=True, type=click.Path(exists=True, path_type=Path), help='Gateway inventory, subnets and capacity limits of every edge gateway.')
+@click.option('--ratepolicy', required=False, type=click.Path(exists=True, path_type=Path), help='JSON read intervals per tag name, datatype or DB, used for the load and the schedules of every package.')
+@click.option('--planonly', is_flag=True, show_default=True, default=False, help='Only print and write the plan, no SFC config packages.')
+def main(region, gateways, ratepolicy, planonly):
+    """Bin-packs the PLCs onto the edge gateways that reach them and writes one SFC config package per gateway."""
+    project_name = "CarFactory"
+    tia_export_dir = Path("C://Users//Administrator//Documents//TIA-Export")
+    sfc_output = Path("../imports/sfc", project_name, "gateways")
+    sfc_output.mkdir(parents=True, exist_ok=True)
+
+    devices = automationml2sw.get_device_and_db_info(tia_export_dir, cache=ParseCache())
+    rate_policy = RatePolicy.from_file(ratepolicy, DEFAULT_SCHEDULE_INTERVAL_MS) if ratepolicy else None
+    plan = plan_gateways(devices, load_gateway_inventory(gateways), rate_policy)
+    summary = plan.summary()
+    with open(sfc_output / "gateway_plan.json", "w") as json_file:
+        json_file.write(json.dumps(summary, sort_keys=True, indent=4))
+
+    print(f"{'gateway':<24} {'PLCs':>5} {'tags':>8} {'reads/s':>10} {'SiteWise values/s':>18} {'PutValue req/s':>15} {'util':>6}")
+    for gateway_name, gateway in summary["gateways"].items():
+        utilization = f"{gateway['utilization']:.0%}" if gateway["utilization"] is not None else "-"
+        print(f"{gateway_name:<24} {len(gateway['plcs']):>5} {gateway['tags']:>8} {gateway['reads_per_second']:>10.0f} "
+              f"{gateway['sitewise_values_per_second']:>18.0f} {gateway['sitewise_put_requests_per_second']:>15.1f} {utilization:>6}")
+    for plc_name, unplaced in summary["unplaced"].items():
+        print(f"NOT PLACED {plc_name} ({unplaced['address']}): {unplaced['reason']}")
+    if planonly:
+        return
+
+    for gateway_name, plc_names in plan.assignments().items():
+        if len(plc_names) == 0:
+            continue
+        gateway_output = sfc_output / gateway_name
+        gateway_output.mkdir(parents=True, exist_ok=True)
+        s7tia2sfc.create_sfc_import_files({plc_name: devices[plc_name] for plc_name in plc_names}, gateway_output, region,
+                                          'ENV_SESSION_CREDENTIALS', False, None, None, {}, rate_policy=rate_policy)
+    if len(summary["unplaced"]) > 0:
+        raise click.ClickException(f"{len(summary['unplaced'])} PLC(s) could not be placed on any gateway")
+
+
+if __name__ == '__main__':
+    main()
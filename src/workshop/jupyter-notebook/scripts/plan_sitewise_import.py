@@ -0,0 +1,57 @@
+import json
+import time
+import click
+from pathlib import Path
+from s7tia import automationml2sw
+from s7tia.parse_cache import ParseCache
+from sitewise import s7tia2sitewise, sitewise_plan
+from sitewise.bulk_validator import check_bulk
+
+
+@click.command()
+@click.option('--region', required=True, default='us-east-1', show_default=True, help='AWS Region Code of the SiteWise and TwinMaker endpoints.')
+@click.option('--apply', 'apply_plan', is_flag=True, show_default=True, default=False, help='Execute the plan: import the reduced bulk and delete the entities of the project that are no longer generated.')
+@click.option('--bucket', required=False, help='Use with --apply! S3 bucket the reduced bulk file is uploaded to.')
+@click.option('--refresh', is_flag=True, show_default=True, default=False, help='Describe every live entity again instead of reusing unchanged ones from the live state cache.')
+@click.option('--dedupmodels', is_flag=True, show_default=True, default=False, help='Share one asset model between PLCs with identical properties, as create_sitewise_import_file.py --dedupmodels does.')
+def main(region, apply_plan, bucket, refresh, dedupmodels):
+    import boto3
+    project_name = "CarFactory"
+    tia_export_dir = Path("C://Users//Administrator//Documents//TIA-Export")
+    plan_output_dir = Path("../imports/sitewise", "plan")
+    top_hierarchy_asset_name = "Plant_LAS"
+    if apply_plan and not bucket:
+        raise click.UsageError("--apply needs --bucket")
+
+    devices = automationml2sw.get_device_and_db_info(tia_export_dir, cache=ParseCache())
+    sw_bulk_import = s7tia2sitewise.add_or_create_to_sw_import(devices, project_name, top_hierarchy_asset_name)
+    if dedupmodels:
+        s7tia2sitewise.deduplicate_asset_models(sw_bulk_import, project_name)
+    check_bulk(sw_bulk_import)
+
+    sitewise_client = boto3.client('iotsitewise', region_name=region)
+    started = time.perf_counter()
+    cache_file = sitewise_plan.LIVE_STATE_CACHE_DIR.joinpath(f"{project_name}_{region}.json")
+    if refresh:
+        cache_file.unlink(missing_ok=True)
+    live_state = sitewise_plan.LiveSiteWiseState(cache_file).refresh(
+        sitewise_client, lambda external_id: external_id is not None and external_id.startswith(f"{project_name}_"))
+    plan = sitewise_plan.plan(sw_bulk_import, live_state, project_name)
+    print(f"live state fetched with {live_state.describe_calls} describe calls in {time.perf_counter() - started:.1f}s")
+    print(json.dumps(plan.summary(), indent=2))
+
+    plan_output_dir.mkdir(parents=True, exist_ok=True)
+    with open(plan_output_dir.joinpath(f"{project_name}.plan.json"), "w") as json_file:
+        json_file.write(json.dumps(plan.to_dict(), indent=2))
+    plan.reduced_bulk.write_to_file(plan_output_dir.joinpath(f"{project_name}.plan.sitewise.json"))
+    if plan.is_empty():
+        print("SiteWise is up to date")
+        return
+    if apply_plan:
+        result = sitewise_plan.apply(plan, sitewise_client, boto3.client('iottwinmaker', region_name=region),
+                                     boto3.client('s3', region_name=region), bucket, plan_output_dir)
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import json
+import time
+import click
+from pathlib import Path
+from s7tia.parse_cache import ParseCache
+from s7tia.tag_catalog_sqlite import DEFAULT_CATALOG_FILE, SqliteTagCatalog
+
+
+@click.group()
+@click.option('--catalog', default=str(DEFAULT_CATALOG_FILE), show_default=True, type=click.Path(path_type=Path), help='SQLite tag catalog file.')
+@click.pass_context
+def main(ctx, catalog):
+    """Indexed queries over the tags of the parsed TIA exports."""
+    ctx.obj = SqliteTagCatalog(catalog)
+    ctx.call_on_close(ctx.obj.close)
+
+
+def print_result(result, started):
+    print(json.dumps(result, indent=2))
+    print(f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+
+@main.command()
+@click.option('--exportdir', default='C://Users//Administrator//Documents//TIA-Export', show_default=True, type=click.Path(exists=True, path_type=Path), help='TIA export directory.')
+@click.pass_obj
+def refresh(catalog, exportdir):
+    """Re-parses the DB exports that changed since the last refresh."""
+    started = time.perf_counter()
+    print_result(catalog.refresh(exportdir, cache=ParseCache()), started)
+
+
+@main.command()
+@click.argument('name')
+@click.pass_obj
+def plcs(catalog, name):
+    """PLCs exposing a tag NAME (globs allowed, e.g. 'Seq_*')."""
+    started = time.perf_counter()
+    print_result(catalog.plcs_with_tag(name), started)
+
+
+@main.command()
+@click.option('--plc', help='PLC name or glob.')
+@click.option('--db', 'db_number', type=int, help='DB number.')
+@click.option('--name', help='Tag name or glob.')
+@click.option('--datatype', help='S7 datatype or glob, e.g. Bool.')
+@click.option('--limit', type=int, default=100, show_default=True)
+@click.pass_obj
+def tags(catalog, plc, db_number, name, datatype, limit):
+    """Tags matching all given filters."""
+    started = time.perf_counter()
+    print_result(catalog.tags(plc=plc, db_number=db_number, name=name, datatype=datatype, limit=limit), started)
+
+
+@main.command()
+@click.argument('alias')
+@click.pass_obj
+def alias(catalog, alias):
+    """The tag behind a SiteWise property ALIAS."""
+    started = time.perf_counter()
+    print_result(catalog.find_alias(alias), started)
+
+
+@main.command()
+@click.argument('column', type=click.Choice(['plc', 'db_number', 'datatype']))
+@click.pass_obj
+def count(catalog, column):
+    """Number of tags per COLUMN value."""
+    started = time.perf_counter()
+    print_result(catalog.count_by(column), started)
+
+
+if __name__ == '__main__':
+    main()
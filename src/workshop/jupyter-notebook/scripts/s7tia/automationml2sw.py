@@ -1,11 +1,35 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from .tia_automationml_helper import automationml_export_to_entries
+from . import tia_automationml_helper, tia_block_helper
+from .tia_automationml_helper import automationml_export_to_entries, iter_automationml_devices
+from .db_layout import DbLayoutEngine
 from .tia_block_helper import tia_db_export_to_entries
 
+# 'attributes' are the AutomationML attributes of the PLC (TypeName, OrderNumber, ...), 'asset_name' is always set
+DEVICE_FIELDS = ("attributes", "ethernet", "entries")
+# UDT layouts of the pool worker process, shared by all DB exports it parses
+_worker_layout_engine = None
 
-def get_devices_and_db_names(project_export_dir, automation_ml_file_name="project_automationml.aml"):
-    devices = automationml_export_to_entries(
-        str(Path(project_export_dir, automation_ml_file_name)))
+
+def _init_worker_layout_engine():
+    global _worker_layout_engine
+    _worker_layout_engine = DbLayoutEngine()
+
+
+def _parse_db_export(db_export_file_name):
+    return tia_db_export_to_entries(db_export_file_name, _worker_layout_engine)
+
+
+def load_automationml_export(automationml_file, cache=None):
+    if cache is None:
+        return automationml_export_to_entries(str(automationml_file))
+    return cache.parse(automationml_file, automationml_export_to_entries, tia_automationml_helper.PARSER_VERSION)
+
+
+def get_devices_and_db_names(project_export_dir, automation_ml_file_name="project_automationml.aml", cache=None):
+    devices = load_automationml_export(Path(project_export_dir, automation_ml_file_name), cache)
 
     for device_name, device in devices.items():
         print(f"load DB for PLC {device_name}")
@@ -16,10 +40,41 @@ def get_devices_and_db_names(project_export_dir, automation_ml_file_name="projec
     return devices
 
 
-def get_device_and_db_info(project_export_dir, automation_ml_file_name="project_automationml.aml"):
-    devices = automationml_export_to_entries(
-        str(Path(project_export_dir, automation_ml_file_name)))
+def load_db_exports(db_export_files, workers=None, cache=None):
+    if cache is not None:
+        return _load_cached_db_exports(db_export_files, workers, cache)
+    # parses the DB exports in a process pool, results come back in the order of db_export_files
+    workers = min(workers or os.cpu_count() or 1, len(db_export_files))
+    db_export_file_names = [str(db_export_file) for db_export_file in db_export_files]
+    if workers <= 1:
+        # one engine for the whole call, every UDT is laid out once
+        layout_engine = DbLayoutEngine()
+        return [tia_db_export_to_entries(db_export_file_name, layout_engine) for db_export_file_name in db_export_file_names]
+    chunk_size = max(1, len(db_export_file_names) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_layout_engine) as executor:
+        return list(executor.map(_parse_db_export, db_export_file_names, chunksize=chunk_size))
 
+
+def _load_cached_db_exports(db_export_files, workers, cache):
+    # only the exports without a cache entry are parsed, the pool never sees warm files
+    cache_keys = [cache.key_for_file(db_export_file, tia_db_export_to_entries, tia_block_helper.PARSER_VERSION)
+                  for db_export_file in db_export_files]
+    all_db_entries = [cache.get(cache_key) for cache_key in cache_keys]
+    missing = [index for index, db_entries in enumerate(all_db_entries) if db_entries is None]
+    parsed_db_entries = load_db_exports([db_export_files[index] for index in missing], workers)
+    for index, db_entries in zip(missing, parsed_db_entries):
+        cache.put(cache_keys[index], db_entries, evict=False)
+        all_db_entries[index] = db_entries
+    if len(missing) > 0:
+        cache.evict()
+    return all_db_entries
+
+
+def get_device_and_db_info(project_export_dir, automation_ml_file_name="project_automationml.aml", workers=None,
+                           cache=None):
+    devices = load_automationml_export(Path(project_export_dir, automation_ml_file_name), cache)
+
+    db_export_jobs = []
     for device_name, device in devices.items():
         print(f"load DB for PLC {device_name}")
         plc_base_dir = Path(project_export_dir, device_name)
@@ -29,9 +84,99 @@ def get_device_and_db_info(project_export_dir, automation_ml_file_name="project_
         for db_export_file in db_export_files:
             if str(db_export_file).endswith("DB_SW.xml"):
                 print(f"Loading {db_export_file}")
-                db_entries = tia_db_export_to_entries(str(db_export_file))
-                # TODO have the DB number also separate of the entries
-                if db_entries and len(db_entries) > 0:
-                    db_number = db_entries[0]["db_number"]
-                    device["entries"][db_number] = db_entries
+                db_export_jobs.append((device, db_export_file))
+
+    all_db_entries = load_db_exports([db_export_file for _, db_export_file in db_export_jobs], workers, cache)
+    for (device, _), db_entries in zip(db_export_jobs, all_db_entries):
+        # TODO have the DB number also separate of the entries
+        if db_entries and len(db_entries) > 0:
+            db_number = db_entries[0]["db_number"]
+            device["entries"][db_number] = db_entries
     return devices
+
+
+def device_items(devices):
+    # generators accept the devices dict as well as the (plc_name, device) pairs of iter_devices
+    return devices.items() if hasattr(devices, "items") else devices
+
+
+def _db_export_files(project_export_dir, plc_name):
+    plc_base_dir = Path(project_export_dir, plc_name)
+    return [f for f in plc_base_dir.iterdir() if f.is_file() and str(f).endswith("DB_SW.xml")]
+
+
+def _select_fields(device, fields):
+    selected = {"asset_name": device["asset_name"]}
+    for key, value in device.items():
+        if key == "ethernet" and "ethernet" in fields:
+            selected[key] = value
+        elif key not in ("asset_name", "ethernet", "entries") and "attributes" in fields:
+            selected[key] = value
+    return selected
+
+
+def _submit_db_export(db_export_file, executor, cache, layout_engine):
+    future = Future()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key_for_file(db_export_file, tia_db_export_to_entries, tia_block_helper.PARSER_VERSION)
+        db_entries = cache.get(cache_key)
+        if db_entries is not None:
+            future.set_result(db_entries)
+            return future, None
+    if executor is None:
+        future.set_result(tia_db_export_to_entries(str(db_export_file), layout_engine))
+        if cache is not None:
+            cache.put(cache_key, future.result(), evict=False)
+        return future, None
+    return executor.submit(_parse_db_export, str(db_export_file)), cache_key
+
+
+def _completed_device(plc_name, device, db_futures, cache):
+    for db_future, cache_key in db_futures:
+        db_entries = db_future.result()
+        if cache_key is not None:
+            cache.put(cache_key, db_entries, evict=False)
+        if db_entries and len(db_entries) > 0:
+            device["entries"][db_entries[0]["db_number"]] = db_entries
+    return plc_name, device
+
+
+def iter_devices(project_export_dir, automation_ml_file_name="project_automationml.aml", fields=DEVICE_FIELDS,
+                 workers=None, cache=None):
+    # Yields (plc_name, device) one fully populated device at a time, in AutomationML order.
+    # With entries requested, the DB exports of at most 2 * workers devices are parsed ahead in a process pool,
+    # so memory is bounded by that window instead of by the plant size.
+    fields = set(fields)
+    automationml_file = Path(project_export_dir, automation_ml_file_name)
+    if cache is None:
+        devices = iter_automationml_devices(str(automationml_file))
+    else:
+        devices = load_automationml_export(automationml_file, cache).items()
+    if "entries" not in fields:
+        for plc_name, device in devices:
+            yield plc_name, _select_fields(device, fields)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_layout_engine) if workers > 1 else None
+    # used when parsing in this process, the pool workers have their own
+    layout_engine = DbLayoutEngine()
+    pending = deque()
+    try:
+        for plc_name, device in devices:
+            device = _select_fields(device, fields)
+            device["entries"] = {}
+            db_futures = [_submit_db_export(db_export_file, executor, cache, layout_engine)
+                          for db_export_file in _db_export_files(project_export_dir, plc_name)]
+            pending.append((plc_name, device, db_futures))
+            while len(pending) > 2 * workers:
+                yield _completed_device(*pending.popleft(), cache)
+        while len(pending) > 0:
+            yield _completed_device(*pending.popleft(), cache)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if cache is not None:
+            # once per project, not after every DB export
+            cache.evict()
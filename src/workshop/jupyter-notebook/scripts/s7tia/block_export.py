@@ -0,0 +1,153 @@
+import fnmatch
+import json
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+# Export driver without any TIA Openness dependency. The Openness object model sits behind BlockSource
+# (see tia_openness_export.OpennessBlockSource), FakeBlockSource stands in for it on machines without TIA Portal.
+
+MANIFEST_FILE_NAME = "export_manifest.json"
+DEFAULT_NAME_PATTERNS = ("*DB_SW",)
+DEFAULT_BLOCK_TYPES = ("GlobalDB",)
+
+
+class BlockInfo:
+    # group_path are the block group names below the PLC's program blocks, modified is any value that
+    # changes whenever the block changes (TIA ModifiedDate, or a checksum)
+
+    __slots__ = ("name", "block_type", "number", "modified", "group_path", "handle")
+
+    def __init__(self, name: str, block_type: str, number: int, modified: str, group_path: tuple = (), handle=None):
+        self.name = name
+        self.block_type = block_type
+        self.number = number
+        self.modified = modified
+        self.group_path = tuple(group_path)
+        self.handle = handle
+
+
+class BlockSource(ABC):
+
+    @abstractmethod
+    def plc_names(self):
+        pass
+
+    @abstractmethod
+    def blocks(self, plc_name: str):
+        # iterable of BlockInfo, reading it must not export anything
+        pass
+
+    @abstractmethod
+    def export_block(self, plc_name: str, block: BlockInfo, file_path: Path):
+        pass
+
+
+class FakeBlockSource(BlockSource):
+    # in-memory PLCs, {plc_name: [BlockInfo]}, exports write a minimal SimaticML stub
+
+    def __init__(self, plcs):
+        self.plcs = plcs
+        self.exported = []
+
+    def plc_names(self):
+        return list(self.plcs)
+
+    def blocks(self, plc_name: str):
+        return list(self.plcs[plc_name])
+
+    def export_block(self, plc_name: str, block: BlockInfo, file_path: Path):
+        self.exported.append((plc_name, block.name))
+        file_path.write_text(f'<?xml version="1.0" encoding="utf-8"?>\n<Document>\n  <SW.Blocks.{block.block_type} ID="0">\n'
+                             f'    <AttributeList>\n      <Name>{block.name}</Name>\n      <Number>{block.number}</Number>\n'
+                             f'    </AttributeList>\n  </SW.Blocks.{block.block_type}>\n</Document>\n')
+
+
+class BlockExportFilter:
+
+    def __init__(self, name_patterns=DEFAULT_NAME_PATTERNS, block_types=DEFAULT_BLOCK_TYPES):
+        # None matches everything
+        self.name_patterns = name_patterns
+        self.block_types = set(block_types) if block_types is not None else None
+
+    def matches(self, block: BlockInfo) -> bool:
+        if self.block_types is not None and block.block_type not in self.block_types:
+            return False
+        if self.name_patterns is not None:
+            return any(fnmatch.fnmatchcase(block.name, pattern) for pattern in self.name_patterns)
+        return True
+
+
+class ExportManifest:
+    # remembers the modification stamp every block had when it was exported last
+
+    def __init__(self, manifest_file: Path):
+        self.manifest_file = Path(manifest_file)
+        self.blocks = {}
+        if self.manifest_file.is_file():
+            with open(self.manifest_file, "r") as json_file:
+                self.blocks = json.load(json_file)
+
+    @staticmethod
+    def key(plc_name: str, block: BlockInfo) -> str:
+        return "/".join((plc_name,) + block.group_path + (block.name,))
+
+    def is_unchanged(self, plc_name: str, block: BlockInfo, file_path: Path) -> bool:
+        entry = self.blocks.get(self.key(plc_name, block))
+        return entry is not None and entry["modified"] == str(block.modified) and file_path.is_file()
+
+    def record(self, plc_name: str, block: BlockInfo, file_path: Path):
+        self.blocks[self.key(plc_name, block)] = {"modified": str(block.modified), "file": str(file_path),
+                                                  "type": block.block_type, "number": block.number}
+
+    def save(self):
+        self.manifest_file.parents[0].mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_file, "w") as json_file:
+            json_file.write(json.dumps(self.blocks, sort_keys=True, indent=2))
+
+
+class ExportSummary:
+
+    def __init__(self):
+        self.exported = 0
+        self.skipped_filtered = 0
+        self.skipped_unchanged = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return (f"exported {self.exported}, skipped {self.skipped_unchanged} unchanged and "
+                f"{self.skipped_filtered} filtered, failed {self.failed} in {self.seconds:.1f}s")
+
+
+def export_blocks(source: BlockSource, export_dir: Path, block_filter: BlockExportFilter = None,
+                  manifest: ExportManifest = None, force: bool = False) -> ExportSummary:
+    # exports every matching block to export_dir/<plc>/<groups...>/<block>.xml unless the manifest
+    # shows the same modification stamp for an existing file, force re-exports all matching blocks
+    export_dir = Path(export_dir)
+    block_filter = block_filter or BlockExportFilter()
+    manifest = manifest or ExportManifest(export_dir.joinpath(MANIFEST_FILE_NAME))
+    summary = ExportSummary()
+    started = time.perf_counter()
+    for plc_name in source.plc_names():
+        for block in source.blocks(plc_name):
+            if not block_filter.matches(block):
+                summary.skipped_filtered += 1
+                continue
+            file_path = export_dir.joinpath(plc_name, *block.group_path, f"{block.name}.xml")
+            if not force and manifest.is_unchanged(plc_name, block, file_path):
+                summary.skipped_unchanged += 1
+                continue
+            print(f"try exporting block '{block.name}'")
+            file_path.parents[0].mkdir(parents=True, exist_ok=True)
+            try:
+                source.export_block(plc_name, block, file_path)
+            except Exception as e:
+                print(f"export of '{block.name}' failed: {e}")
+                summary.failed += 1
+                continue
+            manifest.record(plc_name, block, file_path)
+            summary.exported += 1
+    manifest.save()
+    summary.seconds = time.perf_counter() - started
+    return summary
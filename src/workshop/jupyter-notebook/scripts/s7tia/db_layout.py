@@ -0,0 +1,160 @@
+import itertools
+import re
+
+# Standard access (non-optimized) S7 memory layout of DB members, all sizes and offsets in bits.
+# Bools are packed bit by bit, byte sized types are byte aligned and everything else, including
+# structs, UDTs and arrays, starts on an even byte; structured types are padded to an even byte size.
+
+BIT = 1
+BYTE = 8
+WORD = 16
+
+S7_TYPE_BITS = {
+    "bool": 1,
+    "byte": 8, "char": 8, "sint": 8, "usint": 8,
+    "word": 16, "int": 16, "uint": 16, "date": 16, "s5time": 16, "wchar": 16,
+    "dword": 32, "dint": 32, "udint": 32, "real": 32, "time": 32, "time_of_day": 32, "tod": 32,
+    "lword": 64, "lint": 64, "ulint": 64, "lreal": 64, "ltime": 64, "ltime_of_day": 64, "ltod": 64,
+    "date_and_time": 64, "dt": 64, "ldt": 64,
+    "dtl": 96,
+    "iec_timer": 128, "iec_ltimer": 256, "iec_counter": 48, "iec_ucounter": 48,
+}
+BYTE_ALIGNED_TYPES = {"byte", "char", "sint", "usint"}
+DEFAULT_STRING_LENGTH = 254
+
+_ARRAY_PATTERN = re.compile(r"^\s*array\s*\[(?P<dimensions>[^\]]+)\]\s*of\s+(?P<element>.+)$", re.IGNORECASE)
+_STRING_PATTERN = re.compile(r"^\s*(?P<kind>w?string)\s*(\[\s*(?P<length>\d+)\s*\])?\s*$", re.IGNORECASE)
+_STRUCTURED_TYPES = ("struct",)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def align(bit_offset: int, alignment_bits: int) -> int:
+    return (bit_offset + alignment_bits - 1) // alignment_bits * alignment_bits
+
+
+def udt_name(datatype: str):
+    # UDT references are exported quoted, e.g. Datatype="&quot;Station_UDT&quot;"
+    datatype = datatype.strip()
+    if len(datatype) > 1 and datatype.startswith('"') and datatype.endswith('"'):
+        return datatype[1:-1]
+    return None
+
+
+def elementary_type_bits(datatype: str):
+    # (size, alignment) of an elementary type, None for types without a known fixed size
+    string_match = _STRING_PATTERN.match(datatype)
+    if string_match:
+        length = int(string_match.group("length") or DEFAULT_STRING_LENGTH)
+        if string_match.group("kind").lower() == "wstring":
+            return (length + 2) * WORD, WORD
+        return (length + 2) * BYTE, WORD
+    size_bits = S7_TYPE_BITS.get(datatype.strip().lower())
+    if size_bits is None:
+        return None
+    if size_bits == BIT:
+        return BIT, BIT
+    return size_bits, BYTE if datatype.strip().lower() in BYTE_ALIGNED_TYPES else WORD
+
+
+def parse_array_datatype(datatype: str):
+    # 'Array[0..9, 1..2] of Int' -> ([(0, 9), (1, 2)], 'Int'), None for non-array types
+    array_match = _ARRAY_PATTERN.match(datatype)
+    if not array_match:
+        return None
+    dimensions = []
+    for dimension in array_match.group("dimensions").split(","):
+        low, _, high = dimension.partition("..")
+        dimensions.append((int(low.strip()), int(high.strip())))
+    return dimensions, array_match.group("element").strip()
+
+
+class MemberLayout:
+    # leaves are (name suffix, bit offset relative to the member start, datatype) of every elementary tag
+
+    __slots__ = ("leaves", "size_bits", "alignment_bits")
+
+    def __init__(self, leaves: tuple, size_bits: int, alignment_bits: int):
+        self.leaves = leaves
+        self.size_bits = size_bits
+        self.alignment_bits = alignment_bits
+
+
+class DbLayoutEngine:
+    # Flattens DB members into leaf tags. UDT bodies are laid out once per engine and reused for every
+    # instance, so an engine should live as long as the UDT definitions it has seen are valid (one export run).
+
+    def __init__(self):
+        self.udt_layouts = {}
+        self.unknown_datatypes = set()
+
+    def _nested_members(self, member):
+        # struct members are direct children, UDT instances wrap theirs in <Sections><Section>
+        nested = []
+        for child in member:
+            child_name = _local_name(child.tag)
+            if child_name == "Member":
+                nested.append(child)
+            elif child_name == "Sections":
+                for section in child:
+                    nested.extend(grandchild for grandchild in section if _local_name(grandchild.tag) == "Member")
+        return nested
+
+    def _structured_layout(self, members) -> MemberLayout:
+        leaves = []
+        cursor = 0
+        for nested_member in members:
+            nested_layout = self.member_layout(nested_member)
+            cursor = align(cursor, nested_layout.alignment_bits)
+            prefix = "." + nested_member.get("Name")
+            leaves.extend((prefix + suffix, cursor + offset, datatype) for suffix, offset, datatype in nested_layout.leaves)
+            cursor += nested_layout.size_bits
+        return MemberLayout(tuple(leaves), align(cursor, WORD), WORD)
+
+    def _type_layout(self, datatype: str, member) -> MemberLayout:
+        elementary = elementary_type_bits(datatype)
+        if elementary is not None:
+            return MemberLayout((("", 0, datatype),), elementary[0], elementary[1])
+        udt = udt_name(datatype)
+        if udt is not None:
+            if udt not in self.udt_layouts:
+                self.udt_layouts[udt] = self._structured_layout(self._nested_members(member))
+            return self.udt_layouts[udt]
+        if datatype.strip().lower() in _STRUCTURED_TYPES:
+            return self._structured_layout(self._nested_members(member))
+        # unknown type without a definition in the export, kept as a single tag without size
+        self.unknown_datatypes.add(datatype)
+        return MemberLayout((("", 0, datatype),), 0, WORD)
+
+    def _array_layout(self, dimensions, element_datatype: str, member) -> MemberLayout:
+        element_layout = self._type_layout(element_datatype, member)
+        stride = element_layout.size_bits if element_layout.size_bits == BIT else align(element_layout.size_bits, element_layout.alignment_bits)
+        leaves = []
+        for element_number, index in enumerate(itertools.product(*[range(low, high + 1) for low, high in dimensions])):
+            prefix = "[" + ",".join(str(i) for i in index) + "]"
+            element_offset = element_number * stride
+            leaves.extend((prefix + suffix, element_offset + offset, datatype) for suffix, offset, datatype in element_layout.leaves)
+        element_count = 1
+        for low, high in dimensions:
+            element_count *= high - low + 1
+        return MemberLayout(tuple(leaves), align(element_count * stride, WORD), WORD)
+
+    def member_layout(self, member) -> MemberLayout:
+        datatype = member.get("Datatype") or ""
+        array_datatype = parse_array_datatype(datatype)
+        if array_datatype is not None:
+            return self._array_layout(array_datatype[0], array_datatype[1], member)
+        return self._type_layout(datatype, member)
+
+    def flatten_member(self, member, bit_offset: int, db_number):
+        # leaf rows of a first level DB member that starts at the absolute bit_offset
+        name = member.get("Name")
+        for suffix, relative_offset, datatype in self.member_layout(member).leaves:
+            yield {
+                "name": name + suffix,
+                "db_number": db_number,
+                "offset": bit_offset + relative_offset,
+                "datatype": datatype
+            }
@@ -0,0 +1,123 @@
+import json
+import time
+from pathlib import Path
+from .automationml2sw import get_device_and_db_info
+
+CHANGESET_KEYS = ("plcs_added", "plcs_removed", "ip_changes", "tags_added", "tags_removed", "tags_retyped",
+                  "offset_shifts")
+WATCHED_FILE_PATTERNS = ("*.aml", "*DB_SW.xml")
+
+
+def load_snapshot(source, cache=None, workers=None):
+    # a snapshot is the devices dict of get_device_and_db_info, either parsed from an
+    # export directory or read back from a json file written by write_snapshot
+    if isinstance(source, dict):
+        return source
+    source = Path(source)
+    if source.is_file():
+        with open(source, "r") as snapshot_file:
+            return json.load(snapshot_file)
+    return get_device_and_db_info(source, workers=workers, cache=cache)
+
+
+def write_snapshot(devices, file_name: Path):
+    with open(file_name, "w") as snapshot_file:
+        json.dump(devices, snapshot_file, sort_keys=True, indent=2)
+
+
+def plc_ip_address(device):
+    ethernet = device.get("ethernet") or [{}]
+    return ethernet[0].get("NetworkAddress")
+
+
+def _tags_by_key(devices):
+    tags = {}
+    for plc_name, device in devices.items():
+        for db_number, db_entries in device.get("entries", {}).items():
+            for entry in db_entries:
+                tags[(plc_name, str(db_number), entry["name"])] = entry
+    return tags
+
+
+def _tag(key, entry):
+    plc_name, db_number, name = key
+    return {"plc": plc_name, "db_number": db_number, "name": name, "datatype": entry["datatype"],
+            "offset": entry["offset"]}
+
+
+def diff_snapshots(old_devices, new_devices):
+    changeset = {key: [] for key in CHANGESET_KEYS}
+    changeset["plcs_added"] = [plc_name for plc_name in new_devices if plc_name not in old_devices]
+    changeset["plcs_removed"] = [plc_name for plc_name in old_devices if plc_name not in new_devices]
+    for plc_name, new_device in new_devices.items():
+        old_device = old_devices.get(plc_name)
+        if old_device is not None and plc_ip_address(old_device) != plc_ip_address(new_device):
+            changeset["ip_changes"].append({"plc": plc_name, "old": plc_ip_address(old_device),
+                                            "new": plc_ip_address(new_device)})
+
+    old_tags = _tags_by_key(old_devices)
+    new_tags = _tags_by_key(new_devices)
+    for key, new_entry in new_tags.items():
+        old_entry = old_tags.get(key)
+        if old_entry is None:
+            changeset["tags_added"].append(_tag(key, new_entry))
+            continue
+        if old_entry["datatype"] != new_entry["datatype"]:
+            changeset["tags_retyped"].append({**_tag(key, new_entry), "old_datatype": old_entry["datatype"]})
+        if old_entry["offset"] != new_entry["offset"]:
+            changeset["offset_shifts"].append({**_tag(key, new_entry), "old_offset": old_entry["offset"]})
+    changeset["tags_removed"] = [_tag(key, old_entry) for key, old_entry in old_tags.items() if key not in new_tags]
+    return changeset
+
+
+def is_empty(changeset) -> bool:
+    return all(len(changeset[key]) == 0 for key in CHANGESET_KEYS)
+
+
+def changed_plcs(changeset):
+    # PLCs whose SiteWise/SFC output has to be regenerated for this changeset
+    plc_names = set(changeset["plcs_added"]) | set(changeset["plcs_removed"])
+    plc_names.update(change["plc"] for key in CHANGESET_KEYS[2:] for change in changeset[key])
+    return sorted(plc_names)
+
+
+def summarize(changeset) -> str:
+    return ", ".join(f"{len(changeset[key])} {key.replace('_', ' ')}" for key in CHANGESET_KEYS)
+
+
+def _export_signature(export_dir: Path):
+    signature = {}
+    for pattern in WATCHED_FILE_PATTERNS:
+        for export_file in export_dir.rglob(pattern):
+            stat = export_file.stat()
+            signature[str(export_file)] = (stat.st_size, stat.st_mtime_ns)
+    return signature
+
+
+def watch_export_dir(export_dir, on_changeset, baseline=None, cache=None, workers=None, interval: float = 2.0,
+                     max_polls=None):
+    # polls the export directory and calls on_changeset(changeset, devices) for every re-export that changes tags,
+    # files have to stay unchanged for one interval so half written TIA exports are never parsed
+    export_dir = Path(export_dir)
+    previous = load_snapshot(baseline if baseline is not None else export_dir, cache, workers)
+    settled_signature = _export_signature(export_dir)
+    pending_signature = None
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        time.sleep(interval)
+        polls += 1
+        signature = _export_signature(export_dir)
+        if signature == settled_signature:
+            pending_signature = None
+            continue
+        if signature != pending_signature:
+            pending_signature = signature
+            continue
+        settled_signature = signature
+        pending_signature = None
+        current = load_snapshot(export_dir, cache, workers)
+        changeset = diff_snapshots(previous, current)
+        previous = current
+        if not is_empty(changeset):
+            on_changeset(changeset, current)
+    return previous
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from pathlib import Path
+
+PARSE_CACHE_DIR = Path(__file__).resolve().parent / ".parse_cache"
+DEFAULT_MAX_CACHE_BYTES = 512 * 2**20
+CACHE_FILE_SUFFIX = ".pickle.z"
+HASH_CHUNK_BYTES = 2**20
+
+
+def file_content_hash(file_path) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as content_file:
+        for chunk in iter(lambda: content_file.read(HASH_CHUNK_BYTES), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class ParseCache:
+    # Parsed TIA exports keyed by file content and parser version, stored as zlib compressed pickles.
+    # The file mtime doubles as last access time, least recently used entries are evicted above max_bytes.
+
+    def __init__(self, cache_dir: Path = PARSE_CACHE_DIR, max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content_hash: str, parser_name: str, parser_version) -> str:
+        return hashlib.sha256(f"{parser_name}:{parser_version}:{content_hash}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir.joinpath(f"{key}{CACHE_FILE_SUFFIX}")
+
+    def get(self, key: str):
+        cache_file = self._path(key)
+        try:
+            with open(cache_file, "rb") as cached:
+                value = pickle.loads(zlib.decompress(cached.read()))
+        except Exception:
+            # missing, truncated or pickled by an older code version (AttributeError, ModuleNotFoundError, ...)
+            self.misses += 1
+            return None
+        os.utime(cache_file)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value, evict: bool = True):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        # write to a temp file first so concurrent runs never read half written entries
+        file_descriptor, temp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as temp_file:
+            temp_file.write(payload)
+        os.replace(temp_name, self._path(key))
+        if evict:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        for cache_file in self.cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"):
+            stat = cache_file.stat()
+            entries.append((stat.st_mtime, stat.st_size, cache_file))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, cache_file in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            cache_file.unlink(missing_ok=True)
+            total_bytes -= size
+
+    def clear(self):
+        for cache_file in self.cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"):
+            cache_file.unlink(missing_ok=True)
+
+    def key_for_file(self, file_path, parse_function, parser_version) -> str:
+        return self.key(file_content_hash(file_path), f"{parse_function.__module__}.{parse_function.__name__}", parser_version)
+
+    def parse(self, file_path, parse_function, parser_version):
+        key = self.key_for_file(file_path, parse_function, parser_version)
+        value = self.get(key)
+        if value is None:
+            value = parse_function(str(file_path))
+            self.put(key, value)
+        return value
@@ -0,0 +1,201 @@
+import fnmatch
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from .automationml2sw import load_automationml_export
+from .tia_block_helper import iter_tia_db_export_entries
+
+try:
+    import numpy as np
+except ImportError:  # the catalog works on plain arrays, numpy only speeds up filters and group-bys
+    np = None
+
+COLUMNS = ("plc", "db_number", "name", "offset", "datatype")
+# columns holding codes into a string table, db_number and offset hold the values themselves
+STRING_COLUMNS = ("plc", "name", "datatype")
+
+
+class StringTable:
+    # interns strings into dense integer codes so every column can be a flat array
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def intern(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def code(self, value: str) -> int:
+        return self.codes.get(value, -1)
+
+    def matching_codes(self, pattern: str):
+        # glob patterns like 'Seq_*' are resolved once against the distinct values
+        return [code for code, value in enumerate(self.values) if fnmatch.fnmatchcase(value, pattern)]
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class TagCatalog:
+    # Tags of a whole plant as parallel array columns instead of a dict per tag.
+    # `devices` gives the old get_device_and_db_info() dict shape, built lazily per PLC.
+
+    def __init__(self):
+        self.strings = {column: StringTable() for column in STRING_COLUMNS}
+        self.columns = {
+            "plc": array("I"),
+            "db_number": array("I"),
+            "name": array("I"),
+            "offset": array("q"),
+            "datatype": array("I"),
+        }
+        self.device_info = {}
+        self._plc_index = None
+
+    def __len__(self):
+        return len(self.columns["plc"])
+
+    def add_device(self, plc_name: str, device):
+        self.device_info[plc_name] = {key: value for key, value in device.items() if key != "entries"}
+        self.strings["plc"].intern(plc_name)
+
+    def append(self, plc_name: str, entry):
+        columns = self.columns
+        columns["plc"].append(self.strings["plc"].intern(plc_name))
+        columns["db_number"].append(int(entry["db_number"]))
+        columns["name"].append(self.strings["name"].intern(entry["name"]))
+        columns["offset"].append(entry["offset"])
+        columns["datatype"].append(self.strings["datatype"].intern(entry["datatype"]))
+        self._plc_index = None
+
+    @classmethod
+    def from_devices(cls, devices):
+        catalog = cls()
+        for plc_name, device in devices.items():
+            catalog.add_device(plc_name, device)
+            for db_entries in device.get("entries", {}).values():
+                for entry in db_entries:
+                    catalog.append(plc_name, entry)
+        return catalog
+
+    @classmethod
+    def from_export_dir(cls, project_export_dir, automation_ml_file_name="project_automationml.aml", cache=None):
+        # streams the DB exports straight into the columns, no per-tag dicts are kept around
+        catalog = cls()
+        devices = load_automationml_export(Path(project_export_dir, automation_ml_file_name), cache)
+        for plc_name, device in devices.items():
+            catalog.add_device(plc_name, device)
+            plc_base_dir = Path(project_export_dir, plc_name)
+            for db_export_file in plc_base_dir.iterdir():
+                if db_export_file.is_file() and str(db_export_file).endswith("DB_SW.xml"):
+                    for entry in iter_tia_db_export_entries(str(db_export_file)):
+                        catalog.append(plc_name, entry)
+        return catalog
+
+    def column(self, name: str):
+        # numpy views share the memory of the underlying arrays
+        if np is not None:
+            return np.frombuffer(self.columns[name], dtype=self.columns[name].typecode)
+        return self.columns[name]
+
+    def _codes(self, column: str, value):
+        if column not in STRING_COLUMNS:
+            return [int(value)]
+        if any(wildcard in value for wildcard in "*?["):
+            return self.strings[column].matching_codes(value)
+        return [self.strings[column].code(value)]
+
+    def filter(self, indices=None, **conditions):
+        # conditions are column=value (globs allowed for plc, name and datatype) or column=[values],
+        # returns the matching row indices, optionally restricted to previously filtered indices
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            for column, value in conditions.items():
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                codes = [code for single in values for code in self._codes(column, single)]
+                mask &= np.isin(self.column(column), codes)
+            matching = np.flatnonzero(mask)
+            return matching if indices is None else np.intersect1d(matching, indices)
+
+        wanted = {}
+        for column, value in conditions.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            wanted[column] = {code for single in values for code in self._codes(column, single)}
+        candidates = range(len(self)) if indices is None else indices
+        return array("q", [index for index in candidates
+                           if all(self.columns[column][index] in codes for column, codes in wanted.items())])
+
+    def group_by(self, column: str, indices=None):
+        # {column value: row indices}, decoded values as keys
+        if np is not None:
+            values = self.column(column) if indices is None else self.column(column)[indices]
+            row_indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+            order = np.argsort(values, kind="stable")
+            keys, starts = np.unique(values[order], return_index=True)
+            groups = np.split(row_indices[order], starts[1:])
+            return {self._decode(column, int(key)): group for key, group in zip(keys, groups)}
+
+        groups = {}
+        for index in (range(len(self)) if indices is None else indices):
+            groups.setdefault(self.columns[column][index], array("q")).append(index)
+        return {self._decode(column, key): group for key, group in groups.items()}
+
+    def count_by(self, column: str, indices=None):
+        return {key: len(group) for key, group in self.group_by(column, indices).items()}
+
+    def _decode(self, column: str, value: int):
+        return self.strings[column][value] if column in STRING_COLUMNS else value
+
+    def row(self, index: int):
+        return {
+            "name": self.strings["name"][self.columns["name"][index]],
+            "db_number": str(self.columns["db_number"][index]),
+            "offset": self.columns["offset"][index],
+            "datatype": self.strings["datatype"][self.columns["datatype"][index]]
+        }
+
+    def rows(self, indices=None):
+        for index in (range(len(self)) if indices is None else indices):
+            yield self.strings["plc"][self.columns["plc"][index]], self.row(int(index))
+
+    def plc_indices(self, plc_name: str):
+        if self._plc_index is None:
+            self._plc_index = self.group_by("plc")
+        return self._plc_index.get(plc_name, [])
+
+    @property
+    def devices(self):
+        return DevicesView(self)
+
+
+class DevicesView(Mapping):
+    # read-only {plc_name: device} view in the shape of get_device_and_db_info(),
+    # a device and its entries are materialized only when it is accessed
+
+    def __init__(self, catalog: TagCatalog):
+        self.catalog = catalog
+
+    def __getitem__(self, plc_name: str):
+        device = dict(self.catalog.device_info[plc_name])
+        entries = {}
+        for index in self.catalog.plc_indices(plc_name):
+            entry = self.catalog.row(int(index))
+            entries.setdefault(entry["db_number"], []).append(entry)
+        device["entries"] = entries
+        return device
+
+    def __iter__(self):
+        return iter(self.catalog.device_info)
+
+    def __len__(self):
+        return len(self.catalog.device_info)
@@ -0,0 +1,156 @@
+import json
+import sqlite3
+from pathlib import Path
+from . import tia_block_helper
+from .automationml2sw import load_automationml_export
+from .parse_cache import file_content_hash
+from .tia_block_helper import iter_tia_db_export_entries
+from .tag_naming import sitewise_alias
+
+DEFAULT_CATALOG_FILE = Path(__file__).resolve().parent / ".parse_cache" / "tag_catalog.sqlite"
+TAG_COLUMNS = ("plc", "db_number", "name", "offset", "datatype", "sitewise_alias")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plcs (
+    name TEXT PRIMARY KEY,
+    ip_address TEXT,
+    attributes TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS export_files (
+    path TEXT PRIMARY KEY,
+    plc TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    parser_version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    plc TEXT NOT NULL,
+    db_number INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    datatype TEXT NOT NULL,
+    sitewise_alias TEXT NOT NULL,
+    source_file TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_plc_db ON tags (plc, db_number);
+CREATE INDEX IF NOT EXISTS tags_db_number ON tags (db_number);
+CREATE INDEX IF NOT EXISTS tags_name ON tags (name);
+CREATE INDEX IF NOT EXISTS tags_datatype ON tags (datatype);
+CREATE INDEX IF NOT EXISTS tags_sitewise_alias ON tags (sitewise_alias);
+CREATE INDEX IF NOT EXISTS tags_source_file ON tags (source_file);
+"""
+
+
+def _condition(column: str, value):
+    # glob characters switch to GLOB, which still uses the index for a literal prefix
+    if isinstance(value, str) and any(wildcard in value for wildcard in "*?["):
+        return f"{column} GLOB ?", value
+    return f"{column} = ?", value
+
+
+class SqliteTagCatalog:
+    # Parsed TIA exports persisted in SQLite. refresh() only re-parses DB exports whose content changed.
+
+    def __init__(self, catalog_file: Path = DEFAULT_CATALOG_FILE):
+        Path(catalog_file).parents[0].mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(catalog_file))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _delete_file_tags(self, path: str):
+        self.connection.execute("DELETE FROM tags WHERE source_file = ?", (path,))
+        self.connection.execute("DELETE FROM export_files WHERE path = ?", (path,))
+
+    def refresh(self, project_export_dir, automation_ml_file_name="project_automationml.aml", cache=None):
+        stats = {"files_parsed": 0, "files_unchanged": 0, "files_removed": 0, "plcs_removed": 0}
+        devices = load_automationml_export(Path(project_export_dir, automation_ml_file_name), cache)
+        known_files = {row["path"]: (row["content_hash"], row["parser_version"])
+                       for row in self.connection.execute("SELECT path, content_hash, parser_version FROM export_files")}
+        seen_files = set()
+        with self.connection:
+            for plc_name, device in devices.items():
+                attributes = {key: value for key, value in device.items() if key != "entries"}
+                ip_address = (device.get("ethernet") or [{}])[0].get("NetworkAddress")
+                self.connection.execute("INSERT OR REPLACE INTO plcs (name, ip_address, attributes) VALUES (?, ?, ?)",
+                                        (plc_name, ip_address, json.dumps(attributes)))
+                for db_export_file in Path(project_export_dir, plc_name).iterdir():
+                    if not (db_export_file.is_file() and str(db_export_file).endswith("DB_SW.xml")):
+                        continue
+                    path = str(db_export_file.resolve())
+                    seen_files.add(path)
+                    content_hash = file_content_hash(db_export_file)
+                    if known_files.get(path) == (content_hash, tia_block_helper.PARSER_VERSION):
+                        stats["files_unchanged"] += 1
+                        continue
+                    self._delete_file_tags(path)
+                    self.connection.executemany(
+                        "INSERT INTO tags (plc, db_number, name, offset, datatype, sitewise_alias, source_file) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        ((plc_name, int(entry["db_number"]), entry["name"], entry["offset"], entry["datatype"],
+                          sitewise_alias(plc_name, entry["db_number"], entry["name"]), path)
+                         for entry in iter_tia_db_export_entries(str(db_export_file))))
+                    self.connection.execute(
+                        "INSERT INTO export_files (path, plc, content_hash, parser_version) VALUES (?, ?, ?, ?)",
+                        (path, plc_name, content_hash, tia_block_helper.PARSER_VERSION))
+                    stats["files_parsed"] += 1
+
+            for path in set(known_files) - seen_files:
+                self._delete_file_tags(path)
+                stats["files_removed"] += 1
+            removed_plcs = [row["name"] for row in self.connection.execute("SELECT name FROM plcs")
+                            if row["name"] not in devices]
+            for plc_name in removed_plcs:
+                self.connection.execute("DELETE FROM plcs WHERE name = ?", (plc_name,))
+                self.connection.execute("DELETE FROM tags WHERE plc = ?", (plc_name,))
+            stats["plcs_removed"] = len(removed_plcs)
+        self.connection.execute("ANALYZE")
+        return stats
+
+    def tags(self, plc=None, db_number=None, name=None, datatype=None, alias=None, limit=None):
+        # all arguments are optional filters, plc, name, datatype and alias accept globs like 'Seq_*'
+        conditions = []
+        parameters = []
+        for column, value in (("plc", plc), ("db_number", db_number), ("name", name), ("datatype", datatype),
+                              ("sitewise_alias", alias)):
+            if value is not None:
+                condition, parameter = _condition(column, value)
+                conditions.append(condition)
+                parameters.append(parameter)
+        query = f"SELECT {', '.join(TAG_COLUMNS)} FROM tags"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY plc, db_number, offset"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.connection.execute(query, parameters)]
+
+    def plcs_with_tag(self, name: str):
+        condition, parameter = _condition("name", name)
+        return [row["plc"] for row in
+                self.connection.execute(f"SELECT DISTINCT plc FROM tags WHERE {condition} ORDER BY plc", (parameter,))]
+
+    def find_alias(self, alias: str):
+        row = self.connection.execute(f"SELECT {', '.join(TAG_COLUMNS)} FROM tags WHERE sitewise_alias = ?",
+                                      (alias,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def count_by(self, column: str):
+        if column not in TAG_COLUMNS:
+            raise ValueError(f"unknown tag column '{column}', expected one of {TAG_COLUMNS}")
+        return {row[0]: row[1] for row in
+                self.connection.execute(f"SELECT {column}, COUNT(*) FROM tags GROUP BY {column} ORDER BY {column}")}
+
+    def plcs(self):
+        return {row["name"]: {"ip_address": row["ip_address"], **json.loads(row["attributes"])}
+                for row in self.connection.execute("SELECT name, ip_address, attributes FROM plcs ORDER BY name")}
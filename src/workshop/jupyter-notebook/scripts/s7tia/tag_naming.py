@@ -0,0 +1,16 @@
+import re
+
+# Names the tags get in AWS IoT SiteWise. The parser side (tag registry and catalog) and the SiteWise and SFC
+# generators all use them, so they live here and not in one of the generators.
+
+INVALID_EXTERNAL_ID_CHARACTERS = re.compile(r"[^a-zA-Z0-9_\-.:]")
+
+
+def sitewise_external_id(name: str) -> str:
+    # externalIds only allow a-z, A-Z, 0-9, _ - . :, flattened array members like 'Vals[1,0]' do not fit
+    return INVALID_EXTERNAL_ID_CHARACTERS.sub("_", name)
+
+
+def sitewise_alias(plc_name, db_number, entry_name) -> str:
+    # {PLCNAME}DB{DBID}/{ENTRYNAME}
+    return f"{plc_name}DB{db_number}/{entry_name}"
@@ -0,0 +1,49 @@
+import json
+from pathlib import Path
+from .automationml2sw import device_items
+from .tag_catalog import TagCatalog
+from .tag_naming import sitewise_alias
+
+
+class TagRegistry(TagCatalog):
+    # The tags of one parse with one canonical alias each, shared by the SiteWise and the SFC generator.
+    # The alias is the SiteWise property alias, the SFC target writes to that same alias.
+    # `devices` rows carry it as 'alias', both generators use it instead of inventing their own.
+
+    @classmethod
+    def from_devices(cls, devices):
+        # accepts the devices dict as well as the lazy iter_devices iterator, which is consumed once
+        registry = cls()
+        for plc_name, device in device_items(devices):
+            registry.add_device(plc_name, device)
+            for db_entries in device.get("entries", {}).values():
+                for entry in db_entries:
+                    registry.append(plc_name, entry)
+        return registry
+
+    def alias(self, index: int) -> str:
+        columns = self.columns
+        return sitewise_alias(self.strings["plc"][columns["plc"][index]], columns["db_number"][index],
+                              self.strings["name"][columns["name"][index]])
+
+    def row(self, index: int):
+        row = super().row(index)
+        row["alias"] = self.alias(index)
+        return row
+
+    def duplicate_aliases(self):
+        # aliases claimed by more than one tag, e.g. a DB exported twice for the same PLC
+        seen = set()
+        duplicates = set()
+        for index in range(len(self)):
+            alias = self.alias(index)
+            if alias in seen:
+                duplicates.add(alias)
+            seen.add(alias)
+        return sorted(duplicates)
+
+    def write(self, registry_file: Path):
+        Path(registry_file).parents[0].mkdir(parents=True, exist_ok=True)
+        with open(registry_file, "w") as json_file:
+            json.dump({"plcs": self.device_info,
+                       "tags": [dict(row, plc=plc_name) for plc_name, row in self.rows()]}, json_file, indent=1)
@@ -1,7 +1,99 @@
+import xml.etree.ElementTree as ET
 import untangle
 
+# bump whenever the devices produced for an unchanged export change, invalidates the parse cache
+PARSER_VERSION = 1
+# depth of the elements in CAEXFile > InstanceHierarchy > project > asset
+INSTANCE_HIERARCHY_DEPTH = 2
+ASSET_DEPTH = 4
+IGNORED_DEVICE_ATTRIBUTES = ('PositionNumber', 'BuiltIn')
+IGNORED_ETHERNET_ATTRIBUTES = ('PositionNumber', 'BuiltIn', 'IpProtocolSelection', 'Type')
+
+
+def _local_name(tag: str) -> str:
+    # CAEX 3.0 files declare a default namespace, iterparse reports it as '{namespace}Tag'
+    return tag.rpartition("}")[2]
+
+
+def _children(element, name: str):
+    return [child for child in element if _local_name(child.tag) == name]
+
+
+def _attribute_value(attribute) -> str:
+    values = _children(attribute, 'Value')
+    return (values[0].text or "").strip() if len(values) > 0 else ""
+
+
+def _asset_type(asset):
+    for attribute in _children(asset, 'Attribute'):
+        if attribute.get('Name') == 'TypeIdentifier':
+            return _attribute_value(attribute)
+    return None
+
+
+def _device_from_asset(asset):
+    plc = _children(_children(asset, 'InternalElement')[0], 'InternalElement')[0]
+    plc_name = plc.get("Name")
+    print(f"Plc Name: {plc_name}")
+    device = {"asset_name": plc_name}
+    for attr in _children(plc, 'Attribute'):
+        if attr.get('Name') not in IGNORED_DEVICE_ATTRIBUTES:
+            device[attr.get('Name')] = _attribute_value(attr)
+
+    # TODO: fix PNIO-Interface naming in TIA Project...
+    profinet_interfaces = [ele for ele in _children(plc, 'InternalElement')
+                           if ele.get("Name").startswith('PROFINET interface_1') or ele.get("Name").startswith('PROFINET_Interface_1')]
+    for profinet_interface in profinet_interfaces:
+        ethernet_configs = [ele for ele in _children(profinet_interface, 'InternalElement')
+                            if ele.get("Name").startswith('E') and not ele.get("Name").startswith('Port')]
+        device_ethernet_configs = []
+        for ethernet_config in ethernet_configs:
+            device_ethernet_config = {}
+            for attr in _children(ethernet_config, 'Attribute'):
+                if attr.get('Name') not in IGNORED_ETHERNET_ATTRIBUTES:
+                    device_ethernet_config[attr.get('Name')] = _attribute_value(attr)
+            device_ethernet_configs.append(device_ethernet_config)
+        device["ethernet"] = device_ethernet_configs
+    return plc_name, device
+
+
+def iter_automationml_devices(automationml_file):
+    # open elements from the document root to the current element
+    path = []
+    # None while the TypeIdentifier of the current asset is unknown, afterwards whether it is a device
+    asset_is_device = None
+    for event, element in ET.iterparse(automationml_file, events=("start", "end")):
+        if event == "start":
+            path.append(element)
+            if len(path) == ASSET_DEPTH:
+                asset_is_device = None
+            continue
+
+        path.pop()
+        depth = len(path) + 1
+        in_instance_hierarchy = _local_name(path[INSTANCE_HIERARCHY_DEPTH - 1].tag) == 'InstanceHierarchy' \
+            if depth > INSTANCE_HIERARCHY_DEPTH else _local_name(element.tag) == 'InstanceHierarchy'
+        if depth == ASSET_DEPTH + 1 and asset_is_device is None and _local_name(element.tag) == 'Attribute' \
+                and element.get('Name') == 'TypeIdentifier':
+            asset_is_device = _attribute_value(element).startswith('System:Device')
+        if depth == ASSET_DEPTH and in_instance_hierarchy and _local_name(element.tag) == 'InternalElement':
+            asset_type = _asset_type(element)
+            if asset_type and asset_type.startswith('System:Device'):
+                yield _device_from_asset(element)
+        elif depth > ASSET_DEPTH and in_instance_hierarchy and asset_is_device is not False:
+            # keep the subtree of (possible) devices until the whole asset is parsed
+            continue
+        # everything else is consumed, drop it so memory stays bounded by the largest device
+        element.clear()
+        if len(path) > 0:
+            path[-1].remove(element)
+
 
 def automationml_export_to_entries(automationml_file):
+    return dict(iter_automationml_devices(automationml_file))
+
+
+def automationml_export_to_entries_untangle(automationml_file):
     doc = untangle.parse(automationml_file)
     devices = {}
     hierarchies = [hierarchy for hierarchy in doc.CAEXFile.children if hierarchy._name == 'InstanceHierarchy']
@@ -24,7 +116,7 @@ def automationml_export_to_entries(automationml_file):
                         if attr['Name'] != 'PositionNumber' and attr['Name'] != 'BuiltIn':
                             # print(f"Attribute {attr['Name']} {attr.Value.cdata.strip()}")
                             device[attr['Name']] = attr.Value.cdata.strip()
-                    
+
                     # TODO: fix PNIO-Interface naming in TIA Project...
                     profinet_interfaces = [ele for ele in asset.InternalElement.InternalElement.InternalElement
                                            if ele["Name"].startswith('PROFINET interface_1') or ele["Name"].startswith('PROFINET_Interface_1')]
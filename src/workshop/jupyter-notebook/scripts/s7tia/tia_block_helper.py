@@ -1,6 +1,92 @@
+import mmap
+import re
+import xml.etree.ElementTree as ET
 import untangle
+from .db_layout import DbLayoutEngine
 
-def tia_db_export_to_entries(tia_db_xml_export: str) -> [[]]:
+# bump whenever the rows produced for an unchanged export change, invalidates the parse cache
+PARSER_VERSION = 2
+GLOBAL_DB_TAG = "SW.Blocks.GlobalDB"
+
+# TIA writes the block <Number> after the <Interface> section, so the DB numbers are looked up
+# with a cheap raw scan before the members are streamed (keeps the generator single-row, flat memory)
+_BLOCK_NUMBER_PATTERN = re.compile(rb"<(SW\.Blocks\.[A-Za-z]+)[\s>/]|<Number>\s*(\d+)\s*</Number>")
+
+
+def _local_name(tag: str) -> str:
+    # iterparse reports namespaced tags as '{namespace}Member'
+    return tag.rpartition("}")[2]
+
+
+def _scan_global_db_numbers(tia_db_xml_export: str) -> [str]:
+    db_numbers = []
+    with open(tia_db_xml_export, "rb") as xml_file:
+        with mmap.mmap(xml_file.fileno(), 0, access=mmap.ACCESS_READ) as xml_bytes:
+            current_block = None
+            for match in _BLOCK_NUMBER_PATTERN.finditer(xml_bytes):
+                if match.group(1):
+                    current_block = match.group(1).decode()
+                elif current_block is not None:
+                    if current_block == GLOBAL_DB_TAG:
+                        db_numbers.append(match.group(2).decode())
+                    current_block = None
+    return db_numbers
+
+
+def _member_offset(member) -> int:
+    attribute_list = None
+    for child in member:
+        if _local_name(child.tag) == "AttributeList":
+            attribute_list = child
+            break
+    if attribute_list is None or len(attribute_list) == 0:
+        return None
+    for attribute in attribute_list:
+        if attribute.get("Name") == "Offset":
+            return int(attribute.text.strip())
+    return int(attribute_list[0].text.strip())
+
+
+def iter_tia_db_export_entries(tia_db_xml_export: str, layout_engine: DbLayoutEngine = None):
+    # Struct, UDT and Array members are flattened into their leaf tags ('Station.Motor[2].Speed'),
+    # anchored at the offset TIA exported for the first level member
+    layout_engine = layout_engine or DbLayoutEngine()
+    db_numbers = iter(_scan_global_db_numbers(tia_db_xml_export))
+    db_number = None
+    # open elements from the document root to the current element
+    path = []
+    # depth of the first level <Member> elements of the current DB interface
+    member_depth = None
+    for event, element in ET.iterparse(tia_db_xml_export, events=("start", "end")):
+        name = _local_name(element.tag)
+        if event == "start":
+            path.append(element)
+            if name == GLOBAL_DB_TAG:
+                db_number = next(db_numbers, None)
+            elif name == "Sections" and member_depth is None and db_number is not None:
+                member_depth = len(path) + 2
+            continue
+
+        path.pop()
+        if name == "Member" and len(path) + 1 == member_depth:
+            offset = _member_offset(element)
+            if offset is not None:
+                yield from layout_engine.flatten_member(element, offset, db_number)
+            # drop the consumed member so neither it nor the section grows with the DB size
+            element.clear()
+            path[-1].remove(element)
+        elif name == "Sections" and len(path) + 3 == member_depth:
+            member_depth = None
+        elif name == GLOBAL_DB_TAG:
+            db_number = None
+            element.clear()
+
+
+def tia_db_export_to_entries(tia_db_xml_export: str, layout_engine: DbLayoutEngine = None) -> [[]]:
+    return list(iter_tia_db_export_entries(tia_db_xml_export, layout_engine))
+
+
+def tia_db_export_to_entries_untangle(tia_db_xml_export: str) -> [[]]:
     rows = []
     tia_export = untangle.parse(tia_db_xml_export)
     print(tia_export)
@@ -43,4 +129,4 @@ def tia_db_export_to_entries(tia_db_xml_export: str) -> [[]]:
                         print("no attribute")
                         print(member["AttributeList"])
                         print(member)
-    return rows
\ No newline at end of file
+    return rows
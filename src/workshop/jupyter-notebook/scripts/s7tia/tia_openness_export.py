@@ -10,6 +10,8 @@ import Siemens.Engineering as tia # type: ignore
 import Siemens.Engineering.HW.Features as hwf # type: ignore
 from Siemens.Engineering.Cax import CaxProvider # type: ignore
 from Siemens.Engineering import EngineeringTargetInvocationException # type: ignore
+from . import block_export
+from .block_export import BlockExportFilter, BlockInfo, BlockSource
 
 
 def get_first_project_of_running_process():
@@ -67,4 +69,47 @@ def export_all_groups_and_blocks_from_all_plcs(export_dir, project):
             software_base = software_container.Software
             print(software_base.BlockGroup)
             plc_base_export_dir = export_dir.joinpath(plc.Name)
-            export_groups_and_blocks(plc_base_export_dir, software_base.BlockGroup)
\ No newline at end of file
+            export_groups_and_blocks(plc_base_export_dir, software_base.BlockGroup)
+
+
+def get_plc_software(plc):
+    plc_device = plc.DeviceItems[1]
+    software_container = tia.IEngineeringServiceProvider(plc_device).GetService[hwf.SoftwareContainer]()
+    return software_container.Software
+
+
+class OpennessBlockSource(BlockSource):
+    # BlockSource over the S7-1500 PLCs of an attached TIA Portal project
+
+    def __init__(self, project):
+        self.software = {plc.Name: get_plc_software(plc) for plc in project.Devices
+                         if plc.TypeIdentifier == 'System:Device.S71500'}
+
+    def plc_names(self):
+        return list(self.software)
+
+    def _group_blocks(self, block_group, group_path):
+        for block in block_group.Blocks:
+            # ModifiedDate covers interface and code changes, the type name is e.g. GlobalDB, InstanceDB, FB, OB
+            yield BlockInfo(block.Name, block.GetType().Name, block.Number, str(block.ModifiedDate), group_path, block)
+        for group in block_group.Groups:
+            yield from self._group_blocks(group, group_path + (group.Name,))
+
+    def blocks(self, plc_name):
+        return self._group_blocks(self.software[plc_name].BlockGroup, ())
+
+    def export_block(self, plc_name, block, file_path):
+        # Openness refuses to overwrite an existing export
+        file_path.unlink(missing_ok=True)
+        try:
+            block.handle.Export(FileInfo(str(file_path)), tia.ExportOptions.WithReadOnly)
+        except EngineeringTargetInvocationException as ie:
+            raise RuntimeError(ie.Message)
+
+
+def export_selected_blocks_from_all_plcs(export_dir, project, block_filter=None, force=False):
+    # only blocks matching block_filter (default: *DB_SW global DBs) that changed since the last export
+    summary = block_export.export_blocks(OpennessBlockSource(project), export_dir, block_filter or BlockExportFilter(),
+                                         force=force)
+    print(f"Block export: {summary}")
+    return summary
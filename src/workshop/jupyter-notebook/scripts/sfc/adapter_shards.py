@@ -0,0 +1,78 @@
+# Splits the S7 controllers of one SFC config across several protocol adapter processes. Every shard is an
+# SFC IPC adapter service (AdapterServers entry plus a ProtocolAdapters entry pointing to it), the SFC core only
+# keeps the schedules and targets. Controllers are balanced by their channel reads per second.
+
+DEFAULT_ADAPTER_BASE_PORT = 50001
+DEFAULT_ADAPTER_ADDRESS = "localhost"
+SHARD_ADAPTER_NAME = "S7FleetShard{shard:02d}"
+
+
+def balance(loads: dict, shard_count: int):
+    # greedy longest-processing-time: the heaviest remaining source goes to the lightest shard, no sources: no shards
+    shards = [{"sources": [], "load": 0.0} for _ in range(min(max(1, shard_count), len(loads)))]
+    for source_name, load in sorted(loads.items(), key=lambda item: (-item[1], item[0])):
+        shard = min(shards, key=lambda candidate: (candidate["load"], len(candidate["sources"])))
+        shard["sources"].append(source_name)
+        shard["load"] += load
+    return [shard["sources"] for shard in shards]
+
+
+class AdapterShards:
+
+    def __init__(self, shard_count: int, address: str = DEFAULT_ADAPTER_ADDRESS,
+                 base_port: int = DEFAULT_ADAPTER_BASE_PORT):
+        self.shard_count = shard_count
+        self.address = address
+        self.base_port = base_port
+        self.sources = {}
+
+    def add(self, source_name: str, channels: int, reads_per_second: float):
+        self.sources[source_name] = {"channels": channels, "reads_per_second": reads_per_second}
+
+    def apply(self, sfc_template: dict, sources: dict, adapter_name: str) -> list:
+        # moves the controllers of adapter_name into one adapter per shard and points every source to its shard,
+        # returns the shard report, without sources the template is left as it is
+        if len(self.sources) == 0:
+            return []
+        adapter = sfc_template["ProtocolAdapters"].pop(adapter_name)
+        sfc_template.setdefault("AdapterServers", {})
+        report = []
+        loads = {name: source["reads_per_second"] for name, source in self.sources.items()}
+        for shard, source_names in enumerate(balance(loads, self.shard_count)):
+            shard_adapter_name = SHARD_ADAPTER_NAME.format(shard=shard)
+            port = self.base_port + shard
+            controllers = {}
+            for source_name in source_names:
+                controller_name = sources[source_name]["AdapterController"]
+                controllers[controller_name] = adapter["Controllers"][controller_name]
+                sources[source_name]["ProtocolAdapter"] = shard_adapter_name
+            sfc_template["AdapterServers"][shard_adapter_name + "Server"] = {"Address": self.address, "Port": port}
+            sfc_template["ProtocolAdapters"][shard_adapter_name] = dict(
+                {key: value for key, value in adapter.items() if key != "Controllers"},
+                AdapterServer=shard_adapter_name + "Server", Controllers=controllers)
+            report.append({"adapter": shard_adapter_name, "address": self.address, "port": port,
+                           "sources": source_names,
+                           "channels": sum(self.sources[name]["channels"] for name in source_names),
+                           "reads_per_second": sum(loads[name] for name in source_names)})
+        return report
+
+
+def shard_scripts(report: list, artifact_base_url: str, sfc_version: str, adapter_module: str = "s7") -> dict:
+    # {file name: script} of the install and run scripts of every adapter shard, a shard host only needs the
+    # adapter module
+    scripts = {}
+    for shard in report:
+        base_name = "sfc-adapter-{name}".format(name=shard["adapter"].lower())
+        scripts[base_name + "-install.sh"] = (
+            "#!/bin/bash\nset -e\nwget {url}/v{version}/{module}.tar.gz\ntar -xf {module}.tar.gz\nrm {module}.tar.gz\n"
+        ).format(url=artifact_base_url, version=sfc_version, module=adapter_module)
+        scripts[base_name + "-run.sh"] = (
+            "#!/bin/bash\nexport SFC_DEPLOYMENT_DIR=$(pwd)\n./{module}/bin/{module} -port {port}\n"
+        ).format(module=adapter_module, port=shard["port"])
+        scripts[base_name + "-install.bat"] = (
+            "curl -LO {url}/v{version}/{module}.tar.gz\ntar -xf {module}.tar.gz\ndel {module}.tar.gz\n"
+        ).format(url=artifact_base_url, version=sfc_version, module=adapter_module)
+        scripts[base_name + "-run.bat"] = (
+            "@ECHO OFF\nSET SFC_DEPLOYMENT_DIR=%cd%\n{module}\\bin\\{module}.bat -port {port}\n"
+        ).format(module=adapter_module, port=shard["port"])
+    return scripts
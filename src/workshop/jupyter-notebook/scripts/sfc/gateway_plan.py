@@ -0,0 +1,134 @@
+import ipaddress
+import json
+from pathlib import Path
+from s7tia.automationml2sw import device_items
+from sfc.s7_read_plan import DEFAULT_SCHEDULE_INTERVAL_MS
+
+# Assigns PLCs to edge gateways. A gateway only gets PLCs inside one of its subnets (no subnets: reaches every
+# PLC) and never more tags, reads per second or PLCs than its capacity. PLCs are placed heaviest first, each on
+# the reachable gateway that already serves its subnet, then on the most specific subnet match, then on the
+# least utilized one.
+#
+#   {"gateways": [{"name": "gw-press", "subnets": ["192.168.10.0/24"], "max_tags": 20000,
+#                  "max_reads_per_second": 40000, "max_plcs": 50}]}
+
+DEFAULT_GATEWAY_INVENTORY_FILE = Path(__file__).resolve().parent.joinpath("gateway_inventory.json")
+# the SFC SiteWise target batches up to 10 property values into one BatchPutAssetPropertyValue request
+SITEWISE_VALUES_PER_REQUEST = 10
+CAPACITY_KEYS = {"tags": "max_tags", "reads_per_second": "max_reads_per_second", "plcs": "max_plcs"}
+
+
+class Gateway:
+
+    def __init__(self, gateway: dict):
+        self.name = gateway["name"]
+        self.subnets = [ipaddress.ip_network(subnet, strict=False) for subnet in gateway.get("subnets", [])]
+        self.capacity = {key: gateway.get(capacity_key) for key, capacity_key in CAPACITY_KEYS.items()}
+        self.load = {"tags": 0, "reads_per_second": 0.0, "plcs": 0}
+        self.plcs = []
+        self.plc_subnets = set()
+
+    def reach(self, address):
+        # prefix length of the most specific subnet reaching address, -1 when the gateway reaches everything
+        # and None when it cannot reach it
+        if len(self.subnets) == 0:
+            return -1
+        if address is None:
+            return None
+        matching = [subnet.prefixlen for subnet in self.subnets if address in subnet]
+        return max(matching) if len(matching) > 0 else None
+
+    def fits(self, load: dict) -> bool:
+        return all(capacity is None or self.load[key] + load[key] <= capacity for key, capacity in self.capacity.items())
+
+    def can_hold(self, load: dict) -> bool:
+        # fits while the gateway is still empty
+        return all(capacity is None or load[key] <= capacity for key, capacity in self.capacity.items())
+
+    def utilization(self) -> float:
+        used = [self.load[key] / capacity for key, capacity in self.capacity.items() if capacity]
+        return max(used) if len(used) > 0 else float(len(self.plcs))
+
+    def place(self, plc_name: str, load: dict, plc_subnet):
+        self.plcs.append(plc_name)
+        self.plc_subnets.add(plc_subnet)
+        for key in self.load:
+            self.load[key] += load[key]
+
+    def summary(self) -> dict:
+        return {"plcs": self.plcs, "tags": self.load["tags"], "reads_per_second": self.load["reads_per_second"],
+                "sitewise_values_per_second": self.load["reads_per_second"],
+                "sitewise_put_requests_per_second": self.load["reads_per_second"] / SITEWISE_VALUES_PER_REQUEST,
+                "capacity": {key: capacity for key, capacity in self.capacity.items() if capacity is not None},
+                "utilization": self.utilization() if any(self.capacity.values()) else None}
+
+
+def plc_network(plc_info):
+    # (address, subnet) of the first ethernet interface, (None, None) without a usable address
+    ethernet = (plc_info.get("ethernet") or [{}])[0]
+    address = ethernet.get("NetworkAddress")
+    if not address:
+        return None, None
+    interface = ipaddress.ip_interface(f"{address}/{ethernet.get('SubnetMask') or '255.255.255.255'}")
+    return interface.ip, interface.network
+
+
+def plc_load(plc_info, rate_policy=None, default_interval: int = DEFAULT_SCHEDULE_INTERVAL_MS) -> dict:
+    entries = [entry for db_entries in plc_info["entries"].values() for entry in db_entries]
+    if rate_policy is None:
+        reads_per_second = len(entries) * 1000 / default_interval
+    else:
+        reads_per_second = sum(1000 / (rate_policy.interval(entry) or default_interval) for entry in entries)
+    return {"tags": len(entries), "reads_per_second": reads_per_second, "plcs": 1}
+
+
+class GatewayPlan:
+
+    def __init__(self, gateways: list):
+        self.gateways = gateways
+        self.unplaced = {}
+
+    def assignments(self) -> dict:
+        return {gateway.name: list(gateway.plcs) for gateway in self.gateways}
+
+    def summary(self) -> dict:
+        return {"gateways": {gateway.name: gateway.summary() for gateway in self.gateways}, "unplaced": self.unplaced}
+
+
+def load_gateway_inventory(inventory_file=DEFAULT_GATEWAY_INVENTORY_FILE):
+    with open(inventory_file, "r") as json_file:
+        return [Gateway(gateway) for gateway in json.load(json_file)["gateways"]]
+
+
+def plan_gateways(device_and_db_info, gateways: list, rate_policy=None,
+                  default_interval: int = DEFAULT_SCHEDULE_INTERVAL_MS) -> GatewayPlan:
+    plan = GatewayPlan(gateways)
+    plcs = []
+    for plc_name, plc_info in device_items(device_and_db_info):
+        load = plc_load(plc_info, rate_policy, default_interval)
+        try:
+            address, subnet = plc_network(plc_info)
+        except ValueError as error:
+            plan.unplaced[plc_name] = {"address": None, "reason": f"invalid network address: {error}", **load}
+            continue
+        plcs.append((plc_name, address, subnet, load))
+    # heaviest first, PLCs of one subnet next to each other for equal loads
+    plcs.sort(key=lambda plc: (-plc[3]["reads_per_second"], -plc[3]["tags"], str(plc[2]), plc[0]))
+    for plc_name, address, subnet, load in plcs:
+        candidates = []
+        for index, gateway in enumerate(gateways):
+            reach = gateway.reach(address)
+            if reach is not None and gateway.fits(load):
+                candidates.append((subnet not in gateway.plc_subnets, -reach, gateway.utilization(), index))
+        if len(candidates) == 0:
+            reachable = [gateway for gateway in gateways if gateway.reach(address) is not None]
+            if len(reachable) == 0:
+                reason = "no gateway reaches it"
+            elif not any(gateway.can_hold(load) for gateway in reachable):
+                reason = "exceeds the capacity of every reachable gateway"
+            else:
+                reason = "all reachable gateways are at capacity"
+            plan.unplaced[plc_name] = {"address": str(address) if address else None, "reason": reason, **load}
+            continue
+        gateways[min(candidates)[3]].place(plc_name, load, subnet)
+    return plan
@@ -0,0 +1,58 @@
+import base64
+import hashlib
+import boto3
+import botocore
+
+# Publishes the files of the SFC Greengrass component as S3 artifacts instead of base64 strings in the
+# deployment's configuration. Keys are content-addressed (<prefix>/<sha256>/<file name>), an artifact already in
+# the bucket is not uploaded again and a recipe only changes when one of its artifacts did. Greengrass checks
+# the Digest (base64 SHA-256) of every artifact it downloads.
+#
+# s3_client is any boto3 S3 client, e.g. one with endpoint_url pointing to a local S3 stand-in (MinIO, moto).
+
+DEFAULT_ARTIFACT_PREFIX = "sfc-artifacts"
+MISSING_OBJECT_CODES = ("404", "NoSuchKey", "NotFound")
+
+
+def sha256_digest(content: bytes) -> bytes:
+    return hashlib.sha256(content).digest()
+
+
+class ArtifactStore:
+
+    def __init__(self, bucket: str, prefix: str = DEFAULT_ARTIFACT_PREFIX, s3_client=None, region: str = None,
+                 endpoint_url: str = None):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.s3_client = s3_client or boto3.client("s3", region_name=region, endpoint_url=endpoint_url)
+        self.uploaded = []
+        self.unchanged = []
+
+    def key(self, name: str, content: bytes) -> str:
+        return "/".join(part for part in (self.prefix, sha256_digest(content).hex(), name) if part)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except botocore.exceptions.ClientError as error:
+            if error.response.get("Error", {}).get("Code") in MISSING_OBJECT_CODES:
+                return False
+            raise
+        return True
+
+    def publish(self, name: str, content: bytes) -> dict:
+        # uploads content unless its key is already there, returns the recipe artifact
+        key = self.key(name, content)
+        digest = base64.b64encode(sha256_digest(content)).decode("ascii")
+        if self.exists(key):
+            self.unchanged.append(key)
+        else:
+            # S3 verifies the checksum on upload
+            self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=content, ChecksumSHA256=digest)
+            self.uploaded.append(key)
+        return {"Uri": f"s3://{self.bucket}/{key}", "Digest": digest, "Algorithm": "SHA-256", "Unarchive": "NONE",
+                "Permission": {"Read": "OWNER", "Execute": "OWNER"}}
+
+    def parameters(self) -> dict:
+        # settings that change the generated recipe, part of the SFC package hash
+        return {"bucket": self.bucket, "prefix": self.prefix}
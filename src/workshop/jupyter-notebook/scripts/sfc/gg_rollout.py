@@ -0,0 +1,282 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import botocore
+from sfc import s7tia2sfc
+from sfc.sfc_package import SfcPackage
+
+# Rolls the generated SFC packages out to many Greengrass targets (core device things or thing groups), each with
+# its own package:
+#
+#   {"targets": [{"name": "gw-forming", "targetArn": "arn:aws:iot:us-east-1:123456789012:thing/gw-forming"},
+#                {"name": "press-line", "targetArn": "arn:aws:iot:...:thinggroup/PressLine", "package": "..."}]}
+#
+# package defaults to DEFAULT_PACKAGE_ROOT/<name>, the per-gateway packages of plan_sfc_gateways.py. The latest
+# deployment of every target comes from one paginated sweep, a target whose deployment already carries the config
+# hash is skipped. Deployments are created by a bounded worker pool, at most `rate` per second, and tracked on the
+# core devices until they are done. client is a greengrassv2 client (boto3 or a stub with the same methods).
+#
+# With an artifact store every target gets its own component. When the package of a target changed, its component
+# version is already registered with other artifacts, so the patch version of that target's component is bumped
+# past its highest registered version, the other targets keep theirs.
+
+DEFAULT_ROLLOUT_FILE = Path(__file__).resolve().parent.joinpath("gg_rollout.json")
+DEFAULT_PACKAGE_ROOT = Path("../imports/sfc/CarFactory/gateways")
+DEFAULT_ROLLOUT_WORKERS = 8
+DEFAULT_DEPLOYMENTS_PER_SECOND = 2.0
+CONFIG_HASH_TAG = "sfc-config-hash"
+# parameters of create_deployment that are taken over from the target's current deployment
+DEPLOYMENT_KEYS = ("components", "deploymentPolicies", "iotJobConfiguration", "parentTargetArn")
+# a latest deployment in one of these states still stands for its config
+CURRENT_DEPLOYMENT_STATES = ("ACTIVE", "COMPLETED")
+DEVICE_FAILED_STATES = ("FAILED", "TIMED_OUT", "CANCELED", "REJECTED")
+DEVICE_DONE_STATES = ("SUCCEEDED", "COMPLETED") + DEVICE_FAILED_STATES
+
+
+def error_code(error) -> str:
+    return error.response.get("Error", {}).get("Code") if isinstance(error, botocore.exceptions.ClientError) else None
+
+
+def artifact_digests(recipe: dict) -> list:
+    return [artifact.get("Digest") for manifest in recipe.get("Manifests", [])
+            for artifact in manifest.get("Artifacts", [])]
+
+
+def semver(version: str) -> tuple:
+    # (major, minor, patch), a pre-release suffix is ignored
+    return tuple(int(part) for part in version.split("-", 1)[0].split("+", 1)[0].split("."))
+
+
+class RateLimiter:
+    # spaces the calls of all threads at least 1 / rate seconds apart, no rate: no limit
+
+    def __init__(self, rate: float = None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        time.sleep(start - now)
+
+
+class RolloutTarget:
+
+    def __init__(self, target: dict, package_root=DEFAULT_PACKAGE_ROOT):
+        self.name = target["name"]
+        self.target_arn = target["targetArn"]
+        self.package = Path(target.get("package", Path(package_root, self.name)))
+        self.state = "PENDING"
+        self.detail = ""
+        self.config_hash = None
+        self.component_version = None
+        self.deployment_id = None
+
+    @property
+    def thing_name(self):
+        # core device of a thing target, None for thing groups
+        resource = self.target_arn.split(":", 5)[-1]
+        return resource[len("thing/"):] if resource.startswith("thing/") else None
+
+    @property
+    def account(self) -> str:
+        return self.target_arn.split(":")[4]
+
+    def deployment_name(self) -> str:
+        return f"sfc-{self.name}-{self.config_hash[:16]}"
+
+    def to_dict(self) -> dict:
+        return {"targetArn": self.target_arn, "package": str(self.package), "state": self.state, "detail": self.detail,
+                "configHash": self.config_hash, "componentVersion": self.component_version,
+                "deploymentId": self.deployment_id}
+
+
+def load_rollout_targets(rollout_file=DEFAULT_ROLLOUT_FILE, package_root=DEFAULT_PACKAGE_ROOT):
+    with open(rollout_file, "r") as json_file:
+        return [RolloutTarget(target, package_root) for target in json.load(json_file)["targets"]]
+
+
+class Rollout:
+
+    def __init__(self, targets: list, client, sfc_version: str, component_version: str, region: str,
+                 artifact_store=None, workers: int = DEFAULT_ROLLOUT_WORKERS,
+                 rate: float = DEFAULT_DEPLOYMENTS_PER_SECOND, force: bool = False, progress=None):
+        self.targets = targets
+        self.client = client
+        self.sfc_version = sfc_version
+        self.component_version = component_version
+        self.region = region
+        self.artifact_store = artifact_store
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.force = force
+        # called with the summary line whenever a target changes state
+        self.progress = progress or (lambda line: None)
+
+    def latest_deployments(self) -> dict:
+        # {targetArn: deployment summary} of the latest deployment of every target in the account
+        deployments = {}
+        request = {"historyFilter": "LATEST_ONLY", "maxResults": 100}
+        while True:
+            page = self.client.list_deployments(**request)
+            for deployment in page.get("deployments", []):
+                deployments.setdefault(deployment["targetArn"], deployment)
+            if not page.get("nextToken"):
+                return deployments
+            request["nextToken"] = page["nextToken"]
+
+    def config_hash(self, target: RolloutTarget) -> str:
+        package_hash = SfcPackage.read_manifest(target.package).get("hash")
+        if package_hash is None:
+            raise FileNotFoundError(f"no SFC package in {target.package}")
+        parameters = {"package": package_hash, "componentVersion": self.component_version,
+                      "artifacts": self.artifact_store.parameters() if self.artifact_store is not None else None}
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def component_arn(self, target: RolloutTarget, name: str, version: str = None) -> str:
+        arn = f"arn:aws:greengrass:{self.region}:{target.account}:components:{name}"
+        return arn if version is None else f"{arn}:versions:{version}"
+
+    def create_component_version(self, recipe: dict) -> bool:
+        # False when the component version is registered already
+        try:
+            self.client.create_component_version(inlineRecipe=json.dumps(recipe, sort_keys=True).encode("utf-8"))
+            return True
+        except botocore.exceptions.ClientError as error:
+            if error_code(error) != "ConflictException":
+                raise
+            return False
+
+    def registered_recipe(self, target: RolloutTarget, name: str, version: str) -> dict:
+        return json.loads(self.client.get_component(arn=self.component_arn(target, name, version),
+                                                    recipeOutputFormat="JSON")["recipe"])
+
+    def registered_versions(self, target: RolloutTarget, name: str) -> list:
+        versions = []
+        request = {"arn": self.component_arn(target, name)}
+        while True:
+            page = self.client.list_component_versions(**request)
+            versions.extend(version["componentVersion"] for version in page.get("componentVersions", []))
+            if not page.get("nextToken"):
+                return versions
+            request["nextToken"] = page["nextToken"]
+
+    def register(self, target: RolloutTarget, recipe: dict) -> str:
+        # registers the component and returns the version to deploy. A registered version is reused when it has
+        # the same artifacts. Otherwise (the package of an artifact mode target changed) the patch version is bumped
+        # past the highest registered one, so a changed package never needs a new component version for the fleet
+        name = recipe["ComponentName"]
+        if self.create_component_version(recipe):
+            return recipe["ComponentVersion"]
+        digests = artifact_digests(recipe)
+        if artifact_digests(self.registered_recipe(target, name, recipe["ComponentVersion"])) == digests:
+            return recipe["ComponentVersion"]
+        latest = max(self.registered_versions(target, name) + [recipe["ComponentVersion"]], key=semver)
+        if artifact_digests(self.registered_recipe(target, name, latest)) == digests:
+            # e.g. the retry of a rollout whose deployment failed
+            return latest
+        major, minor, patch = semver(latest)
+        recipe["ComponentVersion"] = f"{major}.{minor}.{patch + 1}"
+        if not self.create_component_version(recipe):
+            raise ValueError(f"{name} {recipe['ComponentVersion']} was registered by someone else meanwhile, retry")
+        return recipe["ComponentVersion"]
+
+    def deployment_document(self, current) -> dict:
+        # the current deployment of the target without its read-only fields, so other components stay deployed
+        if current is None:
+            return {"components": {}}
+        deployment = self.client.get_deployment(deploymentId=current["deploymentId"])
+        return {key: deployment[key] for key in DEPLOYMENT_KEYS if deployment.get(key) is not None}
+
+    def deploy(self, target: RolloutTarget, current):
+        target.config_hash = self.config_hash(target)
+        if (not self.force and current is not None and current.get("deploymentName") == target.deployment_name()
+                and current.get("deploymentStatus") in CURRENT_DEPLOYMENT_STATES):
+            target.state = "SKIPPED"
+            target.detail = "config unchanged"
+            target.deployment_id = current["deploymentId"]
+            return
+        recipe, configuration_update = s7tia2sfc.createSFCGreengrassComponent(
+            self.sfc_version, self.component_version, target.package, self.artifact_store)
+        if self.artifact_store is not None:
+            # the artifacts differ per target, so does the component
+            recipe["ComponentName"] = f"{recipe['ComponentName']}.{target.name}"
+        target.component_version = self.register(target, recipe)
+        document = self.deployment_document(current)
+        document.setdefault("components", {})[recipe["ComponentName"]] = {"componentVersion": target.component_version,
+                                                                          "configurationUpdate": configuration_update}
+        self.limiter.wait()
+        response = self.client.create_deployment(targetArn=target.target_arn, deploymentName=target.deployment_name(),
+                                                 tags={CONFIG_HASH_TAG: target.config_hash}, **document)
+        target.deployment_id = response["deploymentId"]
+        target.state = "DEPLOYED"
+        target.detail = "waiting for core device" if target.thing_name else f"IoT job {response.get('iotJobId')}"
+
+    def deploy_target(self, target: RolloutTarget, current):
+        try:
+            self.deploy(target, current)
+        except Exception as error:
+            target.state = "FAILED"
+            target.detail = str(error)
+
+    def run(self):
+        latest = self.latest_deployments()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.deploy_target, target, latest.get(target.target_arn)) for target in self.targets]
+            for _ in as_completed(futures):
+                self.progress(self.summary_line())
+
+    def device_status(self, target: RolloutTarget):
+        # execution status of the target's deployment on its core device, None while the device has not picked it up
+        request = {"coreDeviceThingName": target.thing_name}
+        while True:
+            page = self.client.list_effective_deployments(**request)
+            for deployment in page.get("effectiveDeployments", []):
+                if deployment["deploymentId"] == target.deployment_id:
+                    return deployment["coreDeviceExecutionStatus"], deployment.get("reason", "")
+            if not page.get("nextToken"):
+                return None, ""
+            request["nextToken"] = page["nextToken"]
+
+    def poll(self, target: RolloutTarget):
+        try:
+            status, reason = self.device_status(target)
+        except botocore.exceptions.ClientError as error:
+            target.detail = str(error)
+            return
+        if status is not None:
+            target.state = "FAILED" if status in DEVICE_FAILED_STATES else status
+            target.detail = reason
+
+    def track(self, timeout: float, poll_seconds: float = 10.0) -> bool:
+        # polls the core devices of the new deployments until all are done or timeout (s) passed, thing groups
+        # are not tracked here (see their IoT job). False when some are still running
+        deadline = time.monotonic() + timeout
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                running = [target for target in self.targets if target.thing_name
+                           and target.state not in DEVICE_DONE_STATES + ("PENDING", "SKIPPED")]
+                list(pool.map(self.poll, running))
+                self.progress(self.summary_line())
+                if all(target.state in DEVICE_DONE_STATES for target in running):
+                    return True
+                if time.monotonic() + poll_seconds > deadline:
+                    return False
+                time.sleep(poll_seconds)
+
+    def summary(self) -> dict:
+        return dict(sorted(Counter(target.state for target in self.targets).items()))
+
+    def summary_line(self) -> str:
+        return "  ".join(f"{state}: {count}" for state, count in self.summary().items())
+
+    def report(self) -> dict:
+        return {"componentVersion": self.component_version, "summary": self.summary(),
+                "targets": {target.name: target.to_dict() for target in self.targets}}
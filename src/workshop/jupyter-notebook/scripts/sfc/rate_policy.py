@@ -0,0 +1,54 @@
+import fnmatch
+import json
+from pathlib import Path
+
+# Read intervals per tag class. A rule matches on any combination of the tag name, S7 datatype and DB number
+# (globs, case sensitive), the first matching rule sets the interval, tags no rule matches use the default.
+#
+#   {"default": 500, "rules": [{"name": "VIN", "interval": 10000}, {"datatype": "String*", "interval": 5000}]}
+
+DEFAULT_RATE_POLICY_FILE = Path(__file__).resolve().parent.joinpath("rate_policy.json")
+RULE_FIELDS = {"name": "name", "datatype": "datatype", "db": "db_number"}
+
+
+class RatePolicy:
+
+    def __init__(self, policy: dict, default_interval: int = None):
+        # default_interval is used when the policy itself has no default, e.g. the template's schedule interval
+        self.default_interval = policy.get("default", default_interval)
+        self.rules = []
+        for rule in policy.get("rules", []):
+            conditions = tuple((RULE_FIELDS[field], str(rule[field])) for field in RULE_FIELDS if field in rule)
+            self.rules.append((conditions, int(rule["interval"])))
+
+    @classmethod
+    def from_file(cls, policy_file=DEFAULT_RATE_POLICY_FILE, default_interval: int = None):
+        with open(policy_file, "r") as json_file:
+            return cls(json.load(json_file), default_interval)
+
+    def interval(self, entry) -> int:
+        for conditions, interval in self.rules:
+            if all(fnmatch.fnmatchcase(str(entry[key]), pattern) for key, pattern in conditions):
+                return interval
+        return self.default_interval
+
+
+class RateSummary:
+    # channel reads per second of every PLC, all channels at the single schedule interval vs. the policy
+
+    def __init__(self, single_interval: int):
+        self.single_interval = single_interval
+        self.sources = {}
+
+    def add(self, source_name: str, intervals):
+        intervals = list(intervals)
+        self.sources[source_name] = {
+            "channels": len(intervals),
+            "reads_per_second": {"before": len(intervals) * 1000 / self.single_interval,
+                                 "after": sum(1000 / interval for interval in intervals)},
+        }
+
+    def report(self) -> dict:
+        totals = {when: sum(source["reads_per_second"][when] for source in self.sources.values())
+                  for when in ("before", "after")}
+        return {"single_interval_ms": self.single_interval, "reads_per_second": totals, "sources": self.sources}
@@ -0,0 +1,135 @@
+import math
+from s7tia.automationml2sw import device_items
+from s7tia.db_layout import BYTE, elementary_type_bits
+
+# Estimates the S7 read requests one scan of the SFC channels costs, with one read item per channel (what
+# s7tia2sfc configures) and with channels coalesced into byte ranges per DB. S7comm packs several items into one
+# PDU, limited by the negotiated PDU size for the request (12 bytes per item) and for the response (4 bytes per
+# item plus its data, padded to even length). Items larger than a PDU are split.
+
+DEFAULT_PDU_SIZE = 480  # S7-1500, S7-1200/300 negotiate 240
+DEFAULT_GAP_BYTES = 16
+DEFAULT_ROUND_TRIP_MS = 5.0
+DEFAULT_SCHEDULE_INTERVAL_MS = 500
+REQUEST_HEADER_BYTES = 12
+REQUEST_ITEM_BYTES = 12
+RESPONSE_HEADER_BYTES = 14
+RESPONSE_ITEM_HEADER_BYTES = 4
+
+
+class ReadItem:
+    # bytes start .. start + length of one DB, channels are the SFC channel names served by it
+
+    __slots__ = ("db_number", "start", "length", "channels")
+
+    def __init__(self, db_number: int, start: int, length: int, channels: list):
+        self.db_number = db_number
+        self.start = start
+        self.length = length
+        self.channels = channels
+
+    @property
+    def end(self) -> int:
+        return self.start + self.length
+
+    def to_dict(self) -> dict:
+        return {"db": self.db_number, "start": self.start, "length": self.length, "channels": self.channels}
+
+
+def channel_read(entry) -> ReadItem:
+    # bools are read as their byte, types without a known size as a single byte
+    size = elementary_type_bits(str(entry["datatype"]))
+    length = max(1, math.ceil(size[0] / BYTE)) if size is not None else 1
+    return ReadItem(int(entry["db_number"]), entry["offset"] // BYTE, length, [f"{entry['db_number']}_{entry['name']}"])
+
+
+def max_item_bytes(pdu_size: int) -> int:
+    return pdu_size - RESPONSE_HEADER_BYTES - RESPONSE_ITEM_HEADER_BYTES
+
+
+def count_pdus(items, pdu_size: int = DEFAULT_PDU_SIZE) -> int:
+    # items are packed into requests in the given order
+    max_data = max_item_bytes(pdu_size)
+    pdus = 0
+    request = response = None
+    for item in items:
+        if item.length > max_data:
+            pdus += math.ceil(item.length / max_data)
+            continue
+        item_response = RESPONSE_ITEM_HEADER_BYTES + item.length + item.length % 2
+        if request is None or request + REQUEST_ITEM_BYTES > pdu_size or response + item_response > pdu_size:
+            pdus += 1
+            request = REQUEST_HEADER_BYTES
+            response = RESPONSE_HEADER_BYTES
+        request += REQUEST_ITEM_BYTES
+        response += item_response
+    return pdus
+
+
+def coalesce(items, pdu_size: int = DEFAULT_PDU_SIZE, gap_bytes: int = DEFAULT_GAP_BYTES):
+    # merges items of a DB that overlap or are at most gap_bytes apart, as long as the range fits one PDU
+    max_data = max_item_bytes(pdu_size)
+    ranges = []
+    current = None
+    for item in sorted(items, key=lambda read: (read.db_number, read.start, -read.length)):
+        if (current is not None and item.db_number == current.db_number and item.start <= current.end + gap_bytes
+                and max(current.end, item.end) - current.start <= max_data):
+            current.length = max(current.end, item.end) - current.start
+            current.channels.extend(item.channels)
+            continue
+        current = ReadItem(item.db_number, item.start, item.length, list(item.channels))
+        ranges.append(current)
+    return ranges
+
+
+class ReadPlanner:
+    # collects the read plans of the PLCs one by one, so it works on the lazy device iterator as well
+
+    def __init__(self, pdu_size: int = DEFAULT_PDU_SIZE, gap_bytes: int = DEFAULT_GAP_BYTES,
+                 round_trip_ms: float = DEFAULT_ROUND_TRIP_MS, schedule_interval_ms: int = DEFAULT_SCHEDULE_INTERVAL_MS):
+        self.pdu_size = pdu_size
+        self.gap_bytes = gap_bytes
+        self.round_trip_ms = round_trip_ms
+        self.schedule_interval_ms = schedule_interval_ms
+        self.sources = {}
+
+    def add(self, plc_name: str, plc_info) -> dict:
+        channels = [channel_read(entry) for db_entries in plc_info["entries"].values() for entry in db_entries]
+        ranges = coalesce(channels, self.pdu_size, self.gap_bytes)
+        pdus = {"before": count_pdus(channels, self.pdu_size), "after": count_pdus(ranges, self.pdu_size)}
+        # one request in flight per PLC, every PDU costs a round trip
+        cycle_ms = {when: count * self.round_trip_ms for when, count in pdus.items()}
+        self.sources[plc_name] = {
+            "channels": len(channels),
+            "items": {"before": len(channels), "after": len(ranges)},
+            "pdus_per_cycle": pdus,
+            "bytes_per_cycle": {"before": sum(item.length for item in channels),
+                                "after": sum(item.length for item in ranges)},
+            "estimated_cycle_ms": cycle_ms,
+            "feasible": {when: ms <= self.schedule_interval_ms for when, ms in cycle_ms.items()},
+            "ranges": [item.to_dict() for item in ranges],
+        }
+        return self.sources[plc_name]
+
+    def channel_order(self, plc_name: str):
+        # channel names in read order, range by range
+        return [channel for item in self.sources[plc_name]["ranges"] for channel in item["channels"]]
+
+    def report(self) -> dict:
+        sources = self.sources.values()
+        return {
+            "pdu_size": self.pdu_size, "gap_bytes": self.gap_bytes, "round_trip_ms": self.round_trip_ms,
+            "schedule_interval_ms": self.schedule_interval_ms,
+            "totals": {key: {when: sum(source[key][when] for source in sources) for when in ("before", "after")}
+                       for key in ("items", "pdus_per_cycle", "bytes_per_cycle")},
+            "infeasible_sources": {when: [name for name, source in self.sources.items() if not source["feasible"][when]]
+                                   for when in ("before", "after")},
+            "sources": self.sources,
+        }
+
+
+def plan_reads(device_and_db_info, planner: ReadPlanner = None) -> dict:
+    planner = planner or ReadPlanner()
+    for plc_name, plc_info in device_items(device_and_db_info):
+        planner.add(plc_name, plc_info)
+    return planner.report()
@@ -1,11 +1,13 @@
 import base64
 import json
 import glob
-import shutil
-import zipfile
 from pathlib import Path
 import os
 from s7tia import tia_block_helper
+from s7tia.automationml2sw import device_items
+from sfc.adapter_shards import shard_scripts
+from sfc.sfc_package import PACKAGE_ZIP_NAME, SfcPackage
+from sfc.rate_policy import RateSummary
 import boto3
 import botocore
 
@@ -23,21 +25,39 @@ class bcolors:
 sfcArtifatctBaseURI = 'https://github.com/aws-samples/shopfloor-connectivity/releases/download'
 sfcVersionInUse = '1.5.4'
 
-def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider, gg, thingArn, ggcompversion, certParams):
+def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider, gg, thingArn, ggcompversion, certParams, read_planner=None, coalesce_channels=False, rate_policy=None, adapter_shards=None, force=False, artifact_store=None, greengrass_client=None):
+    if coalesce_channels and read_planner is None:
+        raise ValueError('coalesce_channels orders the channels by the read plan and needs a read_planner')
     Sources = {}
     s7source = {}
     Channels = {}
     s7channel = {}
+    # PropertyAlias per (source, channel), set when the entries carry the canonical alias of a TagRegistry
+    Aliases = {}
+    # everything is assembled in memory first, an unchanged package is not written again
+    package = SfcPackage({'greengrass': bool(gg), 'thingArn': thingArn, 'componentVersion': ggcompversion, 'region': region,
+                          'artifacts': artifact_store.parameters() if artifact_store is not None else None})
     with open(get_file_with_pathlib('templates/sfc-conf.json.template'), 'r') as sfc_template_file:
         sfc_template = json.load(sfc_template_file)
+    if read_planner is not None:
+        # feasibility of the read plan is judged against the interval of the main schedule
+        read_planner.schedule_interval_ms = sfc_template['Schedules'][0]['Interval']
+    if rate_policy is not None:
+        # {interval: {source: [channel names]}}, one schedule per interval replaces the main schedule
+        ScheduleChannels = {}
+        # entries no rule matches keep the main schedule's interval, the caller's policy is left as it is
+        default_interval = rate_policy.default_interval or sfc_template['Schedules'][0]['Interval']
+        rate_summary = RateSummary(sfc_template['Schedules'][0]['Interval'])
     
-    # create list from tia export
-    tia = list(device_and_db_info.values())
+    # device_and_db_info is the devices dict or the lazy (plc_name, device) iterator of automationml2sw.iter_devices,
+    # a device is dropped as soon as its channels are generated
 
     ################################
     # LOOP through TIA export obj  #
     ################################
-    for plc_info in tia:
+    for _, plc_info in device_items(device_and_db_info):
+        Channels = {}
+        s7channel_intervals = {}
         s7source['Name']=plc_info['asset_name']
         s7source['AdapterController']=plc_info['asset_name']+'_Controller'
         s7source['Description']=plc_info['TypeName']
@@ -58,7 +78,16 @@ def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider
                 s7channel['Address'] = "%DB{DB_NUMBER}:{BYTE_OFFSET}.{BIT_OFFSET}:{DATATYPE}"\
                 .format(DB_NUMBER=entry['db_number'], BYTE_OFFSET=byteOffSet, BIT_OFFSET=bitOffSet, DATATYPE=dataType)
                 Channels[db_number+'_'+entry['name']] = s7channel
+                if 'alias' in entry:
+                    Aliases[(plc_info['asset_name'], s7channel['Name'])] = entry['alias']
+                if rate_policy is not None:
+                    s7channel_intervals[s7channel['Name']] = rate_policy.interval(entry) or default_interval
                 s7channel = {}
+        if read_planner is not None:
+            read_planner.add(plc_info['asset_name'], plc_info)
+            if coalesce_channels:
+                # channels in read plan order, the members of one byte range follow each other
+                Channels = {name: Channels[name] for name in read_planner.channel_order(plc_info['asset_name'])}
         # add Channels to Sources Obj
         Sources[plc_info['asset_name']]['Channels'] = Channels
 
@@ -66,14 +95,54 @@ def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider
         sfc_template['ProtocolAdapters']['S7FleetPLCSim']['Controllers'][plc_info['asset_name']+'_Controller'] = "$(S7-Adapter-Controller-Block, ipAddress={IP}, controllerType={S7_TYPE})".format(IP=plc_info['ethernet'][0]['NetworkAddress'], S7_TYPE='S7-1500')
 
         # Reference Sources in the Main SFC Schedule
-        sfc_template['Schedules'][0]['Sources'][plc_info['asset_name']] = ['*']
+        if rate_policy is None:
+            sfc_template['Schedules'][0]['Sources'][plc_info['asset_name']] = ['*']
+        else:
+            source_intervals = [s7channel_intervals[name] for name in Channels]
+            rate_summary.add(plc_info['asset_name'], source_intervals)
+            for name in Channels:
+                ScheduleChannels.setdefault(s7channel_intervals[name], {}).setdefault(plc_info['asset_name'], []).append(name)
+            if len(set(source_intervals)) == 1:
+                ScheduleChannels[source_intervals[0]][plc_info['asset_name']] = ['*']
+
+        if adapter_shards is not None:
+            if rate_policy is None:
+                reads_per_second = len(Channels) * 1000 / sfc_template['Schedules'][0]['Interval']
+            else:
+                reads_per_second = sum(1000 / s7channel_intervals[name] for name in Channels)
+            adapter_shards.add(plc_info['asset_name'], len(Channels), reads_per_second)
 
     ################################
     #           LOOP END           #
     ################################
 
+    if adapter_shards is not None:
+        # controllers move to one IPC adapter process per shard, sources point to their shard
+        shard_report = adapter_shards.apply(sfc_template, Sources, 'S7FleetPLCSim')
+        package.add_json('sfc_adapter_shards.json', shard_report, config=False)
+        for name, script in shard_scripts(shard_report, sfcArtifatctBaseURI, sfcVersionInUse).items():
+            package.add_text(name, script)
+
     # write Sources object as file for later include
-    write_json_file_to_path(Sources, sfc_output, 'include_generated_sources.json')
+    package.add_json('include_generated_sources.json', Sources)
+
+    if read_planner is not None:
+        read_plan = read_planner.report()
+        package.add_json('s7_read_plan.json', read_plan, config=False)
+        print('S7 read plan: {before} -> {after} PDUs per cycle'.format(**read_plan['totals']['pdus_per_cycle']))
+        if read_plan['infeasible_sources']['after']:
+            print(bcolors.WARNING + 'PLCs exceeding the schedule interval: ' + ', '.join(read_plan['infeasible_sources']['after']) + bcolors.ENDC)
+
+    if rate_policy is not None:
+        main_schedule = sfc_template['Schedules'][0]
+        sfc_template['Schedules'] = [dict(main_schedule, Name='{name}_{interval}ms'.format(name=main_schedule['Name'], interval=interval),
+                                          Interval=interval, Sources=ScheduleChannels[interval])
+                                     for interval in sorted(ScheduleChannels)]
+        rate_report = rate_summary.report()
+        package.add_json('sfc_rate_summary.json', rate_report, config=False)
+        print('SFC schedules: {count} ({intervals} ms), channel reads per second {before:.0f} -> {after:.0f}'.format(
+            count=len(ScheduleChannels), intervals=', '.join(str(interval) for interval in sorted(ScheduleChannels)),
+            **rate_report['reads_per_second']))
 
     # create include section for sources.json
     sfc_template['Sources'] = "@file:include_generated_sources.json"
@@ -84,7 +153,7 @@ def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider
     for source in Sources.values():
         props = []
         for property in source['Channels'].values():
-            props.append({"PropertyAlias":"/some/datastream/"+source['Name']+"/"+property['Name'],
+            props.append({"PropertyAlias":Aliases.get((source['Name'], property['Name']), "/some/datastream/"+source['Name']+"/"+property['Name']),
                           "DataPath": "sources.\"{sourceName}\".values.\"{channelName}\"".format(sourceName=source['Name'], channelName=property['Name'])
                           })
         MappedAssets['Assets'].append({
@@ -99,7 +168,7 @@ def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider
     sfc_template['Targets']['DebugTarget'] = "$(DebugTarget-Block, logLevel=Info)"
     if credProvider=='AWS_IOT_CERT':
         SWTarget={ "Active": True, "TargetType": "AWS-SITEWISE","Region": region,"CredentialProviderClient": "AwsIotClient", "Assets": MappedAssets['Assets']}
-        write_json_file_to_path(SWTarget, sfc_output, 'include_generated_swtarget.json')
+        package.add_json('include_generated_swtarget.json', SWTarget)
         sfc_template['Targets']['SitewiseTarget'] = "@file:include_generated_swtarget.json"
         sfc_template['AwsIotCredentialProviderClients']['AwsIotClient'] = \
             "$(AwsIotClient-Block, endpoint={endpoint}, rolealias={rolealias}, thingname={thingname}, certificatefilepath={certificatefilepath}, keyfilepath={keyfilepath}, rootcafilepath={rootcafilepath}, greengrasspath={greengrasspath})" \
@@ -114,26 +183,24 @@ def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider
             )
     else:
         SWTarget={ "Active": True, "TargetType": "AWS-SITEWISE","Region": region, "Assets": MappedAssets['Assets']}
-        write_json_file_to_path(SWTarget, sfc_output, 'include_generated_swtarget.json')
+        package.add_json('include_generated_swtarget.json', SWTarget)
         sfc_template['Targets']['SitewiseTarget'] = "@file:include_generated_swtarget.json"
 
-    # write main sfc-config as file
-    write_json_file_to_path(sfc_template, sfc_output, 'sfc_config_generated.json')
+    # main sfc-config
+    package.add_json('sfc_config_generated.json', sfc_template)
+
+    # also all required sfc-templates
+    for file in sorted(glob.glob(str(get_file_with_pathlib('templates/*.json')))):
+        package.add_bytes(os.path.basename(file), Path(file).read_bytes(), config=True)
 
-    # also copy all required sfc-templates to out-dir
-    file_pattern=str(get_file_with_pathlib('templates/*.json'))
-    for file in glob.glob(file_pattern):
-        #print(file)
-        shutil.copy(file, sfc_output)
+    for name, script in createSFCInstallScript(sfcVersionInUse).items():
+        package.add_text(name, script)
 
-    # now zip all sfc-files inside the imports/sfc dir
-    zip = zipfile.ZipFile(sfc_output / "sfc-conf.zip", "w", zipfile.ZIP_DEFLATED)
-    file_pattern=str(sfc_output)+'/*.json'
-    #print(file_pattern)
-    for file in glob.glob(file_pattern):
-        abspath=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', file))
-        zip.write(abspath, arcname=os.path.basename(file))
-    zip.close()
+    if not force and package.is_unchanged(sfc_output):
+        print(bcolors.OKGREEN + '-> SFC Config Package @PATH: '+str(sfc_output)+' is up to date ('+package.content_hash()[:12]+'), nothing written' + bcolors.ENDC)
+        return package.content_hash()
+    # writes all files plus sfc-conf.zip (config files only), files of the previous build that are gone get removed
+    package.write(sfc_output)
 
 
     # stdout final sfc-config
@@ -145,9 +212,8 @@ def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider
     print('')
     #print(json.dumps(sfc_template, sort_keys=True, indent=4))
     print('')
-    print(bcolors.OKGREEN + '-> Successfully created SFC Config Zip Package @PATH: '+str(sfc_output)+"/sfc-conf.zip" + bcolors.ENDC)
+    print(bcolors.OKGREEN + '-> Successfully created SFC Config Zip Package @PATH: '+str(sfc_output)+"/"+PACKAGE_ZIP_NAME+' ('+package.content_hash()[:12]+')' + bcolors.ENDC)
 
-    createSFCInstallScript(sfcVersionInUse, sfc_output)
     print(bcolors.OKGREEN + '-> Successfully created SFC Standalone Installer @PATH: '+str(sfc_output)+'/sfc-standalone-install.sh')
     print('')
     print('>> To install SFC standalone run:')
@@ -160,13 +226,24 @@ def create_sfc_import_files(device_and_db_info, sfc_output, region, credProvider
     print('[LINUX] cd '+str(sfc_output)+' && export SFC_DEPLOYMENT_DIR=$(pwd) && ./sfc-main/bin/sfc-main -config sfc_config_generated.json')
     print('[WINDOWS] execute (double click) sfc-standalone-runner.bat'+bcolors.ENDC)
     print('')
+    if adapter_shards is not None and len(shard_report) > 0:
+        print(bcolors.OKGREEN + '>> Start the S7 adapter shards before sfc-main, one process each:')
+        print('')
+        for shard in shard_report:
+            print('[LINUX] ./sfc-adapter-{name}-install.sh && ./sfc-adapter-{name}-run.sh   ({sources} PLCs, {reads:.0f} reads/s, port {port})'
+                  .format(name=shard['adapter'].lower(), sources=len(shard['sources']), reads=shard['reads_per_second'], port=shard['port']))
+        print(bcolors.ENDC)
     # check if Greengrass Comp & Installer needs to be created
+    generated_files = []
     if gg == True:
-        createSFCGreengrassCompRecipe(sfcVersionInUse, ggcompversion, sfc_output, region, thingArn)
+        generated_files = createSFCGreengrassCompRecipe(sfcVersionInUse, ggcompversion, sfc_output, region, thingArn, artifact_store, greengrass_client)
+    # only a build that got through the Greengrass step is up to date next time
+    return package.write_manifest(sfc_output, generated_files)
         
 
 
-def createSFCInstallScript(sfcVersion, sfc_output):
+def createSFCInstallScript(sfcVersion):
+    # {file name: script} of the standalone installer and runner
     # WINDOWS
     #curl -LO https://github.com/aws-samples/shopfloor-connectivity/releases/download/v1.3.1/{sfc-main.tar.gz,debug-target.tar.gz,aws-sitewise-target.tar.gz,s7.tar.gz}
     #FOR %%i IN (*.tar.gz) DO tar -xf %%i
@@ -200,8 +277,6 @@ for file in *.tar.gz; do
 done
 """\
     .format(ARTIFACT_BASE_URL=sfcArtifatctBaseURI, VERSION=sfcVersion, MODULES=module_list_str)
-    write_file_to_path(installer, sfc_output, 'sfc-standalone-install.sh')
-    os.chmod(str(sfc_output)+'/'+'sfc-standalone-install.sh', 0o755)
 
     # WINDOWS
     # create an sfc installer bat script
@@ -210,7 +285,7 @@ done
 FOR %%i IN (*.tar.gz) DO tar -xf %%i
 """\
     .format(ARTIFACT_BASE_URL=sfcArtifatctBaseURI, VERSION=sfcVersion, MODULES="{sfc-main.tar.gz,debug-target.tar.gz,aws-sitewise-target.tar.gz,s7.tar.gz}")
-    write_file_to_path(installer_bat, sfc_output, 'sfc-standalone-install.bat')
+
     # WINDOWS
     # create an sfc installer bat script
     run_win = \
@@ -219,48 +294,73 @@ SET SFC_DEPLOYMENT_DIR=%cd%
 sfc-main\\bin\\sfc-main.bat -config %SFC_DEPLOYMENT_DIR%\\sfc_config_generated.json
 """\
     .format(ARTIFACT_BASE_URL=sfcArtifatctBaseURI, VERSION=sfcVersion, MODULES="sfc-main.tar.gz,debug-target.tar.gz,aws-sitewise-target.tar.gz,s7.tar.gz")
-    write_file_to_path(run_win, sfc_output, 'sfc-standalone-runner.bat')
+    return {'sfc-standalone-install.sh': installer, 'sfc-standalone-install.bat': installer_bat,
+            'sfc-standalone-runner.bat': run_win}
+
+def createSFCGreengrassComponent(sfcVersion, compVersion, sfc_output, artifact_store=None):
+    # (recipe, configurationUpdate of the deployment) for the SFC package in sfc_output
+    installer = createSFCInstallScript(sfcVersion)['sfc-standalone-install.sh']
+    # get the created sfc-config zip...
+    with open(Path(sfc_output) / PACKAGE_ZIP_NAME, 'rb') as zip:
+        bytes = zip.read()
 
+    if artifact_store is not None:
+        # recipe references the artifacts by URI & digest, the deployment carries no payload
+        with open(get_file_with_pathlib('templates/gg_comp_artifacts.json.template'), 'r') as gg_template:
+            recipe = json.load(gg_template)
+        recipe['Manifests'][0]['Artifacts'] = [artifact_store.publish('sfc-standalone-install.sh', installer.encode('ascii')),
+                                               artifact_store.publish(PACKAGE_ZIP_NAME, bytes)]
+        # reset drops the base64 payloads of a previous inline deployment
+        configuration_update = {'reset': [""]}
+    else:
+        # Maximum size of the configuration is 16KB -> use an artifact_store for larger plants
+        installer_base64 = base64.b64encode(installer.encode('ascii')).decode('ascii')
+        sfc_config_zip_base64 = base64.b64encode(bytes).decode('ascii')
+        with open(get_file_with_pathlib('templates/gg_comp.json.template'), 'r') as gg_template:
+            recipe = json.load(gg_template)
+        configuration_update = {
+            'reset': [""],
+            'merge': '{\"sfcInstallerBase64Encoded\":\"'+installer_base64+'\",\"sfcConfigZipBase64Encoded\":\"'+sfc_config_zip_base64+'\"}'
+        }
+    recipe['ComponentVersion'] = compVersion
+    return recipe, configuration_update
 
-    return installer
 
-def createSFCGreengrassCompRecipe(sfcVersion, compVersion, sfc_output, region, thingArn):
-    # check if we have session creds... we need them for checking gg deployment config
+def createSFCGreengrassCompRecipe(sfcVersion, compVersion, sfc_output, region, thingArn, artifact_store=None, client=None):
+    # artifact_store (sfc.gg_artifacts.ArtifactStore) publishes installer & config zip as S3 artifacts, without it
+    # both go base64-encoded into the deployment config. client is the greengrassv2 client, created when not given
     print('')
     print(bcolors.OKGREEN+'...Packaging Greengrass Deployment JSON at @PATH: '+str(sfc_output))
     print('')
-    print('...Checking AWS session credentials'+bcolors.ENDC)
-    if check_aws_creds() is False:
-        print('No AWS session credentials available - exiting now!')
-        exit(1)
-    else:
-        print('OK')
-        print('')
-
-    installer = createSFCInstallScript(sfcVersion, sfc_output)
-    installer_base64 = base64.b64encode(installer.encode('ascii')).decode('ascii')
-
-
-    # TODO: Maximum size of component recipe is 16KB -> Consider packing base64 strings into deployment config...
-    # 
-    # get the created sfc-config zip and base64-encode it...
-    with open(sfc_output / "sfc-conf.zip", 'rb') as zip:
-        bytes = zip.read()
-    sfc_config_zip_base64 = base64.b64encode(bytes).decode('ascii')
-    
-    # now get comp template and fill it - write as file to output-dir
-    with open(get_file_with_pathlib('templates/gg_comp.json.template'), 'r') as gg_template:
-        recipe = json.load(gg_template)
-    recipe['ComponentVersion'] = compVersion
+    if client is None:
+        # check if we have session creds... we need them for checking gg deployment config
+        print('...Checking AWS session credentials'+bcolors.ENDC)
+        if check_aws_creds() is False:
+            print('No AWS session credentials available - exiting now!')
+            exit(1)
+        else:
+            print('OK')
+            print('')
+        client = boto3.client('greengrassv2', region_name=region)
+
+    recipe, configuration_update = createSFCGreengrassComponent(sfcVersion, compVersion, sfc_output, artifact_store)
+    if artifact_store is not None:
+        for key in artifact_store.uploaded:
+            print(bcolors.OKGREEN + '-> Uploaded Greengrass artifact s3://'+artifact_store.bucket+'/'+key + bcolors.ENDC)
+        for key in artifact_store.unchanged:
+            print('-> Greengrass artifact s3://'+artifact_store.bucket+'/'+key+' is up to date, not uploaded')
+
+    # write the filled comp template as file to output-dir
     compFileName='sfc-greengrass-component-recipe-{compVersion}.json'.format(compVersion=compVersion)
     write_json_file_to_path(recipe, sfc_output, compFileName)
 
     # create Greengrass deployment config
-    client = boto3.client('greengrassv2', region_name=region)
     
     try:
         gg_list_deployments = client.list_deployments(targetArn=thingArn)
-    except client.exceptions.AccessDeniedException:
+    except botocore.exceptions.ClientError as error:
+        if error.response.get('Error', {}).get('Code') != 'AccessDeniedException':
+            raise
         print('Access denied for '+thingArn+' Does that arn exist? Also check your Session Credentials & IAM Role. Exiting now!')
         exit(1)
     
@@ -269,21 +369,13 @@ def createSFCGreengrassCompRecipe(sfcVersion, compVersion, sfc_output, region, t
     gg_deployment = client.get_deployment(deploymentId=gg_deploymentId)
     #print(gg_deployment)
 
-    gg_deployment['components']['custom.aws.sfc.runtime.with.config'] = {
+    gg_deployment['components'][recipe['ComponentName']] = {
                                  'componentVersion': compVersion,
-                                 'configurationUpdate': {
-                                     'reset': [""],
-                                     'merge': '{\"sfcInstallerBase64Encoded\":\"'+installer_base64+'\",\"sfcConfigZipBase64Encoded\":\"'+sfc_config_zip_base64+'\"}'
-                                  }
+                                 'configurationUpdate': configuration_update
     }
     ## delete invalid entries
-    del gg_deployment['creationTimestamp']
-    del gg_deployment['ResponseMetadata']
-    del gg_deployment['deploymentId']
-    del gg_deployment['deploymentStatus']
-    del gg_deployment['isLatestForTarget']
-    del gg_deployment['revisionId']
-    del gg_deployment['tags']
+    for key in ('creationTimestamp', 'ResponseMetadata', 'deploymentId', 'deploymentStatus', 'isLatestForTarget', 'revisionId', 'tags'):
+        gg_deployment.pop(key, None)
 
     
     deplFileName='sfc-greengrass-component-deployment-{compVersion}.json'.format(compVersion=compVersion)
@@ -306,6 +398,7 @@ def createSFCGreengrassCompRecipe(sfcVersion, compVersion, sfc_output, region, t
     print(gg_deploy)
     print('')
     print(bcolors.ENDC)
+    return [compFileName, deplFileName]
     
 
 
@@ -0,0 +1,101 @@
+import hashlib
+import io
+import json
+import os
+import zipfile
+from pathlib import Path
+
+# An SFC config package assembled in memory. Config files go into sfc-conf.zip, everything else (installers,
+# reports) is only written next to it. Files and zip entries are ordered by name and the zip entries carry a
+# fixed timestamp, so the same content always gives the same bytes and the same content hash.
+#
+# The hash of the last written package is kept in PACKAGE_MANIFEST_NAME, a build with the same hash is a no-op.
+# The manifest is only written by write_manifest() once every step of the build succeeded, files generated after
+# write() (e.g. the Greengrass recipe) are listed in it as well.
+
+PACKAGE_ZIP_NAME = "sfc-conf.zip"
+PACKAGE_MANIFEST_NAME = ".sfc-package.json"
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def json_bytes(data) -> bytes:
+    # same formatting as s7tia2sfc.write_json_file_to_path
+    return json.dumps(data, sort_keys=True, indent=4).encode("utf-8")
+
+
+class SfcPackage:
+
+    def __init__(self, parameters: dict = None):
+        # parameters are build settings that change the outcome without being part of a file (e.g. Greengrass)
+        self.parameters = parameters or {}
+        self.files = {}
+        self.config_files = set()
+
+    def add_json(self, name: str, data, config: bool = True):
+        self.add_bytes(name, json_bytes(data), config)
+
+    def add_text(self, name: str, text: str, config: bool = False):
+        self.add_bytes(name, text.encode("utf-8"), config)
+
+    def add_bytes(self, name: str, content: bytes, config: bool = False):
+        self.files[name] = content
+        if config:
+            self.config_files.add(name)
+        else:
+            self.config_files.discard(name)
+
+    def content_hash(self) -> str:
+        digest = hashlib.sha256(json_bytes(self.parameters))
+        for name in sorted(self.files):
+            content = self.files[name]
+            digest.update(f"\0{name}\0{name in self.config_files}\0{len(content)}\0".encode("utf-8"))
+            digest.update(content)
+        return digest.hexdigest()
+
+    def zip_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for name in sorted(self.config_files):
+                info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                zip_file.writestr(info, self.files[name])
+        return buffer.getvalue()
+
+    @staticmethod
+    def read_manifest(output_dir: Path) -> dict:
+        manifest_file = Path(output_dir, PACKAGE_MANIFEST_NAME)
+        if not manifest_file.is_file():
+            return {}
+        with open(manifest_file, "r") as json_file:
+            return json.load(json_file)
+
+    def is_unchanged(self, output_dir: Path) -> bool:
+        # same hash as the last write and none of its files deleted since
+        manifest = self.read_manifest(output_dir)
+        return (manifest.get("hash") == self.content_hash()
+                and all(Path(output_dir, name).is_file() for name in manifest.get("files", [])))
+
+    def write(self, output_dir: Path):
+        # writes all files and the zip, removes the files of the previous package that are no longer part of it.
+        # The previous manifest is removed first, an interrupted build is never up to date
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        previous_files = set(self.read_manifest(output_dir).get("files", []))
+        output_dir.joinpath(PACKAGE_MANIFEST_NAME).unlink(missing_ok=True)
+        for name in sorted(self.files):
+            file_path = output_dir.joinpath(name)
+            file_path.write_bytes(self.files[name])
+            if name.endswith(".sh"):
+                os.chmod(file_path, 0o755)
+        output_dir.joinpath(PACKAGE_ZIP_NAME).write_bytes(self.zip_bytes())
+        files = sorted(self.files) + [PACKAGE_ZIP_NAME]
+        for stale_name in previous_files.difference(files):
+            output_dir.joinpath(stale_name).unlink(missing_ok=True)
+
+    def write_manifest(self, output_dir: Path, generated_files=()) -> str:
+        # marks the written package as complete, generated_files are further files of the build in output_dir
+        files = sorted(set(self.files).union([PACKAGE_ZIP_NAME], generated_files))
+        content_hash = self.content_hash()
+        Path(output_dir, PACKAGE_MANIFEST_NAME).write_bytes(json_bytes({"hash": content_hash, "files": files}))
+        return content_hash
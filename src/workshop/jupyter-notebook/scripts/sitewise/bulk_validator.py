@@ -0,0 +1,353 @@
+import gc
+import json
+import re
+from pathlib import Path
+from sitewise.sitewise_helper import DataType, SiteWiseBulk, dependency_levels
+
+# Offline checks of a SiteWise bulk import document (sw-bulk-schema.json plus the cross references the schema
+# cannot express). Every entity is indexed once by externalId, all checks are dictionary lookups.
+
+NAME_PATTERN = re.compile(r"[^\u0000-\u001F\u007F]{1,256}")
+EXTERNAL_ID_PATTERN = re.compile(r"[a-zA-Z0-9_][a-zA-Z_\-0-9.:]*[a-zA-Z0-9_]")
+EXTERNAL_ID_MAX_LENGTH = 128
+ALIAS_PATTERN = re.compile(r"[^\u0000-\u001F\u007F]{1,1000}")
+VARIABLE_NAME_PATTERN = re.compile(r"[a-z][a-z0-9_]{0,63}")
+DATA_TYPES = frozenset(data_type.name for data_type in DataType)
+PROPERTY_TYPE_KINDS = frozenset(("attribute", "measurement", "transform", "metric"))
+
+
+class ValidationIssue:
+    __slots__ = ("code", "path", "message")
+
+    def __init__(self, code: str, path: str, message: str):
+        self.code = code
+        self.path = path
+        self.message = message
+
+    def __str__(self):
+        return f"{self.path}: {self.message} [{self.code}]"
+
+
+class BulkValidationError(ValueError):
+
+    def __init__(self, issues):
+        self.issues = issues
+        shown = "\n".join(f"  {issue}" for issue in issues[:20])
+        more = f"\n  ... {len(issues) - 20} more" if len(issues) > 20 else ""
+        super().__init__(f"{len(issues)} problem(s) in the SiteWise bulk document:\n{shown}{more}")
+
+
+class _Issues(list):
+
+    def __init__(self, max_issues):
+        super().__init__()
+        self.max_issues = max_issues
+
+    def add(self, code: str, path: str, message: str):
+        self.append(ValidationIssue(code, path, message))
+        if self.max_issues is not None and len(self) >= self.max_issues:
+            raise _TooManyIssues()
+
+
+class _TooManyIssues(Exception):
+    pass
+
+
+class _Rules:
+    # Names and externalIds are only collected while walking the document, every distinct value is matched
+    # against its pattern once at the end. Property names and externalIds repeat across thousands of models.
+
+    NAME_FIELDS = ("assetModelName", "assetName", "name")
+    EXTERNAL_ID_FIELDS = ("assetModelExternalId", "assetExternalId", "externalId")
+
+    def __init__(self, issues: _Issues):
+        self.issues = issues
+        self.names = set()
+        self.external_ids = set()
+
+    @staticmethod
+    def _invalid(values, pattern, max_length: int):
+        # one regex run over all values joined by newlines, per value only when that fails
+        if all(type(value) is str for value in values) and max(map(len, values), default=1) <= max_length:
+            joined = "\n".join(values)
+            joined_pattern = re.compile(f"(?:{pattern.pattern})(?:\n(?:{pattern.pattern}))*")
+            if not values or (joined.count("\n") == len(values) - 1 and joined_pattern.fullmatch(joined) is not None):
+                return set()
+        return {value for value in values if not (isinstance(value, str) and len(value) <= max_length
+                                                  and pattern.fullmatch(value))}
+
+    def check(self, document):
+        invalid_names = self._invalid(self.names, NAME_PATTERN, 256)
+        invalid_external_ids = self._invalid(self.external_ids, EXTERNAL_ID_PATTERN, EXTERNAL_ID_MAX_LENGTH)
+        if not invalid_names and not invalid_external_ids:
+            return
+        # rare, so the second walk to find where the invalid values are is fine
+        for path, field, value in _iter_fields(document, self.NAME_FIELDS + self.EXTERNAL_ID_FIELDS):
+            if field in self.NAME_FIELDS and value in invalid_names:
+                self.issues.add("invalid_name", path, f"name {value!r} must be 1-256 characters without control characters")
+            elif field in self.EXTERNAL_ID_FIELDS and value in invalid_external_ids:
+                self.issues.add("invalid_external_id", path,
+                                f"externalId {value!r} must be 2-128 characters of a-z, A-Z, 0-9, _ - . : and must "
+                                f"not start or end with - . :")
+
+
+def _iter_fields(value, fields, path=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            item_path = f"{path}.{key}" if path else key
+            if key in fields and not isinstance(item, (dict, list)):
+                yield item_path, key, item
+            else:
+                yield from _iter_fields(item, fields, item_path)
+    elif isinstance(value, list):
+        for number, item in enumerate(value):
+            yield from _iter_fields(item, fields, f"{path}[{number}]")
+
+
+def _index_unique(issues: _Issues, items, key: str, path: str, code: str = "duplicate_external_id"):
+    index = {}
+    for number, item in enumerate(items):
+        value = item.get(key)
+        if value is None:
+            issues.add("missing_field", f"{path}[{number}]", f"'{key}' is missing")
+        elif value in index:
+            issues.add(code, f"{path}[{number}]", f"{key} {value!r} already used by {path}[{index[value]}]")
+        else:
+            index[value] = number
+    return index
+
+
+def _check_cycles(issues: _Issues, children, list_name: str):
+    # children maps an externalId to the externalIds of its children
+    try:
+        dependency_levels(children, lambda external_id: external_id, children.get, list_name)
+    except ValueError as e:
+        issues.add("hierarchy_cycle", list_name, str(e))
+
+
+def _check_expression_variables(issues: _Issues, path: str, variables, model_property_ids, model_hierarchies,
+                                model_properties):
+    for variable_number, variable in enumerate(variables or []):
+        variable_path = f"{path}.variables[{variable_number}]"
+        if not VARIABLE_NAME_PATTERN.fullmatch(str(variable.get("name", ""))):
+            issues.add("invalid_variable", variable_path, f"variable name {variable.get('name')!r} must match [a-z][a-z0-9_]*")
+        value = variable.get("value") or {}
+        property_external_id = value.get("propertyExternalId")
+        if property_external_id is None:
+            continue
+        hierarchy_external_id = value.get("hierarchyExternalId")
+        referenced_property_ids = model_property_ids
+        if hierarchy_external_id is not None:
+            hierarchy = model_hierarchies.get(hierarchy_external_id)
+            if hierarchy is None:
+                issues.add("dangling_reference", variable_path, f"hierarchyExternalId {hierarchy_external_id!r} is not a hierarchy of the model")
+                continue
+            referenced_property_ids = model_properties.get(hierarchy.get("childAssetModelExternalId"))
+            if referenced_property_ids is None:
+                continue
+        if property_external_id not in referenced_property_ids:
+            issues.add("dangling_reference", variable_path, f"propertyExternalId {property_external_id!r} does not exist")
+
+
+def _validate_asset_models(rules: _Rules, asset_models, existing_asset_model_ids):
+    issues = rules.issues
+    names = rules.names
+    external_ids = rules.external_ids
+    asset_model_index = _index_unique(issues, asset_models, "assetModelExternalId", "assetModels")
+    model_properties = {}
+    model_hierarchies = {}
+    expression_properties = []
+    for number, asset_model in enumerate(asset_models):
+        asset_model_id = asset_model.get("assetModelExternalId")
+        names.add(asset_model.get("assetModelName"))
+        external_ids.add(asset_model_id)
+
+        properties = {}
+        property_names = set()
+        for property_number, asset_model_property in enumerate(asset_model.get("assetModelProperties", [])):
+            external_id = asset_model_property.get("externalId")
+            name = asset_model_property.get("name")
+            if external_id in properties or name in property_names:
+                issues.add("duplicate_external_id" if external_id in properties else "duplicate_name",
+                           f"assetModels[{number}].assetModelProperties[{property_number}]",
+                           f"property {name!r}/{external_id!r} is defined twice in the model")
+            properties[external_id] = asset_model_property
+            property_names.add(name)
+            if asset_model_property.get("dataType") not in DATA_TYPES:
+                issues.add("invalid_datatype", f"assetModels[{number}].assetModelProperties[{property_number}].dataType",
+                           f"dataType {asset_model_property.get('dataType')!r} is not one of {sorted(DATA_TYPES)}")
+            property_type = asset_model_property.get("type") or {}
+            if len(property_type) != 1 or not PROPERTY_TYPE_KINDS.issuperset(property_type):
+                issues.add("invalid_property_type", f"assetModels[{number}].assetModelProperties[{property_number}].type",
+                           f"type must hold exactly one of {sorted(PROPERTY_TYPE_KINDS)}, got {sorted(property_type)}")
+            elif "transform" in property_type or "metric" in property_type:
+                expression_properties.append((f"assetModels[{number}].assetModelProperties[{property_number}].type",
+                                              asset_model_id, property_type))
+        names.update(property_names)
+        external_ids.update(properties)
+        model_properties[asset_model_id] = properties
+
+        hierarchies = {}
+        hierarchy_names = set()
+        for hierarchy_number, hierarchy in enumerate(asset_model.get("assetModelHierarchies", [])):
+            external_id = hierarchy.get("externalId")
+            name = hierarchy.get("name")
+            if external_id in hierarchies or name in hierarchy_names:
+                issues.add("duplicate_external_id" if external_id in hierarchies else "duplicate_name",
+                           f"assetModels[{number}].assetModelHierarchies[{hierarchy_number}]",
+                           f"hierarchy {name!r}/{external_id!r} is defined twice in the model")
+            hierarchies[external_id] = hierarchy
+            hierarchy_names.add(name)
+            child_model_id = hierarchy.get("childAssetModelExternalId")
+            if child_model_id not in asset_model_index and child_model_id not in existing_asset_model_ids:
+                issues.add("dangling_reference",
+                           f"assetModels[{number}].assetModelHierarchies[{hierarchy_number}].childAssetModelExternalId",
+                           f"asset model {child_model_id!r} does not exist")
+        names.update(hierarchy_names)
+        external_ids.update(hierarchies)
+        model_hierarchies[asset_model_id] = hierarchies
+
+    # expressions may reference properties of child models, so they are checked once all models are indexed
+    for path, asset_model_id, property_type in expression_properties:
+        for kind in ("transform", "metric"):
+            if kind in property_type:
+                _check_expression_variables(issues, f"{path}.{kind}", property_type[kind].get("variables"),
+                                            model_properties[asset_model_id], model_hierarchies[asset_model_id],
+                                            model_properties)
+
+    # models without hierarchies cannot be part of a cycle
+    _check_cycles(issues, {asset_model_id: [hierarchy.get("childAssetModelExternalId") for hierarchy in hierarchies.values()]
+                           for asset_model_id, hierarchies in model_hierarchies.items() if asset_model_id is not None and hierarchies},
+                  "assetModels")
+    return model_properties, model_hierarchies
+
+
+def _validate_assets(rules: _Rules, assets, model_properties, model_hierarchies, existing_asset_model_ids,
+                     existing_asset_ids):
+    issues = rules.issues
+    names = rules.names
+    external_ids = rules.external_ids
+    asset_index = _index_unique(issues, assets, "assetExternalId", "assets")
+    aliases = {}
+    parents = {}
+    children = {}
+    for number, asset in enumerate(assets):
+        asset_id = asset.get("assetExternalId")
+        names.add(asset.get("assetName"))
+        external_ids.add(asset_id)
+        asset_model_id = asset.get("assetModelExternalId")
+        properties = model_properties.get(asset_model_id)
+        hierarchies = model_hierarchies.get(asset_model_id)
+        if properties is None and asset_model_id not in existing_asset_model_ids:
+            issues.add("dangling_reference", f"assets[{number}].assetModelExternalId",
+                       f"asset model {asset_model_id!r} does not exist")
+
+        asset_property_ids = set()
+        for property_number, asset_property in enumerate(asset.get("assetProperties", [])):
+            external_id = asset_property.get("externalId")
+            if external_id in asset_property_ids:
+                issues.add("duplicate_external_id", f"assets[{number}].assetProperties[{property_number}]",
+                           f"property {external_id!r} is set twice on the asset")
+            asset_property_ids.add(external_id)
+            if properties is not None and external_id not in properties:
+                issues.add("unknown_property", f"assets[{number}].assetProperties[{property_number}].externalId",
+                           f"property {external_id!r} is not part of asset model {asset_model_id!r}")
+            alias = asset_property.get("alias")
+            if alias is None:
+                continue
+            if alias in aliases:
+                issues.add("alias_collision", f"assets[{number}].assetProperties[{property_number}].alias",
+                           f"alias {alias!r} already used by assets[{aliases[alias]}]")
+                continue
+            aliases[alias] = number
+            if not ALIAS_PATTERN.fullmatch(alias):
+                issues.add("invalid_alias", f"assets[{number}].assetProperties[{property_number}].alias",
+                           f"alias {alias!r} must be 1-1000 characters without control characters")
+
+        for hierarchy_number, hierarchy in enumerate(asset.get("assetHierarchies", [])):
+            hierarchy_path = f"assets[{number}].assetHierarchies[{hierarchy_number}]"
+            model_hierarchy = hierarchies.get(hierarchy.get("externalId")) if hierarchies is not None else None
+            if hierarchies is not None and model_hierarchy is None:
+                issues.add("dangling_reference", f"{hierarchy_path}.externalId",
+                           f"hierarchy {hierarchy.get('externalId')!r} is not part of asset model {asset_model_id!r}")
+            child_id = hierarchy.get("childAssetExternalId")
+            child_number = asset_index.get(child_id)
+            if child_number is None:
+                if child_id not in existing_asset_ids:
+                    issues.add("dangling_reference", f"{hierarchy_path}.childAssetExternalId", f"asset {child_id!r} does not exist")
+                continue
+            if model_hierarchy is not None and assets[child_number].get("assetModelExternalId") != model_hierarchy.get("childAssetModelExternalId"):
+                issues.add("wrong_child_model", f"{hierarchy_path}.childAssetExternalId",
+                           f"asset {child_id!r} is not an instance of {model_hierarchy.get('childAssetModelExternalId')!r}")
+            if parents.setdefault(child_id, number) != number:
+                issues.add("multiple_parents", f"{hierarchy_path}.childAssetExternalId",
+                           f"asset {child_id!r} is already a child of assets[{parents[child_id]}]")
+            children.setdefault(asset_id, []).append(child_id)
+
+    _check_cycles(issues, children, "assets")
+
+
+def _bulk_document(bulk: SiteWiseBulk):
+    # same shape as the json document, built directly from the slots instead of the generic to_json_value
+    def data_type_name(data_type):
+        return data_type.name if isinstance(data_type, DataType) else data_type
+
+    return {"assetModels": [{"assetModelName": asset_model.assetModelName,
+                             "assetModelExternalId": asset_model.assetModelExternalId,
+                             "assetModelProperties": [{"name": asset_model_property.name,
+                                                       "externalId": asset_model_property.externalId,
+                                                       "dataType": data_type_name(asset_model_property.dataType),
+                                                       "type": asset_model_property.type}
+                                                      for asset_model_property in asset_model.assetModelProperties],
+                             "assetModelHierarchies": [{"name": hierarchy.name, "externalId": hierarchy.externalId,
+                                                        "childAssetModelExternalId": hierarchy.childAssetModelExternalId}
+                                                       for hierarchy in asset_model.assetModelHierarchies]}
+                            for asset_model in bulk.assetModels],
+            "assets": [{"assetName": asset.assetName, "assetExternalId": asset.assetExternalId,
+                        "assetModelExternalId": asset.assetModelExternalId,
+                        "assetProperties": [{"externalId": asset_property.externalId, "alias": asset_property.alias}
+                                            for asset_property in asset.assetProperties],
+                        "assetHierarchies": [{"externalId": hierarchy.externalId,
+                                              "childAssetExternalId": hierarchy.childAssetExternalId}
+                                             for hierarchy in asset.assetHierarchies]}
+                       for asset in bulk.assets]}
+
+
+def validate_bulk(bulk, existing_asset_model_ids=(), existing_asset_ids=(), max_issues: int = None):
+    # bulk is a SiteWiseBulk or a parsed bulk json document. References to entities that already exist in
+    # SiteWise and are not part of the document can be allowed with existing_asset_model_ids/existing_asset_ids.
+    # Returns the list of ValidationIssue, at most max_issues.
+    issues = _Issues(max_issues)
+    rules = _Rules(issues)
+    # the indexes are hundreds of thousands of small containers without cycles, collecting them is wasted time
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        document = _bulk_document(bulk) if isinstance(bulk, SiteWiseBulk) else bulk
+        unknown = sorted(set(document) - {"assetModels", "assets"})
+        if unknown:
+            issues.add("unknown_field", "", f"unknown top level field(s) {unknown}")
+        model_properties, model_hierarchies = _validate_asset_models(rules, document.get("assetModels", []),
+                                                                     set(existing_asset_model_ids))
+        _validate_assets(rules, document.get("assets", []), model_properties, model_hierarchies,
+                         set(existing_asset_model_ids), set(existing_asset_ids))
+        rules.check(document)
+    except _TooManyIssues:
+        pass
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return list(issues)
+
+
+def validate_bulk_file(file_name: Path, **kwargs):
+    with open(file_name, "r") as json_file:
+        return validate_bulk(json.load(json_file), **kwargs)
+
+
+def check_bulk(bulk, **kwargs):
+    # raises BulkValidationError instead of returning the issues
+    issues = validate_bulk(bulk, **kwargs)
+    if issues:
+        raise BulkValidationError(issues)
+    return bulk
@@ -1,5 +1,8 @@
+import hashlib
 from sitewise.sitewise_helper import *
 from pathlib import Path
+from s7tia.automationml2sw import device_items
+from s7tia.tag_naming import sitewise_alias, sitewise_external_id
 
 
 def map_s7_datatype_to_sw(s7_data_type) -> str:
@@ -12,40 +15,111 @@ def map_s7_datatype_to_sw(s7_data_type) -> str:
         return DataType.STRING.name
 
 
-def add_or_create_to_sw_import(device_and_db_info, project_name, top_hierarchy_asset_name=None,
-                               existing_sw_import: SiteWiseBulk = SiteWiseBulk()) -> SiteWiseBulk:
-    devices = device_and_db_info
-    bulk_import = existing_sw_import
+def add_to_sw_import_builder(builder: SiteWiseBulkBuilder, device_and_db_info, project_name,
+                             top_hierarchy_asset_name=None) -> SiteWiseBulkBuilder:
+    # upserts the models and assets of one project. Re-adding a device replaces its properties, re-adding the
+    # project with a top hierarchy asset replaces the hierarchies to its devices. Devices no longer passed in keep
+    # their model and asset in the builder, start from a new builder to drop them.
+    base_asset_model = None
     if top_hierarchy_asset_name:
-        base_asset_model = AssetModel(f"{top_hierarchy_asset_name}_model",
-                                 f"{project_name}_{top_hierarchy_asset_name}_model")
-        base_asset = Asset(f"{top_hierarchy_asset_name}",
-                                      f"{project_name}_{top_hierarchy_asset_name}",
-                           f"{project_name}_{top_hierarchy_asset_name}_model")
-        bulk_import.assetModels.append(base_asset_model)
-        bulk_import.assets.append(base_asset)
-    for plc_name, plc_info in devices.items():
-        asset_model = AssetModel(f"{plc_name}_model", f"{project_name}_{plc_name}_model")
-        bulk_import.assetModels.append(asset_model)
-        base_asset_model.assetModelHierarchies.append(AssetModelHierarchy(f"{plc_name}_model_to_plant",
-                                                                          f"{plc_name}_model_to_plant_hierarchy",
-                                                                          asset_model.assetModelExternalId))
-        asset = Asset.from_asset_model(plc_name, f"{project_name}_{plc_name}", asset_model)
-        bulk_import.assets.append(asset)
-        base_asset.assetHierarchies.append(AssetHierarchy(f"{plc_name}_model_to_plant_hierarchy",
-                                                               asset.assetExternalId))
+        base_asset_model = builder.upsert_asset_model(AssetModel(f"{top_hierarchy_asset_name}_model",
+                                                                 f"{project_name}_{top_hierarchy_asset_name}_model"))
+        base_asset = builder.upsert_asset(Asset(f"{top_hierarchy_asset_name}",
+                                                f"{project_name}_{top_hierarchy_asset_name}",
+                                                f"{project_name}_{top_hierarchy_asset_name}_model"))
+    for plc_name, plc_info in device_items(device_and_db_info):
+        asset_model = builder.upsert_asset_model(AssetModel(f"{plc_name}_model", f"{project_name}_{plc_name}_model"))
+        asset = builder.upsert_asset(Asset.from_asset_model(plc_name, f"{project_name}_{plc_name}", asset_model))
+        if base_asset_model is not None:
+            builder.upsert_asset_model_hierarchy(base_asset_model.assetModelExternalId,
+                                                 AssetModelHierarchy(f"{plc_name}_model_to_plant",
+                                                                     f"{plc_name}_model_to_plant_hierarchy",
+                                                                     asset_model.assetModelExternalId))
+            builder.upsert_asset_hierarchy(base_asset.assetExternalId,
+                                           AssetHierarchy(f"{plc_name}_model_to_plant_hierarchy", asset.assetExternalId))
         for db_number, db_entries in plc_info["entries"].items():
             for entry in db_entries:
-                print(entry)
                 entry_name = entry["name"]
                 entry_sw_datatype = map_s7_datatype_to_sw(entry['datatype'])
                 asset_model_property = AssetModelProperty(f"{db_number}_{entry_name}",
-                                                                           f"{db_number}_{entry_name}",
-                                                                           entry_sw_datatype)
-                asset_model.assetModelProperties.append(asset_model_property)
-                # {PLCNAME}DB{DBID}/{ENTRYNAME}
-            asset.assetProperties.append(
-                AssetProperty.from_asset_model_property(asset_model_property,
-                                                        f"{plc_name}DB{db_number}/{entry_name}"))
-    return bulk_import
+                                                          sitewise_external_id(f"{db_number}_{entry_name}"),
+                                                          entry_sw_datatype)
+                builder.upsert_asset_model_property(asset_model.assetModelExternalId, asset_model_property)
+                # entries of a TagRegistry carry their canonical alias
+                alias = entry.get("alias") or sitewise_alias(plc_name, db_number, entry_name)
+                builder.upsert_asset_property(asset.assetExternalId, AssetProperty.from_asset_model_property(
+                    asset_model_property, alias))
+    return builder
+
+
+def add_or_create_to_sw_import(device_and_db_info, project_name, top_hierarchy_asset_name=None,
+                               existing_sw_import: SiteWiseBulk = None) -> SiteWiseBulk:
+    # returns a new SiteWiseBulk, existing_sw_import is merged in but not modified. To aggregate many
+    # projects call add_to_sw_import_builder on one builder and build() once.
+    builder = SiteWiseBulkBuilder(existing_sw_import)
+    add_to_sw_import_builder(builder, device_and_db_info, project_name, top_hierarchy_asset_name)
+    return builder.build()
+
+
+def asset_model_signature(asset_model: AssetModel) -> str:
+    # structural identity of a model: its properties (names plus datatypes) and hierarchies, order independent
+    properties = sorted((asset_model_property.name, asset_model_property.externalId, str(asset_model_property.dataType))
+                        for asset_model_property in asset_model.assetModelProperties)
+    hierarchies = sorted(hierarchy.childAssetModelExternalId for hierarchy in asset_model.assetModelHierarchies)
+    return hashlib.sha256(repr((properties, hierarchies)).encode()).hexdigest()
+
+
+def deduplicate_asset_models(bulk_import: SiteWiseBulk, project_name: str):
+    # Maps structurally identical asset models (e.g. one per PLC with the same DB layout) onto one shared model
+    # {project_name}_shared_{digest}_model. Assets are rewritten to the shared model and parent hierarchies to
+    # the same child model are merged into one. Models without a twin are left untouched.
+    models_by_signature = {}
+    for asset_model in bulk_import.assetModels:
+        models_by_signature.setdefault(asset_model_signature(asset_model), []).append(asset_model)
+    shared_model_ids = {}
+    shared_models = {}
+    for signature, asset_models in models_by_signature.items():
+        if len(asset_models) < 2:
+            continue
+        shared_model = AssetModel(f"shared_{signature[:12]}_model", f"{project_name}_shared_{signature[:12]}_model")
+        shared_model.assetModelProperties = asset_models[0].assetModelProperties
+        shared_model.assetModelHierarchies = asset_models[0].assetModelHierarchies
+        shared_models[shared_model.assetModelExternalId] = [asset_model.assetModelExternalId
+                                                            for asset_model in asset_models]
+        for asset_model in asset_models:
+            shared_model_ids[asset_model.assetModelExternalId] = shared_model
+
+    models_before = len(bulk_import.assetModels)
+    asset_models = []
+    added_shared_models = set()
+    for asset_model in bulk_import.assetModels:
+        shared_model = shared_model_ids.get(asset_model.assetModelExternalId)
+        if shared_model is None:
+            asset_models.append(asset_model)
+        elif shared_model.assetModelExternalId not in added_shared_models:
+            added_shared_models.add(shared_model.assetModelExternalId)
+            asset_models.append(shared_model)
+    bulk_import.assetModels = asset_models
 
+    # one hierarchy per parent and child model, the asset hierarchies of the merged ones point to the kept one
+    hierarchy_ids = {}
+    for asset_model in bulk_import.assetModels:
+        hierarchies = {}
+        for hierarchy in asset_model.assetModelHierarchies:
+            shared_model = shared_model_ids.get(hierarchy.childAssetModelExternalId)
+            if shared_model is None:
+                hierarchies[hierarchy.externalId] = hierarchy
+                continue
+            merged_id = f"{shared_model.assetModelName}_to_{asset_model.assetModelName}_hierarchy"
+            hierarchy_ids[hierarchy.externalId] = merged_id
+            hierarchies[merged_id] = AssetModelHierarchy(f"{shared_model.assetModelName}_to_{asset_model.assetModelName}",
+                                                         merged_id, shared_model.assetModelExternalId)
+        asset_model.assetModelHierarchies = list(hierarchies.values())
+    for asset in bulk_import.assets:
+        shared_model = shared_model_ids.get(asset.assetModelExternalId)
+        if shared_model is not None:
+            asset.assetModelExternalId = shared_model.assetModelExternalId
+        for hierarchy in asset.assetHierarchies:
+            hierarchy.externalId = hierarchy_ids.get(hierarchy.externalId, hierarchy.externalId)
+    return {"models_before": models_before, "models_after": len(bulk_import.assetModels),
+            "collapsed": models_before - len(bulk_import.assetModels), "shared_models": shared_models}
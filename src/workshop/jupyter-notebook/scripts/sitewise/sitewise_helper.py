@@ -1,9 +1,34 @@
-import jsonpickle
+import copy
+import json
 from enum import Enum
 from pathlib import Path
+from types import MappingProxyType
+
+
+def _frozen(mapping):
+    return MappingProxyType({key: _frozen(value) if isinstance(value, dict) else value
+                             for key, value in mapping.items()})
+
+
+# per shard limits of write_shards, below the per job limits of a metadata transfer job
+DEFAULT_MAX_SHARD_BYTES = 64 * 2**20
+DEFAULT_MAX_SHARD_ENTITIES = 5000
+
+# for now just hardcode the type, one read-only instance shared by all properties
+DEFAULT_PROPERTY_TYPE = _frozen({
+    "measurement": {
+        "processingConfig": {
+            "forwardingConfig": {
+                "state": "DISABLED"
+            }
+        }
+    }
+})
 
 
 class AssetModel:
+    __slots__ = ("assetModelName", "assetModelExternalId", "assetModelProperties", "assetModelHierarchies")
+
     def __init__(self, assetModelName: str, assetModelExternalId: str):
         self.assetModelName = assetModelName
         self.assetModelExternalId = assetModelExternalId
@@ -20,23 +45,18 @@ class DataType(Enum):
 
 
 class AssetModelProperty:
-    def __init__(self, name: str, externalId: str, dataType: DataType):
+    __slots__ = ("name", "externalId", "dataType", "type")
+
+    def __init__(self, name: str, externalId: str, dataType: DataType, type=DEFAULT_PROPERTY_TYPE):
         self.name = name
         self.externalId = externalId
         self.dataType = dataType
-        # for now just hardcode the type
-        self.type = {
-            "measurement": {
-                "processingConfig": {
-                    "forwardingConfig": {
-                        "state": "DISABLED"
-                    }
-                }
-            }
-        }
+        self.type = type
 
 
 class AssetModelHierarchy:
+    __slots__ = ("name", "externalId", "childAssetModelExternalId")
+
     def __init__(self, name: str, externalId: str, childAssetModelExternalId: str):
         self.name = name
         self.externalId = externalId
@@ -44,6 +64,8 @@ class AssetModelHierarchy:
 
 
 class Asset:
+    __slots__ = ("assetName", "assetExternalId", "assetModelExternalId", "assetProperties", "assetHierarchies")
+
     def __init__(self, assetName: str, assetExternalId: str, assetModelExternalId: str):
         self.assetName = assetName
         self.assetExternalId = assetExternalId
@@ -59,6 +81,8 @@ class Asset:
 
 
 class AssetProperty:
+    __slots__ = ("externalId", "alias")
+
     def __init__(self, externalId: str, alias: str):
         self.externalId = externalId
         self.alias = alias
@@ -68,16 +92,262 @@ class AssetProperty:
         return cls(asset_model_property.externalId, alias)
 
 class AssetHierarchy:
+    __slots__ = ("externalId", "childAssetExternalId")
+
     def __init__(self, externalId: str, childAssetExternalId: str):
         self.externalId = externalId
         self.childAssetExternalId = childAssetExternalId
 
 
+def to_json_value(obj, _plain_mappings=None):
+    # plain dict/list tree of a slot object, the shared read-only property type is converted only once
+    if _plain_mappings is None:
+        _plain_mappings = {}
+    if isinstance(obj, list):
+        return [to_json_value(item, _plain_mappings) for item in obj]
+    if isinstance(obj, MappingProxyType):
+        plain = _plain_mappings.get(id(obj))
+        if plain is None:
+            plain = _plain_mappings[id(obj)] = {key: to_json_value(value, _plain_mappings) for key, value in obj.items()}
+        return plain
+    if isinstance(obj, Enum):
+        return obj.name
+    slots = getattr(type(obj), "__slots__", None)
+    if slots is not None:
+        return {slot: to_json_value(getattr(obj, slot), _plain_mappings) for slot in slots}
+    return obj
+
+
+def encode_entity(entity, compact: bool = False, _plain_mappings=None) -> str:
+    # one asset model or asset as it appears inside the bulk document, indented like json.dumps(indent=2)
+    # of the whole document would indent it
+    value = to_json_value(entity, _plain_mappings)
+    if compact:
+        return json.dumps(value, separators=(",", ":"))
+    return "    " + json.dumps(value, indent=2).replace("\n", "\n    ")
+
+
+def iter_document_chunks(encoded_lists, compact: bool = False):
+    # encoded_lists are (list_name, iterable of encode_entity strings) pairs
+    yield "{" if compact else "{\n"
+    for list_number, (list_name, encoded_entities) in enumerate(encoded_lists):
+        if list_number > 0:
+            yield "," if compact else ",\n"
+        yield f'"{list_name}":[' if compact else f'  "{list_name}": ['
+        entity_count = 0
+        for encoded_entity in encoded_entities:
+            if compact:
+                yield ("," if entity_count > 0 else "") + encoded_entity
+            else:
+                yield (",\n" if entity_count > 0 else "\n") + encoded_entity
+            entity_count += 1
+        yield "]" if compact or entity_count == 0 else "\n  ]"
+    yield "}" if compact else "\n}"
+
+
+def _document_overhead_bytes(list_name: str, compact: bool) -> int:
+    # size of a shard document holding one non-empty list, without its entities and their separators
+    chunks = iter_document_chunks([(name, ["x"] if name == list_name else [])
+                                   for name in SiteWiseBulk.__slots__], compact)
+    return len("".join(chunks)) - 1
+
+
+def dependency_levels(entities, external_id, child_external_ids, kind: str):
+    # level 0 entities have no children in this bulk, a parent is one level above its deepest child.
+    # Children that are not part of the bulk are expected to exist already.
+    children = {external_id(entity): child_external_ids(entity) for entity in entities}
+    levels = {}
+    for root_id, root_children in children.items():
+        if root_id in levels:
+            continue
+        if not root_children:
+            levels[root_id] = 0
+            continue
+        stack = [(root_id, iter(root_children))]
+        visiting = {root_id}
+        while stack:
+            parent_id, pending = stack[-1]
+            for child_id in pending:
+                if child_id in children and child_id not in levels:
+                    if child_id in visiting:
+                        raise ValueError(f"{kind} hierarchy cycle through '{child_id}'")
+                    visiting.add(child_id)
+                    stack.append((child_id, iter(children[child_id])))
+                    break
+            else:
+                stack.pop()
+                visiting.discard(parent_id)
+                levels[parent_id] = 1 + max((levels[child_id] for child_id in children[parent_id] if child_id in children),
+                                            default=-1)
+    return levels
+
+
 class SiteWiseBulk:
-    def __init__(self, assetModels: [AssetModel] = [], assets: [Asset] = []):
-        self.assetModels = assetModels
-        self.assets = assets
+    __slots__ = ("assetModels", "assets")
+
+    def __init__(self, assetModels: [AssetModel] = None, assets: [Asset] = None):
+        self.assetModels = assetModels if assetModels is not None else []
+        self.assets = assets if assets is not None else []
+
+    def iter_json_chunks(self, compact: bool = False):
+        # Same document as json.dumps(indent=2) of the whole graph, but encoded one model/asset at a time,
+        # so memory is bounded by the largest entity. Compact chunks use the C encoder.
+        plain_mappings = {}
+        return iter_document_chunks([(list_name, (encode_entity(entity, compact, plain_mappings)
+                                                  for entity in getattr(self, list_name)))
+                                     for list_name in self.__slots__], compact)
+
+    def write_to_file(self, file_name: Path, compact: bool = False):
+        with open(file_name, "w", buffering=2**20) as json_file:
+            for chunk in self.iter_json_chunks(compact):
+                json_file.write(chunk)
+
+    def dependency_waves(self):
+        # [(list_name, [entities])] in import order: all asset models before the assets using them and
+        # children before the parents whose hierarchies reference them. Entities of one wave are independent.
+        waves = []
+        for list_name, external_id, child_external_ids in (
+                ("assetModels", lambda model: model.assetModelExternalId,
+                 lambda model: [hierarchy.childAssetModelExternalId for hierarchy in model.assetModelHierarchies]),
+                ("assets", lambda asset: asset.assetExternalId,
+                 lambda asset: [hierarchy.childAssetExternalId for hierarchy in asset.assetHierarchies])):
+            entities = getattr(self, list_name)
+            levels = dependency_levels(entities, external_id, child_external_ids, list_name)
+            level_entities = {}
+            for entity in entities:
+                level_entities.setdefault(levels[external_id(entity)], []).append(entity)
+            waves.extend((list_name, level_entities[level]) for level in sorted(level_entities))
+        return waves
+
+    def write_shards(self, output_dir: Path, base_name: str, max_shard_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+                     max_shard_entities: int = DEFAULT_MAX_SHARD_ENTITIES, compact: bool = False):
+        # Splits the bulk into dependency ordered import files <base_name>.<wave>-<shard>.sitewise.json, each below
+        # max_shard_bytes and max_shard_entities (asset models and assets, not properties). Shards of a wave can
+        # be imported as parallel metadata transfer jobs, a wave must complete before the next one starts.
+        # Returns the manifest, which is also written to <base_name>.manifest.json.
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        plain_mappings = {}
+        manifest = {"base_name": base_name, "max_shard_bytes": max_shard_bytes,
+                    "max_shard_entities": max_shard_entities, "waves": []}
+        for wave_number, (list_name, entities) in enumerate(self.dependency_waves()):
+            overhead = _document_overhead_bytes(list_name, compact)
+            separator = 1 if compact else 2
+            shards = []
+            shard_entities, shard_bytes = [], overhead
+            for entity in entities:
+                encoded_entity = encode_entity(entity, compact, plain_mappings)
+                if overhead + len(encoded_entity.encode("utf-8")) > max_shard_bytes:
+                    raise ValueError(f"{list_name} entity of {len(encoded_entity)} bytes exceeds the shard size "
+                                     f"limit of {max_shard_bytes} bytes")
+                entity_bytes = len(encoded_entity.encode("utf-8")) + (separator if shard_entities else 0)
+                if shard_entities and (len(shard_entities) >= max_shard_entities or
+                                       shard_bytes + entity_bytes > max_shard_bytes):
+                    shards.append(self._write_shard(output_dir, base_name, wave_number, len(shards), list_name,
+                                                    shard_entities, compact))
+                    shard_entities, shard_bytes = [], overhead
+                    entity_bytes -= separator
+                shard_entities.append(encoded_entity)
+                shard_bytes += entity_bytes
+            if shard_entities:
+                shards.append(self._write_shard(output_dir, base_name, wave_number, len(shards), list_name,
+                                                shard_entities, compact))
+            manifest["waves"].append({"wave": wave_number, "type": list_name, "shards": shards})
+        with open(output_dir.joinpath(f"{base_name}.manifest.json"), "w") as json_file:
+            json_file.write(json.dumps(manifest, indent=2))
+        return manifest
+
+    @staticmethod
+    def _write_shard(output_dir: Path, base_name: str, wave_number: int, shard_number: int, list_name: str,
+                     encoded_entities, compact: bool):
+        file_name = f"{base_name}.{wave_number:03d}-{shard_number:03d}.sitewise.json"
+        with open(output_dir.joinpath(file_name), "w", buffering=2**20) as json_file:
+            for chunk in iter_document_chunks([(name, encoded_entities if name == list_name else [])
+                                               for name in SiteWiseBulk.__slots__], compact):
+                json_file.write(chunk)
+        return {"file": file_name, "entities": len(encoded_entities),
+                "bytes": output_dir.joinpath(file_name).stat().st_size}
+
+
+class SiteWiseBulkBuilder:
+    # Asset models and assets indexed by externalId, their properties and hierarchies indexed per entity.
+    # Upserting an existing externalId replaces it, including its properties and hierarchies, instead of
+    # appending a duplicate. build() returns a new SiteWiseBulk with copies of the indexed objects on every call.
+
+    def __init__(self, bulk: SiteWiseBulk = None):
+        self.asset_models = {}
+        self.asset_model_properties = {}
+        self.asset_model_hierarchies = {}
+        self.assets = {}
+        self.asset_properties = {}
+        self.asset_hierarchies = {}
+        if bulk is not None:
+            self.merge(bulk)
+
+    def upsert_asset_model(self, asset_model: AssetModel) -> AssetModel:
+        # properties and hierarchies of asset_model replace the indexed ones, add more with the upsert_* below
+        external_id = asset_model.assetModelExternalId
+        indexed = self.asset_models.get(external_id)
+        if indexed is None:
+            indexed = self.asset_models[external_id] = AssetModel(asset_model.assetModelName, external_id)
+        self.asset_model_properties[external_id] = {}
+        self.asset_model_hierarchies[external_id] = {}
+        indexed.assetModelName = asset_model.assetModelName
+        for asset_model_property in asset_model.assetModelProperties:
+            self.upsert_asset_model_property(external_id, asset_model_property)
+        for hierarchy in asset_model.assetModelHierarchies:
+            self.upsert_asset_model_hierarchy(external_id, hierarchy)
+        return indexed
+
+    def upsert_asset_model_property(self, asset_model_external_id: str, asset_model_property: AssetModelProperty):
+        self.asset_model_properties[asset_model_external_id][asset_model_property.externalId] = asset_model_property
+
+    def upsert_asset_model_hierarchy(self, asset_model_external_id: str, hierarchy: AssetModelHierarchy):
+        self.asset_model_hierarchies[asset_model_external_id][hierarchy.externalId] = hierarchy
+
+    def upsert_asset(self, asset: Asset) -> Asset:
+        # like upsert_asset_model, properties and hierarchies of asset replace the indexed ones
+        external_id = asset.assetExternalId
+        indexed = self.assets.get(external_id)
+        if indexed is None:
+            indexed = self.assets[external_id] = Asset(asset.assetName, external_id, asset.assetModelExternalId)
+        self.asset_properties[external_id] = {}
+        self.asset_hierarchies[external_id] = {}
+        indexed.assetName = asset.assetName
+        indexed.assetModelExternalId = asset.assetModelExternalId
+        for asset_property in asset.assetProperties:
+            self.upsert_asset_property(external_id, asset_property)
+        for hierarchy in asset.assetHierarchies:
+            self.upsert_asset_hierarchy(external_id, hierarchy)
+        return indexed
+
+    def upsert_asset_property(self, asset_external_id: str, asset_property: AssetProperty):
+        self.asset_properties[asset_external_id][asset_property.externalId] = asset_property
+
+    def upsert_asset_hierarchy(self, asset_external_id: str, hierarchy: AssetHierarchy):
+        # one asset hierarchy holds many children, so the child is part of the key
+        self.asset_hierarchies[asset_external_id][(hierarchy.externalId, hierarchy.childAssetExternalId)] = hierarchy
+
+    def merge(self, bulk: SiteWiseBulk):
+        for asset_model in bulk.assetModels:
+            self.upsert_asset_model(asset_model)
+        for asset in bulk.assets:
+            self.upsert_asset(asset)
+        return self
 
-    def write_to_file(self, file_name: Path):
-        with open(file_name, "w") as json_file:
-            json_file.write(jsonpickle.encode(self, unpicklable=False, indent=2))
+    def build(self) -> SiteWiseBulk:
+        # callers rewrite the built document in place (e.g. deduplicate_asset_models), so the children are copied
+        bulk = SiteWiseBulk([], [])
+        for external_id, indexed in self.asset_models.items():
+            asset_model = AssetModel(indexed.assetModelName, external_id)
+            asset_model.assetModelProperties = [copy.copy(asset_model_property) for asset_model_property
+                                                in self.asset_model_properties[external_id].values()]
+            asset_model.assetModelHierarchies = [copy.copy(hierarchy) for hierarchy
+                                                 in self.asset_model_hierarchies[external_id].values()]
+            bulk.assetModels.append(asset_model)
+        for external_id, indexed in self.assets.items():
+            asset = Asset(indexed.assetName, external_id, indexed.assetModelExternalId)
+            asset.assetProperties = [copy.copy(asset_property) for asset_property in self.asset_properties[external_id].values()]
+            asset.assetHierarchies = [copy.copy(hierarchy) for hierarchy in self.asset_hierarchies[external_id].values()]
+            bulk.assets.append(asset)
+        return bulk
@@ -0,0 +1,282 @@
+import json
+import time
+from pathlib import Path
+from sitewise.bulk_validator import check_bulk
+from sitewise.sitewise_helper import SiteWiseBulk, dependency_levels, to_json_value
+
+# Plan/apply of a generated SiteWiseBulk against the live SiteWise state. The clients are injected (boto3
+# 'iotsitewise', 'iottwinmaker' and 's3' clients or fakes with the same methods), nothing here creates one.
+
+LIVE_STATE_CACHE_DIR = Path(__file__).resolve().parent / ".live_state_cache"
+PLAN_KEYS = ("create", "update", "delete")
+JOB_FINAL_STATES = ("COMPLETED", "ERROR", "CANCELLED")
+
+
+def paginate(call, result_key: str, **kwargs):
+    next_token = None
+    while True:
+        response = call(nextToken=next_token, **kwargs) if next_token else call(**kwargs)
+        yield from response[result_key]
+        next_token = response.get("nextToken")
+        if not next_token:
+            break
+
+
+def _type_kind(property_type):
+    return sorted((property_type or {}).keys())
+
+
+def normalize_asset_model(asset_model):
+    # the parts of an asset model the generators own, order independent
+    return {"assetModelName": asset_model["assetModelName"],
+            "assetModelProperties": sorted((asset_model_property["externalId"], asset_model_property["name"],
+                                            asset_model_property["dataType"], _type_kind(asset_model_property.get("type")))
+                                           for asset_model_property in asset_model["assetModelProperties"]),
+            "assetModelHierarchies": sorted((hierarchy["externalId"], hierarchy["name"], hierarchy["childAssetModelExternalId"])
+                                            for hierarchy in asset_model["assetModelHierarchies"])}
+
+
+def normalize_asset(asset, managed_property_ids=None):
+    # a live asset lists every property of its model, managed_property_ids restricts it to the ones the
+    # generated document sets
+    return {"assetName": asset["assetName"], "assetModelExternalId": asset["assetModelExternalId"],
+            "assetProperties": sorted((asset_property["externalId"], asset_property.get("alias"))
+                                      for asset_property in asset["assetProperties"]
+                                      if managed_property_ids is None or asset_property["externalId"] in managed_property_ids),
+            "assetHierarchies": sorted((hierarchy["externalId"], hierarchy["childAssetExternalId"])
+                                       for hierarchy in asset["assetHierarchies"])}
+
+
+def _normalize_jsonable(value):
+    # tuples turn into lists in the json cache, compare both sides in list form
+    return json.loads(json.dumps(value))
+
+
+class LiveSiteWiseState:
+    # Asset models and assets in bulk document form, keyed by externalId, plus the SiteWise ids needed to
+    # delete them. Describe results are cached per entity and only refetched when its lastUpdateDate changed,
+    # so a refresh of an unchanged plant costs the paginated list calls only.
+
+    def __init__(self, cache_file: Path = None):
+        self.cache_file = Path(cache_file) if cache_file is not None else None
+        self.assetModels = {}
+        self.assets = {}
+        self.describe_calls = 0
+        self._described = {"assetModels": {}, "assets": {}}
+        if self.cache_file is not None and self.cache_file.is_file():
+            with open(self.cache_file, "r") as json_file:
+                self._described = json.load(json_file)
+
+    def save(self):
+        if self.cache_file is None:
+            return
+        self.cache_file.parents[0].mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, "w") as json_file:
+            json.dump(self._described, json_file)
+
+    def _cached(self, list_name: str, summary):
+        cached = self._described[list_name].get(summary["id"])
+        if cached is not None and cached["lastUpdateDate"] == str(summary.get("lastUpdateDate")):
+            return cached
+        return None
+
+    def refresh(self, sitewise_client, is_managed):
+        # is_managed(external_id) selects the entities to describe, everything else is only listed
+        model_summaries = list(paginate(sitewise_client.list_asset_models, "assetModelSummaries",
+                                        assetModelTypes=["ASSET_MODEL"]))
+        model_external_ids = {summary["id"]: summary.get("externalId") for summary in model_summaries}
+        described = {"assetModels": {}, "assets": {}}
+        self.assetModels = {}
+        for summary in model_summaries:
+            if not is_managed(summary.get("externalId")):
+                continue
+            cached = self._cached("assetModels", summary)
+            if cached is None:
+                self.describe_calls += 1
+                response = sitewise_client.describe_asset_model(assetModelId=summary["id"])
+                cached = {"lastUpdateDate": str(summary.get("lastUpdateDate")), "id": summary["id"],
+                          "document": {"assetModelName": response["assetModelName"],
+                                       "assetModelExternalId": summary["externalId"],
+                                       "assetModelProperties": [{"name": asset_model_property["name"],
+                                                                 "externalId": asset_model_property.get("externalId"),
+                                                                 "dataType": asset_model_property["dataType"],
+                                                                 "type": asset_model_property.get("type")}
+                                                                for asset_model_property in response["assetModelProperties"]],
+                                       "assetModelHierarchies": [{"name": hierarchy["name"],
+                                                                  "externalId": hierarchy.get("externalId"),
+                                                                  "childAssetModelExternalId": model_external_ids.get(hierarchy["childAssetModelId"])}
+                                                                 for hierarchy in response["assetModelHierarchies"]]}}
+            described["assetModels"][summary["id"]] = cached
+            self.assetModels[summary["externalId"]] = cached
+
+        self.assets = {}
+        for model_id, model_external_id in model_external_ids.items():
+            if not is_managed(model_external_id):
+                continue
+            for summary in paginate(sitewise_client.list_assets, "assetSummaries", assetModelId=model_id):
+                if not is_managed(summary.get("externalId")):
+                    continue
+                cached = self._cached("assets", summary)
+                if cached is None:
+                    cached = self._describe_asset(sitewise_client, summary, model_external_ids)
+                described["assets"][summary["id"]] = cached
+                self.assets[summary["externalId"]] = cached
+        self._described = described
+        self.save()
+        return self
+
+    def _describe_asset(self, sitewise_client, summary, model_external_ids):
+        self.describe_calls += 1
+        response = sitewise_client.describe_asset(assetId=summary["id"])
+        hierarchies = []
+        children = []
+        for hierarchy in response["assetHierarchies"]:
+            for child in paginate(sitewise_client.list_associated_assets, "assetSummaries", assetId=summary["id"],
+                                  hierarchyId=hierarchy["id"], traversalDirection="CHILD"):
+                hierarchies.append({"externalId": hierarchy.get("externalId"), "childAssetExternalId": child.get("externalId")})
+                children.append({"hierarchyId": hierarchy["id"], "childAssetId": child["id"]})
+        return {"lastUpdateDate": str(summary.get("lastUpdateDate")), "id": summary["id"], "children": children,
+                "document": {"assetName": response["assetName"], "assetExternalId": summary["externalId"],
+                             "assetModelExternalId": model_external_ids.get(response["assetModelId"]),
+                             "assetProperties": [{"externalId": asset_property.get("externalId"),
+                                                  "alias": asset_property.get("alias")}
+                                                 for asset_property in response["assetProperties"]],
+                             "assetHierarchies": hierarchies}}
+
+
+class SiteWisePlan:
+    # create/update hold the externalIds written to the reduced bulk, delete the live entities of the
+    # project that are no longer generated. reduced_bulk only holds the delta.
+
+    def __init__(self, project_name: str):
+        self.project_name = project_name
+        self.assetModels = {key: [] for key in PLAN_KEYS}
+        self.assets = {key: [] for key in PLAN_KEYS}
+        self.reduced_bulk = SiteWiseBulk([], [])
+        # live ids and associations of the deleted entities, asset models ordered parents first
+        self.asset_deletions = []
+        self.asset_model_deletions = []
+        # externalIds that exist live, the reduced bulk may reference them
+        self.live_external_ids = {"assetModels": set(), "assets": set()}
+
+    def is_empty(self) -> bool:
+        return all(len(plan[key]) == 0 for plan in (self.assetModels, self.assets) for key in PLAN_KEYS)
+
+    def summary(self):
+        return {"assetModels": {key: len(self.assetModels[key]) for key in PLAN_KEYS},
+                "assets": {key: len(self.assets[key]) for key in PLAN_KEYS}}
+
+    def to_dict(self):
+        return {"project_name": self.project_name, "assetModels": self.assetModels, "assets": self.assets}
+
+
+def plan(bulk_import: SiteWiseBulk, live_state: LiveSiteWiseState, project_name: str) -> SiteWisePlan:
+    # Only entities whose externalId starts with '{project_name}_' are ever deleted.
+    sitewise_plan = SiteWisePlan(project_name)
+    plain_mappings = {}
+    for list_name, external_id_key, normalize, normalize_live, live_entities in (
+            ("assetModels", "assetModelExternalId", normalize_asset_model,
+             lambda live, document: normalize_asset_model(live), live_state.assetModels),
+            ("assets", "assetExternalId", normalize_asset,
+             lambda live, document: normalize_asset(live, {asset_property["externalId"] for asset_property
+                                                           in document.get("assetProperties", [])}),
+             live_state.assets)):
+        entity_plan = getattr(sitewise_plan, list_name)
+        sitewise_plan.live_external_ids[list_name] = set(live_entities)
+        generated_ids = set()
+        for entity in getattr(bulk_import, list_name):
+            document = to_json_value(entity, plain_mappings)
+            external_id = document[external_id_key]
+            generated_ids.add(external_id)
+            live = live_entities.get(external_id)
+            if live is None:
+                entity_plan["create"].append(external_id)
+            elif _normalize_jsonable(normalize(document)) != _normalize_jsonable(normalize_live(live["document"], document)):
+                entity_plan["update"].append(external_id)
+            else:
+                continue
+            getattr(sitewise_plan.reduced_bulk, list_name).append(entity)
+        entity_plan["delete"] = sorted(external_id for external_id in live_entities
+                                       if external_id not in generated_ids and external_id.startswith(f"{project_name}_"))
+
+    parents = {}
+    for live in live_state.assets.values():
+        for child in live["children"]:
+            parents.setdefault(child["childAssetId"], []).append({"assetId": live["id"], "hierarchyId": child["hierarchyId"]})
+    for external_id in sitewise_plan.assets["delete"]:
+        live = live_state.assets[external_id]
+        sitewise_plan.asset_deletions.append({"externalId": external_id, "id": live["id"],
+                                              "parents": parents.get(live["id"], []), "children": live["children"]})
+
+    deleted_models = {external_id: live_state.assetModels[external_id] for external_id in sitewise_plan.assetModels["delete"]}
+    levels = dependency_levels(list(deleted_models), lambda external_id: external_id,
+                                lambda external_id: [hierarchy["childAssetModelExternalId"] for hierarchy in
+                                                     deleted_models[external_id]["document"]["assetModelHierarchies"]],
+                                "assetModels")
+    for external_id in sorted(deleted_models, key=lambda external_id: -levels[external_id]):
+        sitewise_plan.asset_model_deletions.append({"externalId": external_id, "id": deleted_models[external_id]["id"]})
+    return sitewise_plan
+
+
+def wait_for_metadata_transfer_job(twinmaker_client, job_id: str, poll_seconds: float = 20, sleep=time.sleep) -> str:
+    while True:
+        state = twinmaker_client.get_metadata_transfer_job(metadataTransferJobId=job_id)["status"]["state"]
+        print(f"Status: {state}")
+        if state in JOB_FINAL_STATES:
+            return state
+        sleep(poll_seconds)
+
+
+def _wait_until_deleted(describe, not_found_exception, poll_seconds: float, sleep):
+    while True:
+        try:
+            describe()
+        except not_found_exception:
+            return
+        sleep(poll_seconds)
+
+
+def apply(sitewise_plan: SiteWisePlan, sitewise_client, twinmaker_client, s3_client, bucket_name: str, work_dir: Path,
+          prefix: str = "data/", poll_seconds: float = 20, sleep=time.sleep):
+    # 1. validates and imports the reduced bulk with one metadata transfer job (creates and updates)
+    # 2. disassociates and deletes the assets, 3. deletes the asset models, parents first
+    result = {"job_id": None, "job_state": None, "assets_deleted": 0, "asset_models_deleted": 0}
+    bulk = sitewise_plan.reduced_bulk
+    if len(bulk.assetModels) > 0 or len(bulk.assets) > 0:
+        check_bulk(bulk, existing_asset_model_ids=sitewise_plan.live_external_ids["assetModels"],
+                   existing_asset_ids=sitewise_plan.live_external_ids["assets"])
+        Path(work_dir).mkdir(parents=True, exist_ok=True)
+        bulk_file = Path(work_dir, f"{sitewise_plan.project_name}.plan.sitewise.json")
+        bulk.write_to_file(bulk_file)
+        s3_client.upload_file(str(bulk_file), bucket_name, prefix + bulk_file.name)
+        print(f"Uploaded {bulk_file.name} to {bucket_name} with prefix {prefix}")
+        result["job_id"] = f"{sitewise_plan.project_name}_plan_{int(time.time())}"
+        twinmaker_client.create_metadata_transfer_job(
+            metadataTransferJobId=result["job_id"],
+            sources=[{"type": "s3", "s3Configuration": {"location": f"arn:aws:s3:::{bucket_name}/{prefix}{bulk_file.name}"}}],
+            destination={"type": "iotsitewise"})
+        result["job_state"] = wait_for_metadata_transfer_job(twinmaker_client, result["job_id"], poll_seconds, sleep)
+        if result["job_state"] != "COMPLETED":
+            raise RuntimeError(f"metadata transfer job {result['job_id']} ended with {result['job_state']}, nothing deleted")
+
+    not_found = sitewise_client.exceptions.ResourceNotFoundException
+    associations = set()
+    for deletion in sitewise_plan.asset_deletions:
+        associations.update((parent["assetId"], parent["hierarchyId"], deletion["id"]) for parent in deletion["parents"])
+        associations.update((deletion["id"], child["hierarchyId"], child["childAssetId"]) for child in deletion["children"])
+    for asset_id, hierarchy_id, child_asset_id in sorted(associations):
+        sitewise_client.disassociate_assets(assetId=asset_id, hierarchyId=hierarchy_id, childAssetId=child_asset_id)
+    for deletion in sitewise_plan.asset_deletions:
+        sitewise_client.delete_asset(assetId=deletion["id"])
+        print(f"\tRemoved asset: {deletion['externalId']}")
+        result["assets_deleted"] += 1
+    for deletion in sitewise_plan.asset_deletions:
+        _wait_until_deleted(lambda: sitewise_client.describe_asset(assetId=deletion["id"], excludeProperties=True),
+                            not_found, poll_seconds, sleep)
+    for deletion in sitewise_plan.asset_model_deletions:
+        sitewise_client.delete_asset_model(assetModelId=deletion["id"])
+        _wait_until_deleted(lambda: sitewise_client.describe_asset_model(assetModelId=deletion["id"], excludeProperties=True),
+                            not_found, poll_seconds, sleep)
+        print(f"\tRemoved asset model: {deletion['externalId']}")
+        result["asset_models_deleted"] += 1
+    return result
@@ -0,0 +1,233 @@
+import fnmatch
+import json
+import re
+from pathlib import Path
+from s7tia.automationml2sw import device_items
+
+# Deterministic mapping of PLCs and DB entries onto the ISA-95 assets of the 02 notebook (cells below
+# production units) and onto the SFC SiteWise target. Produces the same three documents Bedrock is asked for,
+# only what no rule resolves is left for the LLM.
+#
+# Patterns are globs matched against the whole name, or regular expressions when prefixed with 're:'. Named
+# groups of a regex and {plc}, {db_number}, {entry} can be used in the templates of a rule.
+
+DEFAULT_RULES_FILE = Path(__file__).resolve().parent.joinpath("uns_rules.json")
+# the documents of the 02 notebook, in the output directory of the rules and in the directory of the LLM answer
+ASSETS_SCHEMA_FILE = "genai_sitewise_assets_schema.json"
+HIERARCHY_SCHEMA_FILE = "genai_sitewise_hierarchy_schema.json"
+SFC_TARGET_FILE = "genai_sfc_sitewise_target_conf.json"
+SFC_DATA_PATH = 'sources."{source}".values."{channel}"'
+REGEX_PREFIX = "re:"
+
+
+def compile_pattern(pattern: str):
+    if pattern.startswith(REGEX_PREFIX):
+        return re.compile(pattern[len(REGEX_PREFIX):])
+    return re.compile(fnmatch.translate(pattern))
+
+
+def sfc_data_path(plc_name, db_number, entry_name) -> str:
+    # source and channel names as written by s7tia2sfc
+    return SFC_DATA_PATH.format(source=plc_name, channel=f"{db_number}_{entry_name}")
+
+
+class CellRule:
+    __slots__ = ("plc", "asset_name", "asset_external_id", "asset_model_external_id", "parent")
+
+    def __init__(self, rule: dict, defaults: dict):
+        self.plc = compile_pattern(rule["plc"])
+        self.asset_name = rule.get("assetName", defaults.get("assetName", "{plc}"))
+        self.asset_external_id = rule.get("assetExternalId", defaults.get("assetExternalId", "eID_{plc}"))
+        self.asset_model_external_id = rule.get("assetModelExternalId", defaults.get("assetModelExternalId"))
+        self.parent = rule.get("parent", defaults.get("parent"))
+
+    def match(self, plc_name: str):
+        # None, or the cell asset of the PLC
+        match = self.plc.fullmatch(plc_name)
+        if match is None:
+            return None
+        fields = dict(match.groupdict(), plc=plc_name)
+        return {"assetExternalId": self.asset_external_id.format(**fields),
+                "assetName": self.asset_name.format(**fields),
+                "assetModelExternalId": self.asset_model_external_id.format(**fields),
+                "parent": self.parent.format(**fields) if self.parent else None}
+
+
+class PropertyRule:
+    __slots__ = ("entry", "db", "property_name")
+
+    def __init__(self, rule: dict):
+        self.entry = compile_pattern(rule["entry"])
+        self.db = compile_pattern(str(rule.get("db", "*")))
+        self.property_name = rule["propertyName"]
+
+    def match(self, db_number: str, entry_name: str):
+        match = self.entry.fullmatch(entry_name)
+        if match is None or self.db.fullmatch(db_number) is None:
+            return None
+        return self.property_name.format(**dict(match.groupdict(), db_number=db_number, entry=entry_name))
+
+
+class UnsRules:
+    # rules are tried in file order, the first matching rule wins
+
+    def __init__(self, rules: dict):
+        defaults = rules.get("cellDefaults", {})
+        self.cells = [CellRule(rule, defaults) for rule in rules.get("cells", [])]
+        self.units = {unit["assetExternalId"]: unit for unit in rules.get("units", [])}
+        self.properties = [PropertyRule(rule) for rule in rules.get("properties", [])]
+        # property names every cell asset is expected to have, defaults to all targets of the property rules
+        self.property_names = list(rules.get("propertyNames", dict.fromkeys(
+            rule["propertyName"] for rule in rules.get("properties", []))))
+        # entry names repeat across PLCs, every (db_number, entry) is resolved once
+        self._property_cache = {}
+
+    @classmethod
+    def from_file(cls, rules_file=DEFAULT_RULES_FILE):
+        with open(rules_file, "r") as json_file:
+            return cls(json.load(json_file))
+
+    def cell(self, plc_name: str):
+        for rule in self.cells:
+            cell = rule.match(plc_name)
+            if cell is not None:
+                return cell
+        return None
+
+    def property_name(self, db_number, entry_name: str):
+        key = (str(db_number), entry_name)
+        if key not in self._property_cache:
+            self._property_cache[key] = next(
+                (name for name in (rule.match(*key) for rule in self.properties) if name is not None), None)
+        return self._property_cache[key]
+
+
+class UnsMapping:
+    # result of map_devices, assets_schema/hierarchy_schema/sfc_target are the documents of the 02 notebook
+
+    def __init__(self, region: str, units: dict):
+        self.region = region
+        # unit definitions of the rules, only units with at least one cell end up in the hierarchy
+        self.unit_definitions = units
+        self.cells = []
+        self.units = {}
+        self.sfc_assets = []
+        self.unmatched_plcs = []
+        self.missing_properties = {}
+        # SFC DataPaths the LLM may still pick from, per PLC
+        self.unmatched_data_paths = {}
+
+    def assets_schema(self) -> dict:
+        return {"assetModels": [], "assets": [{"assetExternalId": cell["assetExternalId"], "assetName": cell["assetName"],
+                                               "assetModelExternalId": cell["assetModelExternalId"]}
+                                              for cell in self.cells]}
+
+    def hierarchy_schema(self) -> dict:
+        assets = []
+        for unit_external_id, children in self.units.items():
+            unit = self.unit_definitions[unit_external_id]
+            assets.append({"assetExternalId": unit_external_id, "assetName": unit["assetName"],
+                           "assetModelExternalId": unit["assetModelExternalId"],
+                           "assetHierarchies": [{"externalId": unit["hierarchyExternalId"], "childAssetExternalId": child}
+                                                for child in children]})
+        return {"assetModels": [], "assets": assets}
+
+    def sfc_target(self) -> dict:
+        return {"Assets": self.sfc_assets, "Region": self.region, "TargetType": "AWS-SITEWISE"}
+
+    def unmatched(self) -> dict:
+        return {"plcs": self.unmatched_plcs, "missingProperties": self.missing_properties,
+                "dataPaths": self.unmatched_data_paths}
+
+    def is_complete(self) -> bool:
+        return len(self.unmatched_plcs) == 0 and len(self.missing_properties) == 0
+
+    def llm_context(self, tia_meta_data: str) -> str:
+        # the lines of tia_portal_meta.txt ('<PLC>: <comment>') of the PLCs no rule resolved completely
+        plc_names = set(self.unmatched_plcs)
+        plc_names.update(cell["plc"] for cell in self.cells if cell["assetExternalId"] in self.missing_properties)
+        return "\n".join(line for line in tia_meta_data.splitlines() if line.partition(":")[0].strip() in plc_names)
+
+
+def map_devices(device_and_db_info, rules: UnsRules, region: str) -> UnsMapping:
+    mapping = UnsMapping(region, rules.units)
+    for plc_name, plc_info in device_items(device_and_db_info):
+        cell = rules.cell(plc_name)
+        data_paths = {}
+        for db_number, db_entries in plc_info["entries"].items():
+            for entry in db_entries:
+                data_path = sfc_data_path(plc_name, db_number, entry["name"])
+                property_name = rules.property_name(db_number, entry["name"]) if cell is not None else None
+                if property_name is None:
+                    mapping.unmatched_data_paths.setdefault(plc_name, []).append(data_path)
+                else:
+                    # a property is fed by the first entry mapped onto it
+                    data_paths.setdefault(property_name, data_path)
+        if cell is None:
+            mapping.unmatched_plcs.append(plc_name)
+            continue
+        cell["plc"] = plc_name
+        mapping.cells.append(cell)
+        if cell["parent"] is not None:
+            if cell["parent"] not in rules.units:
+                raise ValueError(f"PLC {plc_name}: parent '{cell['parent']}' is not one of the units of the rules")
+            mapping.units.setdefault(cell["parent"], []).append(cell["assetExternalId"])
+        mapping.sfc_assets.append({"AssetExternalId": cell["assetExternalId"],
+                                   "Properties": [{"DataPath": data_path, "PropertyName": property_name}
+                                                  for property_name, data_path in data_paths.items()]})
+        missing = [property_name for property_name in rules.property_names if property_name not in data_paths]
+        if len(missing) > 0:
+            mapping.missing_properties[cell["assetExternalId"]] = missing
+        elif plc_name in mapping.unmatched_data_paths:
+            # nothing is asked for that PLC anymore, its remaining entries are not candidates
+            del mapping.unmatched_data_paths[plc_name]
+    return mapping
+
+
+def merge_assets_schema(rule_schema: dict, llm_schema: dict) -> dict:
+    # the LLM only adds assets the rules did not produce, hierarchies of a unit are joined
+    merged = {"assetModels": rule_schema.get("assetModels", []), "assets": []}
+    assets = {}
+    for asset in rule_schema["assets"] + llm_schema.get("assets", []):
+        existing = assets.get(asset["assetExternalId"])
+        if existing is None:
+            assets[asset["assetExternalId"]] = dict(asset)
+            merged["assets"].append(assets[asset["assetExternalId"]])
+        elif "assetHierarchies" in asset:
+            hierarchies = existing.setdefault("assetHierarchies", [])
+            hierarchies.extend(hierarchy for hierarchy in asset["assetHierarchies"] if hierarchy not in hierarchies)
+    return merged
+
+
+def merge_sfc_target(rule_target: dict, llm_target: dict) -> dict:
+    # properties of the rules win over the ones the LLM mapped for the same asset
+    merged = dict(rule_target, Assets=[])
+    assets = {}
+    for asset in rule_target["Assets"] + llm_target.get("Assets", []):
+        existing = assets.get(asset["AssetExternalId"])
+        if existing is None:
+            assets[asset["AssetExternalId"]] = {"AssetExternalId": asset["AssetExternalId"],
+                                                "Properties": list(asset.get("Properties", []))}
+            merged["Assets"].append(assets[asset["AssetExternalId"]])
+            continue
+        mapped = {prop["PropertyName"] for prop in existing["Properties"]}
+        existing["Properties"].extend(prop for prop in asset.get("Properties", []) if prop["PropertyName"] not in mapped)
+    return merged
+
+
+def read_llm_document(llm_dir: Path, file_name: str) -> dict:
+    # a document the LLM was not asked for (e.g. no unit was unmatched) adds nothing
+    path = Path(llm_dir, file_name)
+    if not path.is_file():
+        return {}
+    with open(path, "r", encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def merge_llm_answer(mapping: UnsMapping, llm_dir: Path) -> dict:
+    # {file name: document} of the rule result completed by the answer the 02 notebook wrote to llm_dir
+    return {ASSETS_SCHEMA_FILE: merge_assets_schema(mapping.assets_schema(),
+                                                    read_llm_document(llm_dir, ASSETS_SCHEMA_FILE)),
+            HIERARCHY_SCHEMA_FILE: merge_assets_schema(mapping.hierarchy_schema(),
+                                                       read_llm_document(llm_dir, HIERARCHY_SCHEMA_FILE)),
+            SFC_TARGET_FILE: merge_sfc_target(mapping.sfc_target(), read_llm_document(llm_dir, SFC_TARGET_FILE))}
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the scripts import their packages (s7tia, sitewise, sfc) relative to the scripts directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,156 @@
+import importlib
+import json
+import sys
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+import pytest
+from s7tia.block_export import (MANIFEST_FILE_NAME, BlockExportFilter, BlockInfo, ExportManifest, FakeBlockSource,
+                                export_blocks)
+
+# export_blocks is what tia_openness_export.export_selected_blocks_from_all_plcs runs on the Openness source,
+# FakeBlockSource stands in for TIA Portal
+
+
+def plc_blocks():
+    return {
+        "PLC_1": [BlockInfo("Line_DB_SW", "GlobalDB", 10, "2024-01-01T00:00:00", ("Line",)),
+                  BlockInfo("Motor_DB_SW", "GlobalDB", 11, "2024-01-01T00:00:00"),
+                  BlockInfo("Motor_DB", "GlobalDB", 12, "2024-01-01T00:00:00"),
+                  BlockInfo("Main_DB_SW", "FB", 1, "2024-01-01T00:00:00")],
+        "PLC_2": [BlockInfo("Press_DB_SW", "GlobalDB", 20, "2024-01-01T00:00:00")],
+    }
+
+
+def test_default_filter_matches_sw_global_dbs_only():
+    block_filter = BlockExportFilter()
+    matches = {block.name: block_filter.matches(block) for block in plc_blocks()["PLC_1"]}
+    assert matches == {"Line_DB_SW": True, "Motor_DB_SW": True, "Motor_DB": False, "Main_DB_SW": False}
+
+
+def test_filter_none_matches_everything():
+    block_filter = BlockExportFilter(name_patterns=None, block_types=None)
+    assert all(block_filter.matches(block) for block in plc_blocks()["PLC_1"])
+
+
+def test_export_writes_matching_blocks_and_manifest(tmp_path):
+    source = FakeBlockSource(plc_blocks())
+    summary = export_blocks(source, tmp_path)
+
+    assert (summary.exported, summary.skipped_filtered, summary.skipped_unchanged, summary.failed) == (3, 2, 0, 0)
+    assert sorted(source.exported) == [("PLC_1", "Line_DB_SW"), ("PLC_1", "Motor_DB_SW"), ("PLC_2", "Press_DB_SW")]
+    assert tmp_path.joinpath("PLC_1", "Line", "Line_DB_SW.xml").is_file()
+    manifest = json.loads(tmp_path.joinpath(MANIFEST_FILE_NAME).read_text())
+    assert manifest["PLC_1/Line/Line_DB_SW"]["number"] == 10
+    assert "exported 3, skipped 0 unchanged and 2 filtered, failed 0" in str(summary)
+
+
+def test_second_export_skips_unchanged_blocks(tmp_path):
+    blocks = plc_blocks()
+    export_blocks(FakeBlockSource(blocks), tmp_path)
+    blocks["PLC_2"][0].modified = "2024-02-01T00:00:00"
+
+    source = FakeBlockSource(blocks)
+    summary = export_blocks(source, tmp_path)
+    assert (summary.exported, summary.skipped_unchanged) == (1, 2)
+    assert source.exported == [("PLC_2", "Press_DB_SW")]
+
+
+def test_deleted_export_file_is_exported_again(tmp_path):
+    export_blocks(FakeBlockSource(plc_blocks()), tmp_path)
+    tmp_path.joinpath("PLC_1", "Motor_DB_SW.xml").unlink()
+
+    source = FakeBlockSource(plc_blocks())
+    summary = export_blocks(source, tmp_path)
+    assert source.exported == [("PLC_1", "Motor_DB_SW")]
+    assert summary.skipped_unchanged == 2
+
+
+def test_force_exports_unchanged_blocks(tmp_path):
+    export_blocks(FakeBlockSource(plc_blocks()), tmp_path)
+    summary = export_blocks(FakeBlockSource(plc_blocks()), tmp_path, force=True)
+    assert (summary.exported, summary.skipped_unchanged) == (3, 0)
+
+
+def test_failed_export_is_counted_and_not_recorded(tmp_path):
+    class FailingSource(FakeBlockSource):
+        def export_block(self, plc_name, block, file_path):
+            if block.name == "Motor_DB_SW":
+                raise RuntimeError("block is not compiled")
+            super().export_block(plc_name, block, file_path)
+
+    summary = export_blocks(FailingSource(plc_blocks()), tmp_path)
+    assert (summary.exported, summary.failed) == (2, 1)
+    manifest = ExportManifest(tmp_path.joinpath(MANIFEST_FILE_NAME))
+    assert "PLC_1/Motor_DB_SW" not in manifest.blocks
+
+
+class FakeTiaBlock:
+    # Openness block, GetType().Name is the block type
+
+    def __init__(self, name, block_type, number, modified):
+        self.Name = name
+        self.Number = number
+        self.ModifiedDate = modified
+        self.block_type = SimpleNamespace(Name=block_type)
+
+    def GetType(self):
+        return self.block_type
+
+    def Export(self, file_info, options):
+        Path(file_info).write_text(f"<Document><Name>{self.Name}</Name></Document>")
+
+
+class FakeTiaBlockGroup:
+
+    def __init__(self, name, blocks=(), groups=()):
+        self.Name = name
+        self.Blocks = list(blocks)
+        self.Groups = list(groups)
+
+
+class FakeTiaDevice:
+
+    def __init__(self, name, block_group, type_identifier="System:Device.S71500"):
+        software = SimpleNamespace(Software=SimpleNamespace(BlockGroup=block_group))
+        self.Name = name
+        self.TypeIdentifier = type_identifier
+        # DeviceItems[1] is the CPU, GetService[SoftwareContainer]() its software container
+        self.DeviceItems = [None, SimpleNamespace(GetService={"SoftwareContainer": lambda: software})]
+
+
+@pytest.fixture
+def tia_openness_export(monkeypatch):
+    # imports tia_openness_export with the .NET modules of TIA Portal stubbed
+    engineering = ModuleType("Siemens.Engineering")
+    engineering.ExportOptions = SimpleNamespace(WithReadOnly="WithReadOnly")
+    engineering.EngineeringTargetInvocationException = type("EngineeringTargetInvocationException", (Exception,), {})
+    engineering.IEngineeringServiceProvider = lambda device_item: device_item
+    modules = {"clr": SimpleNamespace(AddReference=lambda path: None),
+               "System": ModuleType("System"),
+               "System.IO": SimpleNamespace(DirectoryInfo=str, FileInfo=str),
+               "Siemens": ModuleType("Siemens"),
+               "Siemens.Engineering": engineering,
+               "Siemens.Engineering.HW": ModuleType("Siemens.Engineering.HW"),
+               "Siemens.Engineering.HW.Features": SimpleNamespace(SoftwareContainer="SoftwareContainer"),
+               "Siemens.Engineering.Cax": SimpleNamespace(CaxProvider=None)}
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "s7tia.tia_openness_export", raising=False)
+    return importlib.import_module("s7tia.tia_openness_export")
+
+
+def test_export_selected_blocks_from_openness_project(tia_openness_export, tmp_path):
+    line = FakeTiaBlockGroup("Line", [FakeTiaBlock("Line_DB_SW", "GlobalDB", 10, "2024-01-01")])
+    program = FakeTiaBlockGroup("Program blocks", [FakeTiaBlock("Motor_DB_SW", "GlobalDB", 11, "2024-01-01"),
+                                                   FakeTiaBlock("Main", "OB", 1, "2024-01-01")], [line])
+    project = SimpleNamespace(Devices=[FakeTiaDevice("PLC_1", program),
+                                       FakeTiaDevice("HMI_1", None, "System:Device.HMI")])
+
+    summary = tia_openness_export.export_selected_blocks_from_all_plcs(tmp_path, project)
+    assert (summary.exported, summary.skipped_filtered, summary.skipped_unchanged) == (2, 1, 0)
+    assert tmp_path.joinpath("PLC_1", "Line", "Line_DB_SW.xml").is_file()
+
+    summary = tia_openness_export.export_selected_blocks_from_all_plcs(tmp_path, project)
+    assert (summary.exported, summary.skipped_unchanged) == (0, 2)
+    summary = tia_openness_export.export_selected_blocks_from_all_plcs(tmp_path, project, force=True)
+    assert summary.exported == 2
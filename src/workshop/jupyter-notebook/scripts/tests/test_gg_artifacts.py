@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import boto3
+import botocore
+import pytest
+from botocore.stub import Stubber
+from sfc import s7tia2sfc
+from sfc.gg_artifacts import ArtifactStore
+from sfc.sfc_package import PACKAGE_ZIP_NAME
+
+CONTENT = b"sfc config"
+DIGEST = base64.b64encode(hashlib.sha256(CONTENT).digest()).decode("ascii")
+KEY = f"sfc/{hashlib.sha256(CONTENT).hexdigest()}/{PACKAGE_ZIP_NAME}"
+
+
+@pytest.fixture
+def s3_client():
+    # a real client, Stubber answers every call without a network round trip
+    return boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+
+
+def test_first_publish_uploads_with_checksum(s3_client):
+    with Stubber(s3_client) as stubber:
+        stubber.add_client_error("head_object", service_error_code="404", http_status_code=404,
+                                 expected_params={"Bucket": "bucket", "Key": KEY})
+        stubber.add_response("put_object", {}, {"Bucket": "bucket", "Key": KEY, "Body": CONTENT,
+                                                "ChecksumSHA256": DIGEST})
+        store = ArtifactStore("bucket", "sfc", s3_client=s3_client)
+        artifact = store.publish(PACKAGE_ZIP_NAME, CONTENT)
+        stubber.assert_no_pending_responses()
+    assert store.uploaded == [KEY] and store.unchanged == []
+    assert artifact["Uri"] == f"s3://bucket/{KEY}"
+    assert (artifact["Digest"], artifact["Algorithm"]) == (DIGEST, "SHA-256")
+
+
+def test_publish_of_existing_content_does_not_upload(s3_client):
+    with Stubber(s3_client) as stubber:
+        stubber.add_response("head_object", {}, {"Bucket": "bucket", "Key": KEY})
+        store = ArtifactStore("bucket", "sfc", s3_client=s3_client)
+        store.publish(PACKAGE_ZIP_NAME, CONTENT)
+        # a put_object call would fail the stubber
+        stubber.assert_no_pending_responses()
+    assert store.uploaded == [] and store.unchanged == [KEY]
+
+
+def test_forbidden_head_object_raises(s3_client):
+    with Stubber(s3_client) as stubber:
+        stubber.add_client_error("head_object", service_error_code="403", http_status_code=403)
+        store = ArtifactStore("bucket", "sfc", s3_client=s3_client)
+        with pytest.raises(botocore.exceptions.ClientError):
+            store.publish(PACKAGE_ZIP_NAME, CONTENT)
+    assert store.uploaded == []
+
+
+class FakeS3:
+    # in-memory S3 stand-in with the two calls ArtifactStore makes
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise botocore.exceptions.ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {}
+
+    def put_object(self, Bucket, Key, Body, ChecksumSHA256):
+        assert base64.b64encode(hashlib.sha256(Body).digest()).decode("ascii") == ChecksumSHA256
+        self.objects[(Bucket, Key)] = Body
+        return {}
+
+
+def test_recipe_references_the_published_artifacts(tmp_path):
+    tmp_path.joinpath(PACKAGE_ZIP_NAME).write_bytes(CONTENT)
+    s3 = FakeS3()
+    store = ArtifactStore("bucket", "sfc", s3_client=s3)
+    recipe, configuration_update = s7tia2sfc.createSFCGreengrassComponent("1.5.4", "1.0.0", tmp_path, store)
+
+    artifacts = {artifact["Uri"].rsplit("/", 1)[1]: artifact for artifact in recipe["Manifests"][0]["Artifacts"]}
+    assert artifacts[PACKAGE_ZIP_NAME]["Uri"] == f"s3://bucket/{KEY}"
+    assert artifacts[PACKAGE_ZIP_NAME]["Digest"] == DIGEST
+    installer = s3.objects[("bucket", artifacts["sfc-standalone-install.sh"]["Uri"][len("s3://bucket/"):])]
+    assert artifacts["sfc-standalone-install.sh"]["Digest"] == base64.b64encode(hashlib.sha256(installer).digest()).decode("ascii")
+    assert recipe["ComponentVersion"] == "1.0.0"
+    # the deployment carries no inline payload
+    assert configuration_update == {"reset": [""]}
+
+    # same package again: nothing uploaded, same recipe
+    store = ArtifactStore("bucket", "sfc", s3_client=s3)
+    assert s7tia2sfc.createSFCGreengrassComponent("1.5.4", "1.0.0", tmp_path, store)[0] == recipe
+    assert store.uploaded == [] and len(store.unchanged) == 2
@@ -0,0 +1,270 @@
+import itertools
+import json
+import botocore
+import pytest
+from sfc import gg_rollout
+from sfc.gg_artifacts import ArtifactStore
+from sfc.gg_rollout import RateLimiter, Rollout, RolloutTarget
+from sfc.sfc_package import SfcPackage
+
+ACCOUNT_ARN = "arn:aws:iot:us-east-1:123456789012"
+
+
+def client_error(code, operation):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class StubGreengrass:
+    # in-memory greengrassv2 stand-in with the calls Rollout makes, list calls return one item per page
+
+    def __init__(self, device_states=None):
+        self.deployments = {}
+        self.recipes = {}
+        self.created = []
+        self.ids = itertools.count()
+        # {thing name: [coreDeviceExecutionStatus of consecutive polls]}, the last one stays
+        self.device_states = device_states or {}
+        self.list_pages = 0
+
+    def add_deployment(self, target_arn, name, status="COMPLETED", components=None):
+        deployment_id = f"d-{next(self.ids)}"
+        self.deployments[target_arn] = {"deploymentId": deployment_id, "targetArn": target_arn,
+                                        "deploymentName": name, "deploymentStatus": status,
+                                        "components": components or {}}
+        return deployment_id
+
+    def list_deployments(self, historyFilter, maxResults, nextToken=None):
+        self.list_pages += 1
+        deployments = sorted(self.deployments.values(), key=lambda deployment: deployment["deploymentId"])
+        start = int(nextToken or 0)
+        page = {"deployments": [{key: value for key, value in deployment.items() if key != "components"}
+                                for deployment in deployments[start:start + 1]]}
+        if start + 1 < len(deployments):
+            page["nextToken"] = str(start + 1)
+        return page
+
+    def get_deployment(self, deploymentId):
+        deployment = next(deployment for deployment in self.deployments.values()
+                          if deployment["deploymentId"] == deploymentId)
+        return dict(deployment, revisionId="1")
+
+    def create_component_version(self, inlineRecipe):
+        recipe = json.loads(inlineRecipe)
+        key = (recipe["ComponentName"], recipe["ComponentVersion"])
+        if key in self.recipes:
+            raise client_error("ConflictException", "CreateComponentVersion")
+        self.recipes[key] = recipe
+        return {}
+
+    def get_component(self, arn, recipeOutputFormat):
+        parts = arn.split(":")
+        return {"recipe": json.dumps(self.recipes[(parts[6], parts[8])]).encode("utf-8")}
+
+    def list_component_versions(self, arn, nextToken=None):
+        name = arn.split(":")[6]
+        versions = [version for component, version in sorted(self.recipes) if component == name]
+        start = int(nextToken or 0)
+        page = {"componentVersions": [{"componentVersion": version} for version in versions[start:start + 1]]}
+        if start + 1 < len(versions):
+            page["nextToken"] = str(start + 1)
+        return page
+
+    def create_deployment(self, targetArn, deploymentName, tags, components, **document):
+        deployment_id = self.add_deployment(targetArn, deploymentName, "ACTIVE", components)
+        self.created.append(targetArn)
+        return {"deploymentId": deployment_id, "iotJobId": f"job-{deployment_id}"}
+
+    def list_effective_deployments(self, coreDeviceThingName, nextToken=None):
+        # an unrelated deployment on the first page, the rollout's one on the second
+        if nextToken is None:
+            return {"effectiveDeployments": [{"deploymentId": "other", "coreDeviceExecutionStatus": "SUCCEEDED"}],
+                    "nextToken": "1"}
+        states = self.device_states.get(coreDeviceThingName, ["SUCCEEDED"])
+        state = states.pop(0) if len(states) > 1 else states[0]
+        deployment = self.deployments[f"{ACCOUNT_ARN}:thing/{coreDeviceThingName}"]
+        return {"effectiveDeployments": [{"deploymentId": deployment["deploymentId"],
+                                          "coreDeviceExecutionStatus": state, "reason": state.lower()}]}
+
+
+class FakeS3:
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise client_error("404", "HeadObject")
+
+    def put_object(self, Bucket, Key, Body, ChecksumSHA256):
+        self.objects[(Bucket, Key)] = Body
+
+
+def write_package(package_dir, port=4840):
+    package = SfcPackage()
+    package.add_json("sfc_config_generated.json", {"Sources": {"PLC": {"Port": port}}})
+    package.write(package_dir)
+    package.write_manifest(package_dir)
+
+
+def rollout_targets(tmp_path, names):
+    targets = []
+    for name in names:
+        if name != "missing":
+            write_package(tmp_path / name)
+        targets.append(RolloutTarget({"name": name, "targetArn": f"{ACCOUNT_ARN}:thing/{name}",
+                                      "package": str(tmp_path / name)}))
+    return targets
+
+
+def rollout(targets, client, **options):
+    return Rollout(targets, client, "1.5.4", "1.0.0", "us-east-1", rate=None, **options)
+
+
+def test_latest_deployments_follows_next_token():
+    client = StubGreengrass()
+    for index in range(3):
+        client.add_deployment(f"{ACCOUNT_ARN}:thing/gw{index}", f"sfc-gw{index}")
+    latest = rollout([], client).latest_deployments()
+    assert sorted(latest) == [f"{ACCOUNT_ARN}:thing/gw{index}" for index in range(3)]
+    assert client.list_pages == 3
+
+
+def test_unchanged_config_is_skipped_unless_forced(tmp_path):
+    client = StubGreengrass()
+    rollout(rollout_targets(tmp_path, ["gw0", "gw1"]), client).run()
+    assert len(client.created) == 2
+
+    targets = rollout_targets(tmp_path, ["gw0", "gw1"])
+    write_package(tmp_path / "gw1", port=4841)
+    again = rollout(targets, client)
+    again.run()
+    assert again.summary() == {"DEPLOYED": 1, "SKIPPED": 1}
+    assert client.created[2:] == [f"{ACCOUNT_ARN}:thing/gw1"]
+
+    forced = rollout(rollout_targets(tmp_path, ["gw0", "gw1"]), client, force=True)
+    forced.run()
+    assert forced.summary() == {"DEPLOYED": 2}
+
+
+def test_failing_target_does_not_stop_the_others(tmp_path):
+    client = StubGreengrass()
+    client.add_deployment(f"{ACCOUNT_ARN}:thing/gw0", "nucleus", components={"aws.greengrass.Nucleus": {}})
+    targets = rollout_targets(tmp_path, ["gw0", "missing", "gw1"])
+    lines = []
+    rollout(targets, client, workers=2, progress=lines.append).run()
+    assert [target.state for target in targets] == ["DEPLOYED", "FAILED", "DEPLOYED"]
+    assert "no SFC package" in targets[1].detail
+    # the other components of the current deployment stay deployed
+    assert "aws.greengrass.Nucleus" in client.deployments[f"{ACCOUNT_ARN}:thing/gw0"]["components"]
+    assert lines[-1] == "DEPLOYED: 2  FAILED: 1"
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_rate_limiter_spaces_calls(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(gg_rollout, "time", clock)
+    limiter = RateLimiter(4.0)
+    for _ in range(3):
+        limiter.wait()
+    assert clock.sleeps == [0.0, 0.25, 0.25]
+    clock.now += 1.0
+    limiter.wait()
+    assert clock.sleeps[-1] == 0.0
+    unlimited = RateLimiter(None)
+    unlimited.wait()
+    assert clock.sleeps[-1] == 0.0
+
+
+def test_track_moves_states_from_effective_deployments(tmp_path):
+    client = StubGreengrass({"gw0": ["IN_PROGRESS", "SUCCEEDED"], "gw1": ["QUEUED", "IN_PROGRESS", "FAILED"]})
+    targets = rollout_targets(tmp_path, ["gw0", "gw1"])
+    group = RolloutTarget({"name": "line", "targetArn": f"{ACCOUNT_ARN}:thinggroup/Line",
+                           "package": str(tmp_path / "gw0")})
+    lines = []
+    tracked = rollout(targets + [group], client, progress=lines.append)
+    tracked.run()
+    assert tracked.track(timeout=5, poll_seconds=0)
+    assert [target.state for target in targets] == ["SUCCEEDED", "FAILED"]
+    assert targets[1].detail == "failed"
+    # thing groups are tracked by their IoT job
+    assert group.state == "DEPLOYED"
+    assert lines[-3:] == ["DEPLOYED: 1  IN_PROGRESS: 1  QUEUED: 1", "DEPLOYED: 1  IN_PROGRESS: 1  SUCCEEDED: 1",
+                          "DEPLOYED: 1  FAILED: 1  SUCCEEDED: 1"]
+
+
+def test_track_gives_up_after_timeout(tmp_path):
+    client = StubGreengrass({"gw0": ["IN_PROGRESS"]})
+    targets = rollout_targets(tmp_path, ["gw0"])
+    tracked = rollout(targets, client)
+    tracked.run()
+    assert not tracked.track(timeout=0, poll_seconds=0)
+    assert targets[0].state == "IN_PROGRESS"
+
+
+def test_register_accepts_conflict_with_same_artifacts(tmp_path):
+    client = StubGreengrass()
+    store = ArtifactStore("bucket", "sfc", s3_client=FakeS3())
+    first = rollout(rollout_targets(tmp_path, ["gw0"]), client, artifact_store=store)
+    first.run()
+    targets = rollout_targets(tmp_path, ["gw0"])
+    rollout(targets, client, artifact_store=store, force=True).run()
+    assert targets[0].state == "DEPLOYED" and targets[0].component_version == "1.0.0"
+    assert len(client.recipes) == 1
+
+
+def test_register_bumps_the_version_of_a_changed_package(tmp_path):
+    client = StubGreengrass()
+    store = ArtifactStore("bucket", "sfc", s3_client=FakeS3())
+    rollout(rollout_targets(tmp_path, ["gw0", "gw1"]), client, artifact_store=store).run()
+
+    for port in (4841, 4842):
+        targets = rollout_targets(tmp_path, ["gw0", "gw1"])
+        write_package(tmp_path / "gw1", port=port)
+        rollout(targets, client, artifact_store=store).run()
+        assert [target.state for target in targets] == ["SKIPPED", "DEPLOYED"]
+    component = "custom.aws.sfc.runtime.with.config.gw1"
+    assert targets[1].component_version == "1.0.2"
+    assert sorted(version for name, version in client.recipes if name == component) == ["1.0.0", "1.0.1", "1.0.2"]
+    deployed = client.deployments[f"{ACCOUNT_ARN}:thing/gw1"]["components"][component]
+    assert deployed["componentVersion"] == "1.0.2"
+    assert sorted(version for name, version in client.recipes if name.endswith(".gw0")) == ["1.0.0"]
+
+    # a retry of the latest package reuses its bumped version
+    retry = [RolloutTarget({"name": "gw1", "targetArn": f"{ACCOUNT_ARN}:thing/gw1", "package": str(tmp_path / "gw1")})]
+    rollout(retry, client, artifact_store=store, force=True).run()
+    assert retry[0].component_version == "1.0.2"
+
+
+def test_register_error_fails_the_target(tmp_path):
+    class DeniedGreengrass(StubGreengrass):
+        def create_component_version(self, inlineRecipe):
+            raise client_error("AccessDeniedException", "CreateComponentVersion")
+
+    client = DeniedGreengrass()
+    targets = rollout_targets(tmp_path, ["gw0"])
+    rollout(targets, client).run()
+    assert targets[0].state == "FAILED" and "AccessDenied" in targets[0].detail
+    assert client.created == []
+
+
+def test_report_lists_every_target(tmp_path):
+    targets = rollout_targets(tmp_path, ["gw0", "missing"])
+    report = rollout(targets, StubGreengrass())
+    report.run()
+    assert report.report()["summary"] == {"DEPLOYED": 1, "FAILED": 1}
+    assert report.report()["targets"]["gw0"]["componentVersion"] == "1.0.0"
+    with pytest.raises(FileNotFoundError):
+        report.config_hash(targets[1])
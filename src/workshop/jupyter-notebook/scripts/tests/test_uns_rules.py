@@ -0,0 +1,67 @@
+import json
+from sitewise.uns_rules import (ASSETS_SCHEMA_FILE, HIERARCHY_SCHEMA_FILE, SFC_TARGET_FILE, UnsRules, map_devices,
+                                merge_llm_answer)
+
+RULES = {
+    "cellDefaults": {"assetExternalId": "eID_{plc}", "assetModelExternalId": "eID_General_Cell"},
+    "cells": [{"plc": "re:\\d+_PRSH_X\\d+", "assetName": "Press Shop Cell", "parent": "eID_Forming_Unit"}],
+    "units": [{"assetExternalId": "eID_Forming_Unit", "assetName": "Forming Unit",
+               "assetModelExternalId": "eID_Production_Unit", "hierarchyExternalId": "eID_Production-Cell"}],
+    "properties": [{"db": "13", "entry": "Seq_No", "propertyName": "Current_Step"},
+                   {"db": "13", "entry": "VIN", "propertyName": "VIN"}],
+}
+
+
+def device(*entry_names):
+    return {"entries": {"13": [{"name": name} for name in entry_names]}}
+
+
+def write_json(data, path):
+    path.write_text(json.dumps(data))
+
+
+def test_rules_leave_unknown_plcs_and_entries_to_the_llm():
+    mapping = map_devices({"01_PRSH_X1": device("Seq_No", "Serial"), "07_PAINT": device("Seq_No")},
+                          UnsRules(RULES), "us-east-1")
+    assert [cell["assetExternalId"] for cell in mapping.cells] == ["eID_01_PRSH_X1"]
+    assert mapping.unmatched_plcs == ["07_PAINT"]
+    assert mapping.missing_properties == {"eID_01_PRSH_X1": ["VIN"]}
+    assert not mapping.is_complete()
+
+
+def test_merge_llm_answer_fills_the_gaps_of_the_rules(tmp_path):
+    mapping = map_devices({"01_PRSH_X1": device("Seq_No", "Serial"), "07_PAINT": device("Seq_No")},
+                          UnsRules(RULES), "us-east-1")
+    write_json({"assets": [{"assetExternalId": "eID_07_PAINT", "assetName": "Paint Shop Cell",
+                            "assetModelExternalId": "eID_General_Cell"}]}, tmp_path / ASSETS_SCHEMA_FILE)
+    write_json({"assets": [{"assetExternalId": "eID_Forming_Unit", "assetName": "Forming Unit",
+                            "assetModelExternalId": "eID_Production_Unit",
+                            "assetHierarchies": [{"externalId": "eID_Production-Cell",
+                                                  "childAssetExternalId": "eID_07_PAINT"}]}]},
+               tmp_path / HIERARCHY_SCHEMA_FILE)
+    write_json({"Assets": [{"AssetExternalId": "eID_01_PRSH_X1", "Properties": [
+                    {"PropertyName": "Current_Step", "DataPath": "llm"},
+                    {"PropertyName": "VIN", "DataPath": 'sources."01_PRSH_X1".values."13_Serial"'}]},
+                {"AssetExternalId": "eID_07_PAINT", "Properties": [
+                    {"PropertyName": "Current_Step", "DataPath": 'sources."07_PAINT".values."13_Seq_No"'}]}]},
+               tmp_path / SFC_TARGET_FILE)
+
+    merged = merge_llm_answer(mapping, tmp_path)
+    assert [asset["assetExternalId"] for asset in merged[ASSETS_SCHEMA_FILE]["assets"]] == ["eID_01_PRSH_X1",
+                                                                                          "eID_07_PAINT"]
+    hierarchies = merged[HIERARCHY_SCHEMA_FILE]["assets"][0]["assetHierarchies"]
+    assert [hierarchy["childAssetExternalId"] for hierarchy in hierarchies] == ["eID_01_PRSH_X1", "eID_07_PAINT"]
+    target = merged[SFC_TARGET_FILE]
+    assert target["Region"] == "us-east-1"
+    properties = {prop["PropertyName"]: prop["DataPath"] for prop in target["Assets"][0]["Properties"]}
+    # the rule wins for Current_Step, the LLM adds VIN
+    assert properties == {"Current_Step": 'sources."01_PRSH_X1".values."13_Seq_No"',
+                          "VIN": 'sources."01_PRSH_X1".values."13_Serial"'}
+    assert [asset["AssetExternalId"] for asset in target["Assets"]] == ["eID_01_PRSH_X1", "eID_07_PAINT"]
+
+
+def test_missing_llm_document_keeps_the_rule_result(tmp_path):
+    mapping = map_devices({"01_PRSH_X1": device("Seq_No", "VIN")}, UnsRules(RULES), "us-east-1")
+    merged = merge_llm_answer(mapping, tmp_path)
+    assert merged[ASSETS_SCHEMA_FILE]["assets"] == mapping.assets_schema()["assets"]
+    assert merged[SFC_TARGET_FILE] == mapping.sfc_target()
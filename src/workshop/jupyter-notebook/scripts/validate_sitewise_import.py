@@ -0,0 +1,25 @@
+import sys
+import time
+import click
+from pathlib import Path
+from sitewise.bulk_validator import validate_bulk_file
+
+
+@click.command()
+@click.argument('files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option('--maxissues', type=int, default=100, show_default=True, help='Stop after this many problems per file.')
+def main(files, maxissues):
+    """Checks SiteWise bulk import FILES offline, e.g. ../complete_asset_models_definition.json."""
+    failed = False
+    for file_name in files:
+        started = time.perf_counter()
+        issues = validate_bulk_file(file_name, max_issues=maxissues)
+        print(f"{file_name}: {len(issues)} problem(s) ({(time.perf_counter() - started) * 1000:.0f} ms)")
+        for issue in issues:
+            print(f"  {issue}")
+        failed = failed or len(issues) > 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()